@@ -1,7 +1,8 @@
 """
 Admin routes for Ecwid-like admin dashboard features
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -13,8 +14,17 @@ from models import (
     Customer, CustomerCreate, CustomerUpdate,
     StoreSettings, StoreSettingsUpdate,
     DashboardStats, OrderUpdate, OrderNote,
-    BulkProductUpdate, BulkPriceUpdate, BulkStockUpdate
+    BulkProductUpdate, BulkPriceUpdate, BulkStockUpdate, BulkProductMutation
 )
+from search_service import search_service, FIELD_WEIGHTS
+from catalog_cache import catalog_cache, FILTER_FIELDS
+from pagination import keyset_page, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from sales_rollup import sales_rollup
+from pymongo import ReturnDocument
+from bulk_mutations import bulk_adjust, bulk_mutate, BulkMutationError
+
+# Projection used to compute which cached listings a product change affects
+CACHE_PROJECTION = {"_id": 0, "id": 1, **{field: 1 for field in FILTER_FIELDS}}
 
 # Create router
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
@@ -32,84 +42,47 @@ async def get_dashboard_stats():
     """Get dashboard statistics"""
     now = datetime.now(timezone.utc)
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = now - timedelta(days=7)
-    month_start = now - timedelta(days=30)
-    
-    # Today's stats
-    today_orders = await db.orders.count_documents({
-        "created_at": {"$gte": today_start.isoformat()}
-    })
-    today_sales_result = await db.orders.aggregate([
-        {"$match": {"created_at": {"$gte": today_start.isoformat()}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]).to_list(1)
-    today_sales = today_sales_result[0]["total"] if today_sales_result else 0.0
-    
-    # Week's stats
-    week_orders = await db.orders.count_documents({
-        "created_at": {"$gte": week_start.isoformat()}
-    })
-    week_sales_result = await db.orders.aggregate([
-        {"$match": {"created_at": {"$gte": week_start.isoformat()}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]).to_list(1)
-    week_sales = week_sales_result[0]["total"] if week_sales_result else 0.0
-    
-    # Month's stats
-    month_orders = await db.orders.count_documents({
-        "created_at": {"$gte": month_start.isoformat()}
-    })
-    month_sales_result = await db.orders.aggregate([
-        {"$match": {"created_at": {"$gte": month_start.isoformat()}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]).to_list(1)
-    month_sales = month_sales_result[0]["total"] if month_sales_result else 0.0
-    
-    # Total stats
-    total_orders = await db.orders.count_documents({})
-    total_sales_result = await db.orders.aggregate([
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]).to_list(1)
-    total_sales = total_sales_result[0]["total"] if total_sales_result else 0.0
-    
-    # Customers
-    total_customers = await db.customers.count_documents({})
-    
-    # Low stock products
-    settings = await db.store_settings.find_one({"id": "store_settings"}, {"_id": 0})
-    low_stock_threshold = settings.get("low_stock_threshold", 5) if settings else 5
-    low_stock_products = await db.products.count_documents({
-        "stock": {"$lte": low_stock_threshold}
-    })
-    
-    # Pending orders
-    pending_orders = await db.orders.count_documents({"status": "pending"})
+    # Sales figures come from the sales_daily rollup, so windows are whole UTC days
+    week_start = today_start - timedelta(days=6)
+    month_start = today_start - timedelta(days=29)
+    
+    async def low_stock_count():
+        settings = await db.store_settings.find_one({"id": "store_settings"}, {"_id": 0, "low_stock_threshold": 1})
+        low_stock_threshold = settings.get("low_stock_threshold", 5) if settings else 5
+        return await db.products.count_documents({"stock": {"$lte": low_stock_threshold}})
+    
+    (
+        rollup_days,
+        totals,
+        total_customers,
+        low_stock_products,
+        pending_orders,
+        top_products,
+        recent_orders,
+    ) = await asyncio.gather(
+        sales_rollup.days(db, month_start),
+        sales_rollup.totals(db),
+        db.customers.count_documents({}),
+        low_stock_count(),
+        db.orders.count_documents({"status": "pending"}),
+        db.products.find({}, {"_id": 0}).sort("sales_count", -1).limit(5).to_list(5),
+        db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(10).to_list(10),
+    )
     
-    # Top products (by sales count)
-    top_products = await db.products.find({}, {"_id": 0}).sort("sales_count", -1).limit(5).to_list(5)
+    def window(start):
+        key = start.strftime("%Y-%m-%d")
+        rows = [d for d in rollup_days if d["_id"] >= key]
+        return sum(d.get("gross", 0) for d in rows), sum(d.get("orders", 0) for d in rows)
     
-    # Recent orders
-    recent_orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(10).to_list(10)
+    today_sales, today_orders = window(today_start)
+    week_sales, week_orders = window(week_start)
+    month_sales, month_orders = window(month_start)
     
-    # Sales chart data (last 7 days)
+    daily_sales = {d["_id"]: d.get("gross", 0.0) for d in rollup_days}
     sales_chart = []
     for i in range(6, -1, -1):
-        day_start = (now - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        day_sales_result = await db.orders.aggregate([
-            {"$match": {
-                "created_at": {
-                    "$gte": day_start.isoformat(),
-                    "$lt": day_end.isoformat()
-                }
-            }},
-            {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-        ]).to_list(1)
-        day_sales = day_sales_result[0]["total"] if day_sales_result else 0.0
-        sales_chart.append({
-            "date": day_start.strftime("%Y-%m-%d"),
-            "sales": day_sales
-        })
+        day = (today_start - timedelta(days=i)).strftime("%Y-%m-%d")
+        sales_chart.append({"date": day, "sales": daily_sales.get(day, 0.0)})
     
     return DashboardStats(
         today_sales=today_sales,
@@ -118,8 +91,8 @@ async def get_dashboard_stats():
         week_orders=week_orders,
         month_sales=month_sales,
         month_orders=month_orders,
-        total_sales=total_sales,
-        total_orders=total_orders,
+        total_sales=totals["gross"],
+        total_orders=totals["orders"],
         total_customers=total_customers,
         low_stock_products=low_stock_products,
         pending_orders=pending_orders,
@@ -150,6 +123,7 @@ async def create_product_variation(product_id: str, variation: ProductVariationC
             "variations_count": variations_count
         }}
     )
+    catalog_cache.invalidate_products({"id": product_id})
     
     return ProductVariation(**variation_data)
 
@@ -180,6 +154,7 @@ async def delete_product_variation(product_id: str, variation_id: str):
             "variations_count": variations_count
         }}
     )
+    catalog_cache.invalidate_products({"id": product_id})
     
     return {"message": "Variation deleted"}
 
@@ -300,14 +275,8 @@ async def create_customer(customer: CustomerCreate):
     return Customer(**customer_data)
 
 
-@admin_router.get("/customers", response_model=List[Customer])
-async def get_customers(
-    skip: int = 0,
-    limit: int = 50,
-    group: Optional[str] = None,
-    search: Optional[str] = None
-):
-    """Get all customers with filters"""
+def customer_filter_query(group: Optional[str] = None, search: Optional[str] = None) -> dict:
+    """Mongo filter for the customer list (shared with the export)"""
     query = {}
     if group:
         query["customer_group"] = group
@@ -316,8 +285,27 @@ async def get_customers(
             {"name": {"$regex": search, "$options": "i"}},
             {"email": {"$regex": search, "$options": "i"}}
         ]
+    return query
+
+@admin_router.get("/customers", response_model=List[Customer])
+async def get_customers(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    group: Optional[str] = None,
+    search: Optional[str] = None,
+    sort_order: str = "desc",
+    cursor: Optional[str] = None
+):
+    """Get all customers with filters (next page cursor in X-Next-Cursor)"""
+    query = customer_filter_query(group=group, search=search)
     
-    customers = await db.customers.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    sort_direction = -1 if sort_order == "desc" else 1
+    customers, next_cursor = await keyset_page(
+        db.customers, query, "created_at", sort_direction, limit, cursor=cursor, skip=skip
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [Customer(**c) for c in customers]
 
 
@@ -406,8 +394,7 @@ async def update_store_settings(updates: StoreSettingsUpdate):
 
 # ==================== ADVANCED ORDER MANAGEMENT ====================
 
-@admin_router.get("/orders/filters")
-async def get_filtered_orders(
+def order_filter_query(
     status: Optional[str] = None,
     payment_status: Optional[str] = None,
     payment_method: Optional[str] = None,
@@ -415,15 +402,13 @@ async def get_filtered_orders(
     date_to: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
-    search: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 50
-):
-    """Get orders with advanced filters"""
+    search: Optional[str] = None
+) -> dict:
+    """Mongo filter for the advanced order list (shared with the export)"""
     query = {}
     
     if status:
-        query["status"] = status
+        query["order_status"] = status
     if payment_status:
         query["payment_status"] = payment_status
     if payment_method:
@@ -442,12 +427,38 @@ async def get_filtered_orders(
             {"user_email": {"$regex": search, "$options": "i"}},
             {"user_name": {"$regex": search, "$options": "i"}}
         ]
+    return query
+
+@admin_router.get("/orders/filters")
+async def get_filtered_orders(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    search: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    sort_order: str = "desc",
+    cursor: Optional[str] = None
+):
+    """Get orders with advanced filters (pass next_cursor back as cursor for the next page)"""
+    query = order_filter_query(
+        status=status, payment_status=payment_status, payment_method=payment_method,
+        date_from=date_from, date_to=date_to, min_amount=min_amount, max_amount=max_amount, search=search
+    )
     
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    sort_direction = -1 if sort_order == "desc" else 1
+    orders, next_cursor = await keyset_page(
+        db.orders, query, "created_at", sort_direction, limit, cursor=cursor, skip=skip
+    )
     total_count = await db.orders.count_documents(query)
     
     return {
         "orders": orders,
+        "next_cursor": next_cursor,
         "total": total_count,
         "page": skip // limit + 1 if limit > 0 else 1,
         "pages": (total_count + limit - 1) // limit if limit > 0 else 1
@@ -462,15 +473,20 @@ async def update_order(order_id: str, updates: OrderUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No updates provided")
     
-    result = await db.orders.update_one(
+    order = await db.orders.find_one_and_update(
         {"id": order_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    if "payment_status" in update_data:
+        await sales_rollup.record_payment_status_change(db, order, order.get("payment_status"), update_data["payment_status"])
+    
+    order.update(update_data)
     return order
 
 
@@ -497,78 +513,64 @@ async def add_order_note(order_id: str, author: str, note: str):
 @admin_router.post("/products/bulk/update")
 async def bulk_update_products(bulk_update: BulkProductUpdate):
     """Bulk update multiple products"""
-    result = await db.products.update_many(
-        {"id": {"$in": bulk_update.product_ids}},
-        {"$set": bulk_update.updates}
+    return await _apply_mutations(
+        [{"product_id": product_id, "updates": bulk_update.updates} for product_id in bulk_update.product_ids],
+        bulk_update.dry_run
     )
+
+
+@admin_router.post("/products/bulk/mutate")
+async def bulk_mutate_products(batch: BulkProductMutation):
+    """Per-product field updates and increments in one ordered bulk write; dry_run returns the diff only"""
+    return await _apply_mutations([m.model_dump() for m in batch.mutations], batch.dry_run)
+
+
+async def _apply_mutations(mutations: List[dict], dry_run: bool) -> dict:
+    try:
+        report, before, after = await bulk_mutate(db, mutations, dry_run=dry_run, projection=CACHE_PROJECTION)
+    except BulkMutationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "message": f"Updated {result.modified_count} products",
-        "modified_count": result.modified_count
-    }
+    if not dry_run and report["changed"]:
+        changed_ids = [item["id"] for item in report["items"] if item["status"] == "changed"]
+        fields = {field for item in report["items"] for field in item["changes"]}
+        if any(field in FIELD_WEIGHTS for field in fields):
+            await search_service.refresh_products(db, changed_ids)
+        catalog_cache.invalidate_products(*before, *after)
+    
+    return {"message": f"Updated {report['modified_count']} products", **report}
 
 
 @admin_router.post("/products/bulk/price")
 async def bulk_update_prices(bulk_update: BulkPriceUpdate):
     """Bulk update product prices"""
-    products = await db.products.find(
-        {"id": {"$in": bulk_update.product_ids}},
-        {"_id": 0, "id": 1, "price": 1}
-    ).to_list(None)
-    
-    for product in products:
-        new_price = product["price"]
-        
-        if bulk_update.operation == "add":
-            new_price += bulk_update.value
-        elif bulk_update.operation == "subtract":
-            new_price -= bulk_update.value
-        elif bulk_update.operation == "multiply":
-            new_price *= bulk_update.value
-        elif bulk_update.operation == "set":
-            new_price = bulk_update.value
-        
-        new_price = max(0, new_price)  # Ensure non-negative
-        
-        await db.products.update_one(
-            {"id": product["id"]},
-            {"$set": {"price": new_price}}
-        )
-    
-    return {
-        "message": f"Updated prices for {len(products)} products",
-        "count": len(products)
-    }
+    return await _adjust_products(bulk_update, "price", decimals=2)
 
 
 @admin_router.post("/products/bulk/stock")
 async def bulk_update_stock(bulk_update: BulkStockUpdate):
     """Bulk update product stock"""
-    products = await db.products.find(
-        {"id": {"$in": bulk_update.product_ids}},
-        {"_id": 0, "id": 1, "stock": 1}
-    ).to_list(None)
-    
-    for product in products:
-        new_stock = product["stock"]
-        
-        if bulk_update.operation == "add":
-            new_stock += bulk_update.value
-        elif bulk_update.operation == "subtract":
-            new_stock -= bulk_update.value
-        elif bulk_update.operation == "set":
-            new_stock = bulk_update.value
-        
-        new_stock = max(0, new_stock)  # Ensure non-negative
-        
-        await db.products.update_one(
-            {"id": product["id"]},
-            {"$set": {"stock": new_stock}}
+    if bulk_update.operation == "multiply":
+        raise HTTPException(status_code=400, detail="Unknown operation 'multiply'")
+    return await _adjust_products(bulk_update, "stock")
+
+
+async def _adjust_products(bulk_update, field: str, decimals: Optional[int] = None) -> dict:
+    try:
+        report, products = await bulk_adjust(
+            db, bulk_update.product_ids, field, bulk_update.operation, bulk_update.value,
+            decimals=decimals, dry_run=bulk_update.dry_run, projection=CACHE_PROJECTION
         )
+    except BulkMutationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not bulk_update.dry_run:
+        catalog_cache.invalidate_products(*products)
     
     return {
-        "message": f"Updated stock for {len(products)} products",
-        "count": len(products)
+        "message": f"Updated {field} for {report['matched']} products",
+        "count": report["matched"],
+        **report
     }
 
 
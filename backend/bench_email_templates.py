@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for email rendering
+
+Compares the precompiled template engine with the previous f-string
+concatenation for the order confirmation item table (unescaped, as it was,
+and with the escaping user-supplied fields need), then reports the per-email
+render time of every template.
+
+    python bench_email_templates.py [--items 1,10,100,1000] [--repeat 200]
+"""
+import argparse
+import html
+import timeit
+
+from email_service import email_service
+from email_templates import templates
+
+
+def legacy_items_html(items) -> str:
+    """Item table as built before the template engine (string += in a loop)"""
+    items_html = ""
+    for item in items:
+        items_html += f"""
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #eee;">
+                    <strong>{item['name']}</strong><br>
+                    Quantity: {item['quantity']}
+                </td>
+                <td style="padding: 10px; border-bottom: 1px solid #eee; text-align: right;">
+                    ${item['price'] * item['quantity']:.2f}
+                </td>
+            </tr>
+            """
+    return items_html
+
+
+def legacy_items_html_escaped(items) -> str:
+    """Same loop with the escaping user-supplied fields require"""
+    items_html = ""
+    for item in items:
+        items_html += f"""
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #eee;">
+                    <strong>{html.escape(str(item['name']))}</strong><br>
+                    Quantity: {html.escape(str(item['quantity']))}
+                </td>
+                <td style="padding: 10px; border-bottom: 1px solid #eee; text-align: right;">
+                    ${item['price'] * item['quantity']:.2f}
+                </td>
+            </tr>
+            """
+    return items_html
+
+
+def sample_order(item_count: int) -> dict:
+    return {
+        "order_number": "KY-000123",
+        "user_name": "Jean Dupont",
+        "user_email": "jean@example.com",
+        "phone": "+33 6 00 00 00 00",
+        "payment_method": "manual",
+        "order_status": "pending",
+        "payment_status": "pending",
+        "total": 129.9 * item_count,
+        "crypto_discount": 0,
+        "discount_amount": 10,
+        "coupon_code": "WELCOME10",
+        "shipping_cost": 0,
+        "shipping_address": {"address": "1 rue de la Paix", "city": "Paris", "postal_code": "75002", "country": "France"},
+        "items": [
+            {"product_id": f"p-{i}", "name": f"Montre Automatique <Edition {i}>", "quantity": 1 + i % 3, "price": 129.9}
+            for i in range(item_count)
+        ],
+    }
+
+
+def per_call_us(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", default="1,10,100,1000", help="comma separated item counts")
+    parser.add_argument("--repeat", type=int, default=200, help="renders per measurement")
+    args = parser.parse_args()
+
+    print("Order item table: legacy concatenation vs precompiled row template")
+    print(f"{'items':>8} {'legacy µs':>12} {'escaped µs':>12} {'engine µs':>12} {'full email µs':>14}")
+    for count in [int(n) for n in args.items.split(",")]:
+        order = sample_order(count)
+        repeat = max(1, args.repeat // max(1, count // 10))
+        legacy = per_call_us(lambda: legacy_items_html(order["items"]), repeat)
+        escaped = per_call_us(lambda: legacy_items_html_escaped(order["items"]), repeat)
+        engine = per_call_us(
+            lambda: templates.render_each("partials/order_item_row.html", order["items"]),
+            repeat,
+        )
+        full = per_call_us(lambda: email_service.render_order_confirmation(order), repeat)
+        print(f"{count:>8} {legacy:>12.1f} {escaped:>12.1f} {engine:>12.1f} {full:>14.1f}")
+
+    order = sample_order(5)
+    renders = {
+        "order_confirmation": lambda: email_service.render_order_confirmation(order),
+        "invoice": lambda: email_service.render_invoice(order),
+        "admin_new_order": lambda: email_service.render_admin_new_order_notification(order),
+        "order_status_update": lambda: email_service.render_order_status_update(order, "pending"),
+        "payment_confirmation": lambda: email_service.render_payment_confirmation(order),
+        "tracking_update": lambda: email_service.render_tracking_update("KY-000123", "1Z999", "fedex"),
+        "password_reset": lambda: email_service.render_password_reset_email("token"),
+        "welcome": lambda: email_service.render_welcome_email("Jean"),
+        "bulk_promotional": lambda: email_service.render_bulk_promotional_email("Soldes -20% ce week-end"),
+    }
+    print("\nPer-email render time (5 items)")
+    for name, render in renders.items():
+        print(f"{name:>22} {per_call_us(render, args.repeat):>10.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
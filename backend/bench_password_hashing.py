@@ -0,0 +1,85 @@
+"""
+Load benchmark for password hashing
+
+Simulates storefront traffic (a request every few milliseconds that only
+awaits a tiny amount of I/O) on the event loop while a burst of logins
+verifies bcrypt passwords, first inline on the loop as before and then
+through the bounded password_hasher executor. Reports storefront latency
+percentiles and how many logins were served or refused (503).
+
+    python bench_password_hashing.py [--logins 20] [--rounds 12] [--workers 2] [--max-queue 32]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from password_hasher import PasswordHasher, PasswordHasherBusy, _context
+
+STOREFRONT_INTERVAL = 0.005  # one storefront request every 5 ms
+STOREFRONT_IO = 0.001        # awaited I/O per storefront request
+
+
+async def storefront(latencies: list, stop: asyncio.Event):
+    """Requests arrive on a fixed schedule; latency counts from the scheduled arrival"""
+    loop = asyncio.get_running_loop()
+    arrival = loop.time()
+    while not stop.is_set():
+        arrival += STOREFRONT_INTERVAL
+        await asyncio.sleep(max(0.0, arrival - loop.time()))
+        await asyncio.sleep(STOREFRONT_IO)
+        latencies.append((loop.time() - arrival - STOREFRONT_IO) * 1000)
+
+
+async def run_scenario(name: str, login, logins: int) -> None:
+    latencies, stop = [], asyncio.Event()
+    traffic = asyncio.create_task(storefront(latencies, stop))
+    await asyncio.sleep(0.2)  # baseline traffic before the burst
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+    burst = time.perf_counter() - started
+
+    await asyncio.sleep(0.1)
+    stop.set()
+    await traffic
+
+    served = sum(1 for result in results if result is True)
+    refused = sum(1 for result in results if isinstance(result, PasswordHasherBusy))
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<22} {burst:>8.2f} s {served:>7} {refused:>8} {p50:>10.2f} {p99:>10.2f} {latencies[-1]:>10.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=20, help="concurrent logins in the burst")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--processes", action="store_true", help="use a process pool")
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    hashed = _context(args.rounds).hash(password)
+
+    async def inline_login():
+        # What the login route did before: bcrypt on the event loop
+        return _context(args.rounds).verify(password, hashed)
+
+    hasher = PasswordHasher(rounds=args.rounds, workers=args.workers, max_queue=args.max_queue,
+                            use_processes=args.processes)
+
+    async def pooled_login():
+        return await hasher.verify(password, hashed)
+
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}; storefront latency in ms")
+    print(f"{'scenario':<22} {'burst':>10} {'served':>7} {'refused':>8} {'p50':>10} {'p99':>10} {'max':>10}")
+    await run_scenario("inline (before)", inline_login, args.logins)
+    await run_scenario("bounded executor", pooled_login, args.logins)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,17 @@
 import os
+import base64
 import hmac
 import hashlib
 import time
-import requests
 import json
 import logging
-from typing import Dict
+from typing import Dict, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +24,12 @@ class BinancePayService:
     def __init__(self):
         self.api_key = os.environ.get('BINANCE_PAY_API_KEY', 'your_binance_pay_api_key')
         self.api_secret = os.environ.get('BINANCE_PAY_API_SECRET', 'your_binance_pay_api_secret')
-        self.base_url = "https://bpay.binanceapi.com"
+        self.base_url = os.environ.get('BINANCE_PAY_BASE_URL', "https://bpay.binanceapi.com")
+        # Oldest accepted webhook timestamp, in seconds
+        self.webhook_tolerance = int(os.environ.get('BINANCE_PAY_WEBHOOK_TOLERANCE', '300'))
         self.is_demo = self.api_key == 'your_binance_pay_api_key'
+        # certSerial -> clé publique Binance Pay servant à signer les webhooks
+        self._certificates: Dict[str, object] = {}
     
     def _generate_signature(self, timestamp: str, nonce: str, body: str) -> str:
         """Générer la signature HMAC SHA512"""
@@ -97,11 +107,10 @@ class BinancePayService:
                 "BinancePay-Signature": signature
             }
             
-            response = requests.post(
+            response = await http_client.post(
                 f"{self.base_url}/binancepay/openapi/v2/order",
-                json=payload,
-                headers=headers,
-                timeout=30
+                content=body,
+                headers=headers
             )
             
             if response.status_code == 200:
@@ -168,11 +177,12 @@ class BinancePayService:
                 "BinancePay-Signature": signature
             }
             
-            response = requests.post(
+            # Read-only query: safe to retry
+            response = await http_client.post(
                 f"{self.base_url}/binancepay/openapi/v2/order/query",
-                json=payload,
+                content=body,
                 headers=headers,
-                timeout=30
+                retry=True
             )
             
             if response.status_code == 200:
@@ -189,4 +199,65 @@ class BinancePayService:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    async def _certificate(self, serial: str) -> Optional[object]:
+        """
+        Clé publique Binance Pay pour un numéro de certificat (mise en cache)
+        
+        Documentation: https://developers.binance.com/docs/binance-pay/api-certificates
+        """
+        if serial in self._certificates:
+            return self._certificates[serial]
+        timestamp = str(int(time.time() * 1000))
+        nonce = str(int(time.time() * 1000000))
+        body = "{}"
+        response = await http_client.post(
+            f"{self.base_url}/binancepay/openapi/certificates",
+            content=body,
+            headers={
+                "Content-Type": "application/json",
+                "BinancePay-Timestamp": timestamp,
+                "BinancePay-Nonce": nonce,
+                "BinancePay-Certificate-SN": self.api_key,
+                "BinancePay-Signature": self._generate_signature(timestamp, nonce, body),
+            },
+            retry=True
+        )
+        if response.status_code != 200:
+            return None
+        for certificate in response.json().get("data") or []:
+            self._certificates[certificate["certSerial"]] = serialization.load_pem_public_key(
+                certificate["certPublic"].encode('utf-8')
+            )
+        return self._certificates.get(serial)
+
+    async def verify_webhook_signature(self, headers, body: bytes) -> bool:
+        """
+        Vérifier la signature d'un webhook Binance Pay
+        
+        Binance signe "<timestamp>\\n<nonce>\\n<body>\\n" en RSA SHA256 (base64 dans
+        BinancePay-Signature) avec la clé du certificat BinancePay-Certificate-SN.
+        
+        Returns:
+            True si la signature est valide
+        """
+        if self.is_demo:
+            return False
+        timestamp = headers.get("BinancePay-Timestamp", "")
+        nonce = headers.get("BinancePay-Nonce", "")
+        signature = headers.get("BinancePay-Signature", "")
+        serial = headers.get("BinancePay-Certificate-SN", "")
+        if not (timestamp and nonce and signature and serial):
+            return False
+        try:
+            if abs(time.time() - int(timestamp) / 1000) > self.webhook_tolerance:
+                return False
+            public_key = await self._certificate(serial)
+            if public_key is None:
+                return False
+            payload = timestamp.encode('utf-8') + b"\n" + nonce.encode('utf-8') + b"\n" + body + b"\n"
+            public_key.verify(base64.b64decode(signature), payload, padding.PKCS1v15(), hashes.SHA256())
+            return True
+        except (InvalidSignature, ValueError, TypeError):
+            return False
+
 binance_service = BinancePayService()
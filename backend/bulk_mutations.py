@@ -0,0 +1,188 @@
+"""
+Bulk product mutations
+
+Bulk price/stock adjustments run as one update_many with an update pipeline,
+so the server computes each new value from the document's current one (a
+concurrent checkout decrement is never overwritten). Arbitrary per-product
+field updates go out as a single ordered bulk_write. Both read the affected
+products once to build a per-item before/after report, which is all a dry
+run does.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+
+from models import ProductExtendedUpdate
+
+NUMERIC_OPERATIONS = ("add", "subtract", "multiply", "set")
+
+MUTABLE_FIELDS = set(ProductExtendedUpdate.model_fields)
+INCREMENTABLE_FIELDS = {"price", "compare_at_price", "cost", "stock", "weight"}
+
+
+class BulkMutationError(ValueError):
+    pass
+
+
+def adjust_expression(field: str, operation: str, value: float, decimals: Optional[int] = None) -> dict:
+    """Aggregation expression for the new value, never below zero"""
+    current = {"$ifNull": [f"${field}", 0]}
+    if operation == "add":
+        expression = {"$add": [current, value]}
+    elif operation == "subtract":
+        expression = {"$subtract": [current, value]}
+    elif operation == "multiply":
+        expression = {"$multiply": [current, value]}
+    elif operation == "set":
+        expression = {"$literal": value}
+    else:
+        raise BulkMutationError(f"Unknown operation '{operation}'")
+    expression = {"$max": [0, expression]}
+    if decimals is not None:
+        expression = {"$round": [expression, decimals]}
+    return expression
+
+
+def adjust_value(current: Optional[float], operation: str, value: float, decimals: Optional[int] = None) -> float:
+    """Python mirror of adjust_expression, for reports and dry runs"""
+    current = current or 0
+    if operation == "add":
+        new_value = current + value
+    elif operation == "subtract":
+        new_value = current - value
+    elif operation == "multiply":
+        new_value = current * value
+    elif operation == "set":
+        new_value = value
+    else:
+        raise BulkMutationError(f"Unknown operation '{operation}'")
+    new_value = max(0, new_value)
+    return round(new_value, decimals) if decimals is not None else new_value
+
+
+def _report(items: List[dict], not_found: List[str], dry_run: bool, modified: int) -> dict:
+    return {
+        "dry_run": dry_run,
+        "matched": len(items),
+        "changed": sum(1 for item in items if item["status"] == "changed"),
+        "modified_count": modified,
+        "not_found": not_found,
+        "items": items,
+    }
+
+
+async def _load(db, product_ids: List[str], projection: dict) -> Tuple[Dict[str, dict], List[str]]:
+    product_ids = list(dict.fromkeys(product_ids))
+    products = {
+        product["id"]: product
+        for product in await db.products.find({"id": {"$in": product_ids}}, {**projection, "_id": 0, "id": 1}).to_list(None)
+    }
+    return products, [product_id for product_id in product_ids if product_id not in products]
+
+
+async def bulk_adjust(
+    db,
+    product_ids: List[str],
+    field: str,
+    operation: str,
+    value: float,
+    decimals: Optional[int] = None,
+    dry_run: bool = False,
+    projection: Optional[dict] = None,
+) -> Tuple[dict, List[dict]]:
+    """
+    Add/subtract/multiply/set one numeric field on many products.
+
+    Returns the report and the products as read before the write (with
+    `projection` fields, for cache invalidation).
+    """
+    expression = adjust_expression(field, operation, value, decimals)
+    products, not_found = await _load(db, product_ids, {**(projection or {}), field: 1})
+
+    items = []
+    for product in products.values():
+        old_value = product.get(field)
+        new_value = adjust_value(old_value, operation, value, decimals)
+        items.append({
+            "id": product["id"],
+            "status": "changed" if new_value != old_value else "unchanged",
+            "changes": {field: {"before": old_value, "after": new_value}},
+        })
+
+    modified = 0
+    if not dry_run and products:
+        result = await db.products.update_many(
+            {"id": {"$in": list(products)}},
+            [{"$set": {field: expression}}]
+        )
+        modified = result.modified_count
+    return _report(items, not_found, dry_run, modified), list(products.values())
+
+
+def validate_mutation(updates: Dict[str, Any], increments: Dict[str, float]) -> Dict[str, Any]:
+    """Check field names and value types; returns the validated $set values"""
+    unknown = set(updates) - MUTABLE_FIELDS
+    if unknown:
+        raise BulkMutationError(f"Fields cannot be updated: {', '.join(sorted(unknown))}")
+    not_numeric = set(increments) - INCREMENTABLE_FIELDS
+    if not_numeric:
+        raise BulkMutationError(f"Fields cannot be incremented: {', '.join(sorted(not_numeric))}")
+    both = set(updates) & set(increments)
+    if both:
+        raise BulkMutationError(f"Fields both set and incremented: {', '.join(sorted(both))}")
+    try:
+        return ProductExtendedUpdate.model_validate(updates).model_dump(include=set(updates))
+    except ValidationError as e:
+        raise BulkMutationError(str(e))
+
+
+async def bulk_mutate(
+    db,
+    mutations: List[dict],
+    dry_run: bool = False,
+    projection: Optional[dict] = None,
+) -> Tuple[dict, List[dict], List[dict]]:
+    """
+    Apply per-product mutations ({product_id, updates, increments}) in one
+    ordered bulk_write. Increments never take a field below zero.
+
+    Returns the report plus before and after images of the touched products.
+    """
+    validated = [
+        (mutation["product_id"], validate_mutation(mutation.get("updates") or {}, mutation.get("increments") or {}),
+         mutation.get("increments") or {})
+        for mutation in mutations
+    ]
+    fields = {field for _, updates, increments in validated for field in (*updates, *increments)}
+    products, not_found = await _load(db, [product_id for product_id, _, _ in validated], {
+        **(projection or {}), **{field: 1 for field in fields}
+    })
+
+    current = {product_id: dict(product) for product_id, product in products.items()}
+    items, ops = [], []
+    for product_id, updates, increments in validated:
+        product = current.get(product_id)
+        if product is None:
+            continue
+        stage = {field: {"$literal": value} for field, value in updates.items()}
+        stage.update({field: adjust_expression(field, "add", amount) for field, amount in increments.items()})
+        new_values = {
+            **updates,
+            **{field: adjust_value(product.get(field), "add", amount) for field, amount in increments.items()},
+        }
+        changes = {
+            field: {"before": product.get(field), "after": value}
+            for field, value in new_values.items()
+            if product.get(field) != value
+        }
+        product.update(new_values)
+        items.append({"id": product_id, "status": "changed" if changes else "unchanged", "changes": changes})
+        if changes:
+            ops.append(UpdateOne({"id": product_id}, [{"$set": stage}]))
+
+    modified = 0
+    if not dry_run and ops:
+        result = await db.products.bulk_write(ops, ordered=True)
+        modified = result.modified_count
+    return _report(items, not_found, dry_run, modified), list(products.values()), list(current.values())
@@ -0,0 +1,328 @@
+"""
+Bulk email campaigns
+
+A campaign is a `bulk_emails` document plus one `bulk_email_recipients`
+document per address. The recipient set is computed with a $group on the
+database side and streamed into the recipients collection, then pending
+recipients are streamed with a cursor to a bounded pool of sender tasks
+behind a token bucket. Every recipient is marked sent or failed as it goes,
+so a campaign interrupted by a restart resumes where it stopped.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from email_service import email_service
+from throttling import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+PENDING = "pending"
+SENT = "sent"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CampaignService:
+    """Runs bulk email campaigns in the background"""
+
+    campaigns = "bulk_emails"
+    recipients = "bulk_email_recipients"
+
+    def __init__(
+        self,
+        workers: int = 4,
+        rate_per_second: float = 5.0,
+        max_attempts: int = 3,
+        batch_size: int = 1000,
+        lease_seconds: int = 120,
+    ):
+        self.workers = workers
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # ---------- lifecycle ----------
+
+    def start(self, db):
+        """Resume campaigns left queued or sending by a previous process"""
+        asyncio.create_task(self.resume(db))
+
+    async def resume(self, db):
+        try:
+            campaigns = await db[self.campaigns].find(
+                {"status": {"$in": [QUEUED, SENDING]}}, {"_id": 0, "id": 1}
+            ).to_list(None)
+            for campaign in campaigns:
+                self.launch(db, campaign["id"])
+            if campaigns:
+                logger.info(f"Resuming {len(campaigns)} bulk email campaigns")
+        except Exception as e:
+            logger.error(f"Failed to resume bulk email campaigns: {str(e)}")
+
+    async def create(self, db, campaign: dict) -> str:
+        """Persist a queued campaign document and start sending it"""
+        campaign.update({"status": QUEUED, "total_recipients": 0, "sent_to": 0, "failed": 0, "sent_at": None})
+        await db[self.campaigns].insert_one(campaign)
+        self.launch(db, campaign["id"])
+        return campaign["id"]
+
+    def launch(self, db, campaign_id: str):
+        task = self._tasks.get(campaign_id)
+        if task and not task.done():
+            return
+        self._tasks[campaign_id] = asyncio.create_task(self.run(db, campaign_id))
+
+    # ---------- execution ----------
+
+    async def _claim(self, db, campaign_id: str) -> Optional[dict]:
+        """Take the campaign lease so only one process sends it"""
+        now = _now()
+        return await db[self.campaigns].find_one_and_update(
+            {
+                "id": campaign_id,
+                "status": {"$in": [QUEUED, SENDING]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now.isoformat()}}],
+            },
+            {"$set": {"lease_until": (now + timedelta(seconds=self.lease_seconds)).isoformat()}},
+            projection={"_id": 0},
+        )
+
+    async def _heartbeat(self, db, campaign_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            lease = (_now() + timedelta(seconds=self.lease_seconds)).isoformat()
+            await db[self.campaigns].update_one({"id": campaign_id}, {"$set": {"lease_until": lease}})
+
+    async def _wait_for_lease(self, db, campaign_id: str) -> Optional[dict]:
+        """Claim the campaign, waiting out a lease held by another (possibly dead) process"""
+        while True:
+            campaign = await self._claim(db, campaign_id)
+            if campaign is not None:
+                return campaign
+            current = await db[self.campaigns].find_one({"id": campaign_id}, {"_id": 0, "status": 1, "lease_until": 1})
+            if not current or current.get("status") not in (QUEUED, SENDING):
+                return None
+            # After a crash the old lease is still live; retry once it lapses (a live holder keeps renewing it)
+            lease_until = current.get("lease_until")
+            wait = (datetime.fromisoformat(lease_until) - _now()).total_seconds() if lease_until else 0
+            await asyncio.sleep(max(1.0, wait + 1))
+
+    async def run(self, db, campaign_id: str):
+        campaign = await self._wait_for_lease(db, campaign_id)
+        if campaign is None:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(db, campaign_id))
+        try:
+            if campaign["status"] == QUEUED:
+                total = await self.materialize_recipients(db, campaign)
+                await db[self.campaigns].update_one(
+                    {"id": campaign_id},
+                    {"$set": {"status": SENDING, "total_recipients": total, "started_at": _now().isoformat()}}
+                )
+                logger.info(f"Campaign {campaign_id}: {total} recipients")
+
+            await self.deliver(db, campaign)
+
+            counts = await self.counts(db, campaign_id)
+            await db[self.campaigns].update_one(
+                {"id": campaign_id},
+                {"$set": {
+                    "status": COMPLETED,
+                    "sent_to": counts.get(SENT, 0),
+                    "failed": counts.get(FAILED, 0),
+                    "sent_at": _now().isoformat(),
+                    "lease_until": None,
+                }}
+            )
+            logger.info(f"✓ Campaign {campaign_id} completed - {counts.get(SENT, 0)} sent, {counts.get(FAILED, 0)} failed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Campaign {campaign_id} failed: {str(e)}")
+            await db[self.campaigns].update_one(
+                {"id": campaign_id},
+                {"$set": {"status": FAILED, "error": str(e), "lease_until": None}}
+            )
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(campaign_id, None)
+
+    def recipient_pipeline(self, recipient_filter: str) -> tuple:
+        """(collection, pipeline) yielding one {_id: email} row per distinct address"""
+        if recipient_filter == "all":
+            return "users", [
+                {"$match": {"role": "customer", "email": {"$type": "string"}}},
+                {"$group": {"_id": "$email"}},
+            ]
+        # customers_with_orders
+        return "orders", [
+            {"$match": {"user_email": {"$type": "string"}}},
+            {"$group": {"_id": "$user_email"}},
+        ]
+
+    async def materialize_recipients(self, db, campaign: dict) -> int:
+        """Stream the distinct recipient set into bulk_email_recipients (idempotent)"""
+        collection, pipeline = self.recipient_pipeline(campaign.get("recipient_filter", "all"))
+        campaign_id = campaign["id"]
+        now = _now().isoformat()
+        batch = []
+
+        async def flush():
+            nonlocal batch
+            if batch:
+                try:
+                    await db[self.recipients].bulk_write(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Concurrent upserts of the same address hit the unique index
+                    if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                        raise
+                batch = []
+
+        async for row in db[collection].aggregate(pipeline, allowDiskUse=True):
+            batch.append(UpdateOne(
+                {"campaign_id": campaign_id, "email": row["_id"]},
+                {"$setOnInsert": {"status": PENDING, "attempts": 0, "created_at": now}},
+                upsert=True
+            ))
+            if len(batch) >= self.batch_size:
+                await flush()
+        await flush()
+
+        return await db[self.recipients].count_documents({"campaign_id": campaign_id})
+
+    async def deliver(self, db, campaign: dict):
+        """Send to every pending recipient with bounded concurrency and rate"""
+        campaign_id = campaign["id"]
+        subject = campaign["subject"]
+        # Promotional emails are not personalised: render once per campaign
+        html_content = email_service.render_bulk_promotional_email(campaign["message"])
+        bucket = TokenBucket(self.rate_per_second)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        recipients = db[self.recipients]
+
+        async def record(email: str, status: str, error: Optional[str]):
+            update = {"status": status, "updated_at": _now().isoformat()}
+            if error:
+                update["error"] = error
+            await recipients.update_one(
+                {"campaign_id": campaign_id, "email": email},
+                {"$set": update, "$inc": {"attempts": 1}}
+            )
+            counter = "sent_to" if status == SENT else "failed"
+            await db[self.campaigns].update_one({"id": campaign_id}, {"$inc": {counter: 1}})
+
+        async def send(email: str):
+            status, error = SENT, None
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    await email_service.deliver(email, subject, html_content)
+                    status, error = SENT, None
+                    break
+                except Exception as e:
+                    status, error = FAILED, f"{type(e).__name__}: {str(e)}"
+                    if attempt < self.max_attempts:
+                        await asyncio.sleep(2 ** attempt)
+            await record(email, status, error)
+
+        async def sender():
+            while True:
+                recipient = await queue.get()
+                if recipient is None:
+                    return
+                await bucket.acquire()
+                email = recipient["email"]
+                try:
+                    await send(email)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Recording the outcome failed: keep this sender alive for the next recipient
+                    logger.error(f"Campaign {campaign_id}: failed to process {email}: {str(e)}")
+                    try:
+                        await record(email, FAILED, f"{type(e).__name__}: {str(e)}")
+                    except Exception as record_error:
+                        logger.error(f"Campaign {campaign_id}: could not mark {email} failed: {str(record_error)}")
+
+        workers = [asyncio.create_task(sender()) for _ in range(self.workers)]
+
+        def check_workers():
+            # Senders only return on the end-of-queue marker; anything else means they died
+            failed = [worker for worker in workers if worker.done() and (worker.cancelled() or worker.exception())]
+            if failed:
+                error = next((worker.exception() for worker in failed if not worker.cancelled()), None)
+                raise RuntimeError(f"{len(failed)} of {len(workers)} campaign senders stopped: {error}")
+
+        async def put(item):
+            """Queue an item; raise instead of blocking forever once senders have died"""
+            check_workers()
+            if not queue.full():
+                queue.put_nowait(item)
+                return
+            waiter = asyncio.ensure_future(queue.put(item))
+            try:
+                while not waiter.done():
+                    await asyncio.wait([waiter, *(w for w in workers if not w.done())],
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    check_workers()
+            finally:
+                waiter.cancel()
+
+        try:
+            cursor = recipients.find(
+                {"campaign_id": campaign_id, "status": PENDING}, {"_id": 0, "email": 1}
+            ).batch_size(self.batch_size)
+            async for recipient in cursor:
+                await put(recipient)
+            for _ in workers:
+                await put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    # ---------- progress ----------
+
+    async def counts(self, db, campaign_id: str) -> Dict[str, int]:
+        rows = await db[self.recipients].aggregate([
+            {"$match": {"campaign_id": campaign_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
+
+    async def progress(self, db, campaign_id: str) -> Optional[dict]:
+        campaign = await db[self.campaigns].find_one({"id": campaign_id}, {"_id": 0})
+        if campaign is None:
+            return None
+        counts = await self.counts(db, campaign_id)
+        total = campaign.get("total_recipients") or sum(counts.values())
+        done = counts.get(SENT, 0) + counts.get(FAILED, 0)
+        campaign.update({
+            "pending": counts.get(PENDING, 0),
+            "sent": counts.get(SENT, 0),
+            "failed": counts.get(FAILED, 0),
+            "progress": round(done / total * 100, 1) if total else (100.0 if campaign.get("status") == COMPLETED else 0.0),
+            "running_here": campaign_id in self._tasks,
+        })
+        return campaign
+
+
+campaign_service = CampaignService(
+    workers=int(os.environ.get('CAMPAIGN_WORKERS', '4')),
+    rate_per_second=float(os.environ.get('CAMPAIGN_RATE_PER_SECOND', '5')),
+)
@@ -0,0 +1,148 @@
+"""
+In-process catalog cache
+
+TTL + LRU bounded caches (cachetools) for the storefront product read
+endpoints, keyed by normalized query parameters. Writes invalidate only the
+entries a changed product can affect: its own entry, listings and counts
+whose filter matches the product before or after the change, and best-seller
+lists that contain it.
+"""
+import os
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Product fields that can appear in a listing filter
+FILTER_FIELDS = ("category", "featured", "on_sale", "is_new", "best_seller", "tags")
+
+_MISSING = object()
+
+
+def normalize_params(**params) -> Tuple:
+    """Build a hashable cache key from query parameters (None values dropped)"""
+    items = []
+    for name, value in sorted(params.items()):
+        if value is None:
+            continue
+        if name == "tags" and isinstance(value, str):
+            value = tuple(sorted(t.strip() for t in value.split(",") if t.strip()))
+        elif isinstance(value, list):
+            value = tuple(value)
+        items.append((name, value))
+    return tuple(items)
+
+
+def product_matches(params: Tuple, product: dict) -> bool:
+    """Whether a product document satisfies the filter part of a cache key"""
+    for name, value in params:
+        if name not in FILTER_FIELDS:
+            continue
+        if name == "tags":
+            if not set(value) & set(product.get("tags") or []):
+                return False
+        elif product.get(name) != value:
+            return False
+    return True
+
+
+class CatalogCache:
+    """Namespaced TTL/LRU caches with hit/miss counters"""
+
+    NAMESPACES = ("product", "products", "count", "best_sellers", "categories")
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._caches: Dict[str, TTLCache] = {ns: TTLCache(maxsize=maxsize, ttl=ttl) for ns in self.NAMESPACES}
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.invalidations: Dict[str, int] = defaultdict(int)
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        """Return the cached value or _MISSING"""
+        value = self._caches[namespace].get(key, _MISSING)
+        if value is _MISSING:
+            self.misses[namespace] += 1
+        else:
+            self.hits[namespace] += 1
+        return value
+
+    def set(self, namespace: str, key: Hashable, value: Any):
+        self._caches[namespace][key] = value
+
+    def is_miss(self, value: Any) -> bool:
+        return value is _MISSING
+
+    def _drop(self, namespace: str, keys: Iterable[Hashable]):
+        cache = self._caches[namespace]
+        for key in list(keys):
+            if cache.pop(key, _MISSING) is not _MISSING:
+                self.invalidations[namespace] += 1
+
+    def invalidate_products(self, *products: Optional[dict]):
+        """Invalidate entries affected by products (pass before and after images)
+
+        A partial document holding only `id` is enough for changes that do not
+        touch filter fields (ratings, variations).
+        """
+        products = [p for p in products if p]
+        if not products:
+            return
+        product_ids = {p.get("id") for p in products}
+
+        self._drop("product", [pid for pid in product_ids if pid in self._caches["product"]])
+
+        # Listings: the filter matches either image, or the page already holds the product
+        cache = self._caches["products"]
+        stale = [
+            key for key in list(cache.keys())
+            if any(product_matches(key, p) for p in products)
+            or any(getattr(item, "id", None) in product_ids for item in cache.get(key, []))
+        ]
+        self._drop("products", stale)
+
+        cache = self._caches["count"]
+        stale = [key for key in list(cache.keys()) if any(product_matches(key, p) for p in products)]
+        self._drop("count", stale)
+
+        # Best sellers fall back to featured products when there are no orders
+        cache = self._caches["best_sellers"]
+        featured = any(p.get("featured") for p in products)
+        stale = []
+        for key in list(cache.keys()):
+            cached = cache.get(key, [])
+            if featured or any(getattr(item, "id", None) in product_ids for item in cached):
+                stale.append(key)
+        self._drop("best_sellers", stale)
+
+    def invalidate_categories(self):
+        self._drop("categories", list(self._caches["categories"].keys()))
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "maxsize": self.maxsize,
+            "namespaces": {
+                ns: {
+                    "size": len(self._caches[ns]),
+                    "hits": self.hits[ns],
+                    "misses": self.misses[ns],
+                    "invalidations": self.invalidations[ns],
+                }
+                for ns in self.NAMESPACES
+            },
+        }
+
+
+catalog_cache = CatalogCache(
+    maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', '1024')),
+    ttl=int(os.environ.get('CATALOG_CACHE_TTL', '60')),
+)
@@ -0,0 +1,313 @@
+"""
+Streaming catalog import
+
+Reads product rows from CSV, JSONL or an async scraper source one batch at a
+time, validates each row against the product create model, and upserts the
+batch with a single unordered bulk_write keyed on SKU (backed by a unique
+index). Only the current batch and a capped error sample are held in
+memory, so file size does not matter.
+
+    python catalog_import.py products.csv [--format jsonl] [--mode insert] [--dry-run]
+
+Admin uploads go through the same engine (POST /api/admin/products/import),
+with progress recorded in the `catalog_imports` collection.
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+MODES = ("upsert", "insert")
+
+# CSV cells for list fields (images, tags) hold several values
+CSV_LIST_SEPARATOR = "|"
+
+Row = Tuple[int, Any]  # (row number, dict or the exception raised while reading it)
+
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    raise ValueError(f"Unsupported file type '{extension}', expected .csv or .jsonl")
+
+
+def read_csv(stream: io.TextIOBase) -> Iterator[Row]:
+    for number, row in enumerate(csv.DictReader(stream), start=2):
+        yield number, {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+
+
+def read_jsonl(stream: io.TextIOBase) -> Iterator[Row]:
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+async def thread_batches(rows: Iterator[Row], size: int) -> AsyncIterator[List[Row]]:
+    """Pull batches from a blocking iterator without blocking the event loop"""
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(rows, size)))
+        if not batch:
+            return
+        yield batch
+
+
+async def async_batches(rows: AsyncIterator[dict], size: int) -> AsyncIterator[List[Row]]:
+    """Batch an async source (e.g. a scraper) that yields plain dict rows"""
+    batch, number = [], 0
+    async for row in rows:
+        number += 1
+        batch.append((number, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CatalogImporter:
+    """Validates rows with `create_model`, stores them as `document_model` documents"""
+
+    def __init__(
+        self,
+        create_model: type,
+        document_model: type,
+        prepare: Callable[[dict], dict] = lambda doc: doc,
+        key: str = "sku",
+        batch_size: int = 500,
+        max_errors: int = 50,
+    ):
+        self.create_model = create_model
+        self.document_model = document_model
+        self.prepare = prepare
+        self.key = key
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.list_fields = {
+            name for name, field in create_model.model_fields.items()
+            if getattr(field.annotation, "__origin__", None) is list
+        }
+
+    def _coerce(self, row: dict) -> dict:
+        row = dict(row)
+        for field in self.list_fields:
+            if isinstance(row.get(field), str):
+                row[field] = [v.strip() for v in row[field].split(CSV_LIST_SEPARATOR) if v.strip()]
+        return row
+
+    def to_update(self, row: dict, mode: str) -> UpdateOne:
+        """Validate one row; fields given in the row are set, the rest only on insert"""
+        row = self._coerce(row)
+        data: BaseModel = self.create_model.model_validate(row)
+        key_value = getattr(data, self.key, None)
+        if not key_value:
+            raise ValueError(f"Missing {self.key}")
+
+        # Document-only fields the source provides (id, rating...) are kept
+        document = self.prepare(self.document_model(**{**row, **data.model_dump()}).model_dump())
+        now = datetime.now(timezone.utc).isoformat()
+        # Fields the row actually carries are overwritten on existing products
+        provided = set() if mode == "insert" else (set(data.model_fields_set) & set(document)) - {self.key}
+        on_insert = {k: v for k, v in document.items() if k not in provided and k != self.key}
+        on_insert.pop("updated_at", None)
+        update = {"$setOnInsert": on_insert}
+        if provided:
+            update["$set"] = {**{k: document[k] for k in provided}, "updated_at": now}
+        else:
+            on_insert["updated_at"] = now
+        return UpdateOne({self.key: key_value}, update, upsert=True)
+
+    async def run(
+        self,
+        db,
+        batches: AsyncIterator[List[Row]],
+        mode: str = "upsert",
+        dry_run: bool = False,
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> dict:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}'")
+        stats = {
+            "rows": 0, "valid": 0, "invalid": 0,
+            "inserted": 0, "updated": 0, "unchanged": 0, "write_errors": 0,
+            "errors": [],
+        }
+
+        def error(row_number: int, message: str):
+            if len(stats["errors"]) < self.max_errors:
+                stats["errors"].append({"row": row_number, "error": message})
+
+        async for batch in batches:
+            ops, op_rows = [], []
+            for row_number, row in batch:
+                stats["rows"] += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    ops.append(self.to_update(row, mode))
+                    op_rows.append(row_number)
+                except ValidationError as e:
+                    stats["invalid"] += 1
+                    error(row_number, "; ".join(
+                        f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                    ))
+                except ValueError as e:
+                    stats["invalid"] += 1
+                    error(row_number, str(e))
+            stats["valid"] += len(ops)
+
+            if ops and not dry_run:
+                try:
+                    result = await db.products.bulk_write(ops, ordered=False)
+                    details = result.bulk_api_result
+                except BulkWriteError as e:
+                    # Concurrent insert of the same SKU: the unique index rejects it
+                    details = e.details
+                    stats["write_errors"] += len(details.get("writeErrors", []))
+                    for write_error in details.get("writeErrors", []):
+                        error(op_rows[write_error["index"]], write_error.get("errmsg", "write error"))
+                upserted = details.get("nUpserted", 0)
+                modified = details.get("nModified", 0)
+                stats["inserted"] += upserted
+                stats["updated"] += modified
+                stats["unchanged"] += details.get("nMatched", 0) - modified
+
+            if on_progress:
+                await on_progress(stats)
+        return stats
+
+    async def import_file(self, db, path: str, fmt: Optional[str] = None, **kwargs) -> dict:
+        fmt = fmt or detect_format(path)
+        with open(path, newline="", encoding="utf-8-sig") as stream:
+            return await self.run(db, thread_batches(READERS[fmt](stream), self.batch_size), **kwargs)
+
+    async def import_rows(self, db, rows: Iterable[dict], **kwargs) -> dict:
+        """Import from a plain (generator) iterable of dict rows"""
+        return await self.run(db, thread_batches(enumerate(rows, start=1), self.batch_size), **kwargs)
+
+    async def import_source(self, db, source: AsyncIterator[dict], **kwargs) -> dict:
+        """Import from an async source such as a scraper"""
+        return await self.run(db, async_batches(source, self.batch_size), **kwargs)
+
+
+def product_importer(**kwargs) -> CatalogImporter:
+    """Importer for the products collection, for scripts outside the API process"""
+    from server import Product, ProductCreate, prepare_for_mongo
+    return CatalogImporter(ProductCreate, Product, prepare_for_mongo, **kwargs)
+
+
+def print_stats(stats: dict):
+    print(f"   ✅ Inserted {stats['inserted']} new products, updated {stats['updated']}")
+    print(f"   ℹ️  Unchanged {stats['unchanged']}, invalid {stats['invalid']}")
+    for err in stats["errors"]:
+        print(f"   row {err['row']}: {err['error']}")
+
+
+# ---------- admin uploads ----------
+
+IMPORTS_COLLECTION = "catalog_imports"
+
+
+async def start_import_job(db, importer: CatalogImporter, path: str, fmt: str, filename: str,
+                           mode: str = "upsert", dry_run: bool = False,
+                           on_done: Optional[Callable[[dict], Awaitable[None]]] = None) -> str:
+    """Record an import and run it in the background; the file at `path` is removed afterwards"""
+    import_id = str(uuid.uuid4())
+    await db[IMPORTS_COLLECTION].insert_one({
+        "id": import_id,
+        "filename": filename,
+        "format": fmt,
+        "mode": mode,
+        "dry_run": dry_run,
+        "status": "running",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+    async def progress(stats: dict):
+        await db[IMPORTS_COLLECTION].update_one({"id": import_id}, {"$set": {"stats": stats}})
+
+    async def run():
+        try:
+            stats = await importer.import_file(db, path, fmt, mode=mode, dry_run=dry_run, on_progress=progress)
+            await db[IMPORTS_COLLECTION].update_one({"id": import_id}, {"$set": {
+                "status": "completed", "stats": stats, "finished_at": datetime.now(timezone.utc).isoformat(),
+            }})
+            if on_done and not dry_run:
+                await on_done(stats)
+        except Exception as e:
+            logger.error(f"Catalog import {import_id} failed: {str(e)}")
+            await db[IMPORTS_COLLECTION].update_one({"id": import_id}, {"$set": {
+                "status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc).isoformat(),
+            }})
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    asyncio.create_task(run())
+    return import_id
+
+
+async def get_import(db, import_id: str) -> Optional[dict]:
+    return await db[IMPORTS_COLLECTION].find_one({"id": import_id}, {"_id": 0})
+
+
+# ---------- CLI ----------
+
+async def main(argv: List[str]):
+    import argparse
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Import products from a CSV or JSONL file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--mode", choices=MODES, default="upsert",
+                        help="upsert updates existing SKUs, insert only adds new ones")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    args = parser.parse_args(argv)
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    importer = product_importer(batch_size=args.batch_size)
+
+    async def progress(stats):
+        print(f"   {stats['rows']} rows - {stats['inserted']} inserted, {stats['updated']} updated, "
+              f"{stats['invalid']} invalid")
+
+    stats = await importer.import_file(db, args.path, args.format, mode=args.mode, dry_run=args.dry_run,
+                                       on_progress=progress)
+    print_stats(stats)
+    client.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    asyncio.run(main(sys.argv[1:]))
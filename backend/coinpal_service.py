@@ -2,10 +2,11 @@ import os
 import hmac
 import hashlib
 import time
-import requests
 import logging
 from typing import Dict, Optional
 
+from http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 class CoinPalService:
@@ -18,7 +19,7 @@ class CoinPalService:
         self.api_key = os.environ.get('COINPAL_API_KEY', 'your_coinpal_api_key')
         self.api_secret = os.environ.get('COINPAL_API_SECRET', 'your_coinpal_api_secret')
         self.webhook_secret = os.environ.get('COINPAL_WEBHOOK_SECRET', 'your_webhook_secret')
-        self.base_url = "https://api.coinpal.io/v1"
+        self.base_url = os.environ.get('COINPAL_BASE_URL', "https://api.coinpal.io/v1")
         self.is_demo = self.api_key == 'your_coinpal_api_key'
     
     def _generate_signature(self, payload: str) -> str:
@@ -98,11 +99,10 @@ class CoinPalService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(
+            response = await http_client.post(
                 f"{self.base_url}/payments/create",
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             if response.status_code == 200:
@@ -164,10 +164,9 @@ class CoinPalService:
                 "X-SIGNATURE": signature
             }
             
-            response = requests.get(
+            response = await http_client.get(
                 f"{self.base_url}/payments/{payment_id}",
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             if response.status_code == 200:
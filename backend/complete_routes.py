@@ -1,16 +1,20 @@
 """
 Complete API routes for full e-commerce functionality
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Response, Request
+from fastapi.responses import FileResponse
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 import os
 from datetime import datetime, timezone
 import uuid
-import shutil
 from pathlib import Path
 
+from catalog_cache import catalog_cache
+from pagination import keyset_page, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from media_pipeline import media_pipeline, MediaError, READY, ORIGINAL_ONLY
+
 # Create router
 complete_router = APIRouter(prefix="/api/v2", tags=["complete"])
 
@@ -20,7 +24,7 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Upload directory
-UPLOAD_DIR = Path("/app/backend/uploads")
+UPLOAD_DIR = media_pipeline.upload_dir
 UPLOAD_DIR.mkdir(exist_ok=True)
 
 # ==================== HELPER FUNCTIONS ====================
@@ -48,34 +52,19 @@ class ReviewCreate(BaseModel):
 
 @complete_router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """Upload image or video"""
-    # Validate file type
-    allowed = ["image/jpeg", "image/png", "image/gif", "image/webp", "video/mp4"]
-    if file.content_type not in allowed:
-        raise HTTPException(status_code=400, detail="Invalid file type")
-    
-    # Generate unique filename
-    file_ext = Path(file.filename).suffix
-    unique_name = f"{uuid.uuid4()}{file_ext}"
-    file_path = UPLOAD_DIR / unique_name
-    
-    # Save file
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Save to database
-    media = {
-        "id": str(uuid.uuid4()),
-        "filename": unique_name,
-        "original_name": file.filename,
-        "url": f"/uploads/{unique_name}",
-        "type": "image" if file.content_type.startswith("image") else "video",
-        "size": file_path.stat().st_size,
-        "created_at": datetime.now(timezone.utc).isoformat()
+    """Upload image or video; identical files are stored once and images get resized renditions"""
+    try:
+        media = await media_pipeline.store(db, file)
+    except MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    return {
+        "url": media["url"],
+        "id": media["id"],
+        "type": media["type"],
+        "sha256": media.get("sha256"),
+        "deduplicated": media["deduplicated"],
     }
-    await db.media.insert_one(media)
-    
-    return {"url": media["url"], "id": media["id"], "type": media["type"]}
 
 @complete_router.get("/media")
 async def get_media():
@@ -83,6 +72,30 @@ async def get_media():
     media = await db.media.find({}, {"_id": 0}).sort("created_at", -1).limit(100).to_list(100)
     return media
 
+@complete_router.get("/media/{filename}")
+async def get_media_rendition(filename: str, request: Request, w: Optional[int] = None, format: Optional[str] = None):
+    """Serve an upload resized for width `w` (WebP/AVIF when accepted), or the original"""
+    if Path(filename).name != filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="Media not found")
+    
+    media = await media_pipeline.get(db, filename)
+    path, content_type = media_pipeline.pick(
+        filename, media, w, accept=request.headers.get("accept", ""), fmt=format
+    )
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Media not found")
+    
+    # File names are content hashes (or unique ids for older uploads), so a response only changes
+    # while renditions are pending and the original is served in their place
+    if content_type or (media and media.get("status") in (READY, ORIGINAL_ONLY)):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=60"
+    return FileResponse(path, media_type=content_type, headers={
+        "Cache-Control": cache_control,
+        "Vary": "Accept",
+    })
+
 # ==================== CATEGORIES ====================
 
 @complete_router.post("/categories")
@@ -102,6 +115,7 @@ async def create_category(name: str, description: str, parent_id: Optional[str]
     }
     
     await db.categories.insert_one(category_data)
+    catalog_cache.invalidate_categories()
     return category_data
 
 @complete_router.get("/categories")
@@ -133,6 +147,7 @@ async def delete_category(category_id: str):
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_cache.invalidate_categories()
     return {"message": "Deleted"}
 
 # ==================== REVIEWS ====================
@@ -161,18 +176,42 @@ async def create_review(review: ReviewCreate):
     return parse_from_mongo(review_data)
 
 @complete_router.get("/reviews/product/{product_id}")
-async def get_product_reviews(product_id: str):
-    """Get approved reviews for product"""
-    reviews = await db.reviews.find(
-        {"product_id": product_id, "status": "approved"},
-        {"_id": 0}
-    ).to_list(None)
+async def get_product_reviews(
+    product_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    sort_order: str = "desc",
+    cursor: Optional[str] = None
+):
+    """Get approved reviews for product (paged when limit or cursor is given)"""
+    query = {"product_id": product_id, "status": "approved"}
+    if limit is None and cursor is None:
+        return await db.reviews.find(query, {"_id": 0}).to_list(None)
+    
+    sort_direction = -1 if sort_order == "desc" else 1
+    reviews, next_cursor = await keyset_page(
+        db.reviews, query, "created_at", sort_direction, limit or 20, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return reviews
 
 @complete_router.get("/reviews/pending")
-async def get_pending_reviews():
-    """Get pending reviews"""
-    reviews = await db.reviews.find({"status": "pending"}, {"_id": 0}).to_list(None)
+async def get_pending_reviews(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Get pending reviews (paged when limit or cursor is given)"""
+    query = {"status": "pending"}
+    if limit is None and cursor is None:
+        return await db.reviews.find(query, {"_id": 0}).to_list(None)
+    
+    reviews, next_cursor = await keyset_page(
+        db.reviews, query, "created_at", 1, limit or 20, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return reviews
 
 @complete_router.put("/reviews/{review_id}/status")
@@ -209,3 +248,4 @@ async def update_product_rating(product_id: str):
         {"id": product_id},
         {"$set": {"rating": round(avg_rating, 1), "reviews_count": reviews_count}}
     )
+    catalog_cache.invalidate_products({"id": product_id})
@@ -0,0 +1,237 @@
+"""
+MongoDB index bootstrap
+
+Declares the index set each collection is expected to carry, creates the
+missing ones at startup and reports drift between the declared set and what
+is actually present in the database.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _index(keys, **options) -> IndexModel:
+    """Build an IndexModel with the default pymongo name and background build"""
+    options.setdefault("background", True)
+    return IndexModel(keys, **options)
+
+
+# Declared index set per collection.
+# Compound product indexes follow the filters and sorts of GET /api/products:
+# equality filter first, then the sort key, then `id` as the keyset tiebreaker.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "products": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("category", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)]),
+        _index([("category", ASCENDING), ("sales_count", DESCENDING), ("id", DESCENDING)]),
+        _index([("category", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)]),
+        _index([("featured", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("on_sale", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("is_new", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("best_seller", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("tags", ASCENDING)]),
+        _index([("price", ASCENDING), ("id", ASCENDING)]),
+        _index([("sales_count", DESCENDING), ("id", DESCENDING)]),
+        _index([("stock", ASCENDING)]),
+        # Catalog imports upsert on SKU; products without one are not constrained
+        _index([("sku", ASCENDING)], name="sku_unique", unique=True,
+               partialFilterExpression={"sku": {"$type": "string"}}),
+    ],
+    "orders": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("order_number", ASCENDING)], unique=True),
+        _index([("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("order_status", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("payment_status", ASCENDING), ("created_at", DESCENDING)]),
+        _index([("items.product_id", ASCENDING)]),
+    ],
+    "users": [
+        _index([("email", ASCENDING)], unique=True),
+        _index([("id", ASCENDING)], unique=True),
+        _index([("role", ASCENDING)]),
+        _index([("reset_token", ASCENDING)], sparse=True),
+    ],
+    "reviews": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("product_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "wishlists": [
+        _index([("user_id", ASCENDING)], unique=True),
+    ],
+    "coupons": [
+        _index([("code", ASCENDING)], unique=True),
+        _index([("id", ASCENDING)]),
+    ],
+    "categories": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("slug", ASCENDING)]),
+        _index([("parent_id", ASCENDING), ("display_order", ASCENDING)]),
+    ],
+    "customers": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("email", ASCENDING)], unique=True),
+        _index([("created_at", DESCENDING), ("id", DESCENDING)]),
+        _index([("customer_group", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "product_variations": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("product_id", ASCENDING)]),
+    ],
+    "media": [
+        _index([("created_at", DESCENDING)]),
+        _index([("filename", ASCENDING)]),
+        # Content-hash deduplication; uploads made before hashing have no sha256
+        _index([("sha256", ASCENDING)], unique=True, partialFilterExpression={"sha256": {"$type": "string"}}),
+    ],
+    "bulk_emails": [
+        _index([("created_at", DESCENDING)]),
+        _index([("id", ASCENDING)], unique=True),
+        _index([("status", ASCENDING)]),
+    ],
+    "bulk_email_recipients": [
+        _index([("campaign_id", ASCENDING), ("email", ASCENDING)], unique=True),
+        _index([("campaign_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "jobs": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("status", ASCENDING), ("run_at", ASCENDING)]),
+        _index([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        _index([("updated_at", DESCENDING)]),
+        _index([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "stock_reservations": [
+        _index([("order_id", ASCENDING)], unique=True),
+        _index([("status", ASCENDING), ("expires_at", ASCENDING)]),
+    ],
+    "sessions": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("user_id", ASCENDING), ("last_used_at", DESCENDING)]),
+        # Incremental polls of the revocation filter
+        _index([("revoked_at", ASCENDING)], sparse=True),
+        _index([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        # Shared rate limit windows (RATE_LIMIT_BACKEND=mongo)
+        _index([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "migrations": [
+        _index([("version", ASCENDING)], unique=True),
+    ],
+    "catalog_imports": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("started_at", DESCENDING)]),
+    ],
+    "webhook_events": [
+        # Deduplicates provider retries: one document per provider event
+        _index([("key", ASCENDING)], unique=True),
+        _index([("status", ASCENDING), ("received_at", ASCENDING)]),
+        _index([("provider", ASCENDING), ("received_at", DESCENDING)]),
+    ],
+}
+
+
+class IndexManager:
+    """Creates the declared indexes and keeps the last drift report"""
+
+    def __init__(self, specs: Dict[str, List[IndexModel]]):
+        self.specs = specs
+        self.report: Dict = {"status": "not_started"}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db):
+        """Schedule index creation in the background so startup is not blocked"""
+        if self._task and not self._task.done():
+            return self._task
+        self.report = {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}
+        self._task = asyncio.create_task(self.ensure_indexes(db))
+        return self._task
+
+    async def ensure_indexes(self, db) -> Dict:
+        """Create missing indexes on every collection, then compute drift"""
+        created: Dict[str, List[str]] = {}
+        errors: Dict[str, Dict[str, str]] = {}
+
+        for collection_name, models in self.specs.items():
+            collection = db[collection_name]
+            existing = await self._existing_indexes(collection)
+            for model in models:
+                name = model.document["name"]
+                if name in existing:
+                    continue
+                try:
+                    await collection.create_indexes([model])
+                    created.setdefault(collection_name, []).append(name)
+                except OperationFailure as e:
+                    # Typically duplicate keys on a unique index: still index the
+                    # field without the constraint so lookups stop scanning.
+                    errors.setdefault(collection_name, {})[name] = str(e)
+                    logger.error(f"Failed to create index {collection_name}.{name}: {str(e)}")
+                    fallback = {k: v for k, v in model.document.items() if k not in ("key", "unique")}
+                    if model.document.get("unique"):
+                        try:
+                            await collection.create_index(list(model.document["key"].items()), **fallback)
+                        except OperationFailure as e2:
+                            logger.error(f"Fallback index {collection_name}.{name} failed: {str(e2)}")
+                except Exception as e:
+                    errors.setdefault(collection_name, {})[name] = str(e)
+                    logger.error(f"Failed to create index {collection_name}.{name}: {str(e)}")
+
+        drift = await self.check_drift(db)
+        self.report = {
+            "status": "completed" if not errors else "completed_with_errors",
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "created": created,
+            "errors": errors,
+            "drift": drift,
+        }
+        total_created = sum(len(v) for v in created.values())
+        logger.info(f"✓ Index bootstrap finished - {total_created} created, {len(errors)} collections with errors")
+        return self.report
+
+    async def check_drift(self, db) -> Dict:
+        """Compare the declared index set with the indexes present in the database"""
+        drift: Dict[str, Dict] = {}
+        for collection_name, models in self.specs.items():
+            existing = await self._existing_indexes(db[collection_name])
+            declared = {m.document["name"]: m.document for m in models}
+
+            missing = [name for name in declared if name not in existing]
+            extra = [name for name in existing if name not in declared and name != "_id_"]
+            mismatched = []
+            for name, document in declared.items():
+                info = existing.get(name)
+                if info is None:
+                    continue
+                for option in ("unique", "sparse", "expireAfterSeconds"):
+                    if bool(document.get(option)) != bool(info.get(option)):
+                        mismatched.append({
+                            "index": name,
+                            "option": option,
+                            "declared": document.get(option, False),
+                            "actual": info.get(option, False),
+                        })
+
+            if missing or extra or mismatched:
+                drift[collection_name] = {"missing": missing, "extra": extra, "mismatched": mismatched}
+        return drift
+
+    @staticmethod
+    async def _existing_indexes(collection) -> Dict[str, Dict]:
+        try:
+            return await collection.index_information()
+        except OperationFailure:
+            # Collection does not exist yet
+            return {}
+
+
+index_manager = IndexManager(INDEX_SPECS)
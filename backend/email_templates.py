@@ -0,0 +1,248 @@
+"""
+Precompiled email templates
+
+Templates live in templates/email and are compiled once, when the module is
+imported, into a generated Python function that joins static strings and
+looked-up values in a single pass. Syntax:
+
+    {{ order.total|money }}   value looked up by dotted path, HTML-escaped
+    {{ price*quantity|money }}  product of looked-up values (missing counts as 0)
+    {{{ content }}}           value inserted as-is (pre-rendered HTML)
+    {% include "partials/footer.html" %}   inlined at compile time
+
+Includes are resolved during compilation and adjacent static text is merged,
+so shared headers and footers cost nothing at render time, and templates
+without placeholders are rendered once and cached. Repeated rows (order
+items) are rendered with render_each(), which joins the rows in one pass.
+"""
+import html
+import logging
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).parent / "templates" / "email"
+
+TOKEN_RE = re.compile(
+    r"\{\{\{\s*(?P<raw>[\w.|*]+)\s*\}\}\}"
+    r"|\{\{\s*(?P<escaped>[\w.|*]+)\s*\}\}"
+    r"|\{%\s*include\s+\"(?P<include>[\w./-]+)\"\s*%\}"
+)
+
+
+class TemplateError(Exception):
+    pass
+
+
+def _money(value) -> str:
+    try:
+        return f"{float(value or 0):.2f}"
+    except (TypeError, ValueError):
+        return "0.00"
+
+
+FILTERS: Dict[str, Callable[[Any], Any]] = {
+    "money": _money,
+    "upper": lambda value: str(value).upper(),
+    "lower": lambda value: str(value).lower(),
+}
+
+# Filters whose output never needs HTML escaping
+SAFE_FILTERS = {"money"}
+
+
+def _lookup(context: dict, keys: tuple):
+    value: Any = context
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        else:
+            value = getattr(value, key, None)
+        if value is None:
+            return None
+    return value
+
+
+_NUMBERS = (int, float)
+
+
+def _escape(value) -> str:
+    if value is None:
+        return ""
+    if value.__class__ is int or value.__class__ is float:
+        return str(value)
+    return html.escape(str(value), quote=True)
+
+
+def _raw(value) -> str:
+    return "" if value is None else str(value)
+
+
+class Placeholder:
+    """A `{{ path|filter }}` or `{{{ path }}}` slot"""
+
+    def __init__(self, path: str, escape: bool):
+        expression, *filters = path.split("|")
+        for name in filters:
+            if name not in FILTERS:
+                raise TemplateError(f"Unknown filter: {name}")
+        self.factors = [tuple(factor.split(".")) for factor in expression.split("*")]
+        self.filters = filters
+        self.escape = escape
+
+    def lookup(self) -> str:
+        """Python expression looking the slot's value up in context `c`"""
+        values = [f"c.get({keys[0]!r})" if len(keys) == 1 else f"_lookup(c, {keys!r})" for keys in self.factors]
+        if len(values) == 1:
+            return values[0]
+        return " * ".join(f"({value} or 0)" for value in values)
+
+    def source(self, var: str) -> str:
+        """Python expression producing the slot's text from its looked-up value `var`"""
+        if self.filters:
+            value = var
+            for name in self.filters[:-1]:
+                value = f"_filter_{name}({value})"
+            last = self.filters[-1]
+            if last == "money":
+                # Float prices format inline; anything else goes through the tolerant filter
+                value = f"(format({value}, '.2f') if {value}.__class__ is float else _filter_money({value}))" \
+                    if value == var else f"_filter_money({value})"
+            else:
+                value = f"_filter_{last}({value})"
+            if last in SAFE_FILTERS:
+                return value
+            return f"{'_escape' if self.escape else '_raw'}({value})"
+        if not self.escape:
+            return f"('' if {var} is None else str({var}))"
+        # Inline the common cases so a row costs no extra Python call per slot
+        return (f"('' if {var} is None else str({var}) if {var}.__class__ in _NUMBERS "
+                f"else _html_escape(str({var})))")
+
+
+class Template:
+    """A compiled template: static text and slots turned into one Python function"""
+
+    def __init__(self, name: str, parts: List[Union[str, Placeholder]]):
+        self.name = name
+        self.parts = parts
+        if not parts:
+            self.static: Optional[str] = ""
+        elif len(parts) == 1 and isinstance(parts[0], str):
+            self.static = parts[0]
+        else:
+            self.static = None
+        self._render = self._compile() if self.static is None else None
+
+    def _compile(self) -> Callable[[dict], str]:
+        # Helpers and static text are bound as default arguments (fast locals), values are
+        # looked up once into locals and the output is built by a single f-string
+        constants: Dict[str, Any] = {"_lookup": _lookup, "_escape": _escape, "_raw": _raw,
+                                     "_html_escape": html.escape, "_NUMBERS": _NUMBERS}
+        constants.update({f"_filter_{name}": func for name, func in FILTERS.items()})
+        lookups, fields = [], []
+        for index, part in enumerate(self.parts):
+            if isinstance(part, str):
+                constants[f"_s{index}"] = part
+                fields.append(f"{{_s{index}}}")
+            else:
+                lookups.append(f"    v{index} = {part.lookup()}\n")
+                fields.append(f"{{{part.source(f'v{index}')}}}")
+        arguments = ", ".join(f"{name}={name}" for name in constants)
+        source = f"def render(c, {arguments}):\n{''.join(lookups)}    return f\"{''.join(fields)}\"\n"
+        namespace: Dict[str, Any] = dict(constants)
+        exec(compile(source, f"<template {self.name}>", "exec"), namespace)
+        return namespace["render"]
+
+    def render(self, context: Optional[dict] = None) -> str:
+        if self.static is not None:
+            return self.static
+        return self._render(context or {})
+
+
+class TemplateEngine:
+    """Loads and compiles every template under a directory"""
+
+    def __init__(self, directory: Path = TEMPLATE_DIR):
+        self.directory = directory
+        self.templates: Dict[str, Template] = {}
+        self._sources: Dict[str, str] = {}
+        self.load()
+
+    def load(self):
+        """(Re)compile every .html file under the template directory"""
+        self._sources = {
+            path.relative_to(self.directory).as_posix(): path.read_text(encoding="utf-8")
+            for path in sorted(self.directory.rglob("*.html"))
+        }
+        self.templates = {name: Template(name, self._compile(name, ())) for name in self._sources}
+        logger.info(f"Email templates compiled - {len(self.templates)} templates")
+
+    def _compile(self, name: str, stack: tuple) -> List[Union[str, Placeholder]]:
+        if name in stack:
+            raise TemplateError(f"Recursive include: {' -> '.join(stack + (name,))}")
+        if name not in self._sources:
+            raise TemplateError(f"Template not found: {name}")
+        source = self._sources[name]
+
+        parts: List[Union[str, Placeholder]] = []
+
+        def add_static(text: str):
+            if not text:
+                return
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += text
+            else:
+                parts.append(text)
+
+        position = 0
+        for match in TOKEN_RE.finditer(source):
+            add_static(source[position:match.start()])
+            position = match.end()
+            if match.group("include"):
+                for part in self._compile(match.group("include"), stack + (name,)):
+                    if isinstance(part, str):
+                        add_static(part)
+                    else:
+                        parts.append(part)
+            elif match.group("raw"):
+                parts.append(Placeholder(match.group("raw"), escape=False))
+            else:
+                parts.append(Placeholder(match.group("escaped"), escape=True))
+        add_static(source[position:])
+        return parts
+
+    def get(self, name: str) -> Template:
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise TemplateError(f"Template not found: {name}")
+
+    def render(self, name: str, context: Optional[dict] = None) -> str:
+        return self.get(name).render(context)
+
+    def render_each(self, name: str, rows: Iterable[dict]) -> str:
+        """Render a row template once per item and join the results"""
+        template = self.get(name)
+        if template.static is not None:
+            return "".join(template.static for _ in rows)
+        render = template._render
+        return "".join([render(row) for row in rows])
+
+    def render_page(self, name: str, context: Optional[dict] = None, layout: str = "layouts/standard.html") -> str:
+        """Render a page template inside a layout (passed to it as `content`)"""
+        context = dict(context or {})
+        context["content"] = self.render(name, context)
+        return self.render(layout, context)
+
+    def fragment(self, name: str) -> str:
+        """Cached output of a template without placeholders"""
+        template = self.get(name)
+        if template.static is None:
+            raise TemplateError(f"{name} is not a static fragment")
+        return template.static
+
+
+templates = TemplateEngine()
@@ -0,0 +1,256 @@
+"""
+Streaming data exports
+
+Rows are read from a Motor cursor in batches and encoded as they arrive,
+so an export of any size holds one batch in memory and the first bytes go
+out as soon as the first batch is read. CSV and XLSX flatten documents to
+the declared columns; JSONL writes every field. Text cells starting with a
+formula character are prefixed with a quote so they open as plain text.
+
+XLSX is produced without a spreadsheet library: the workbook is a zip
+written to an unseekable stream (zip data descriptors), with the sheet XML
+using inline strings, and the buffer is drained after every batch.
+"""
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+BATCH_SIZE = 1000
+
+# (header, field path or function of the document)
+Column = Tuple[str, object]
+
+ORDER_COLUMNS: List[Column] = [
+    ("Order number", "order_number"),
+    ("Order ID", "id"),
+    ("Created at", "created_at"),
+    ("Customer email", "user_email"),
+    ("Customer name", "user_name"),
+    ("Order status", "order_status"),
+    ("Payment status", "payment_status"),
+    ("Payment method", "payment_method"),
+    ("Items", lambda order: sum(item.get("quantity", 0) for item in order.get("items") or [])),
+    ("Subtotal", "subtotal"),
+    ("Coupon", "coupon_code"),
+    ("Discount", "discount_amount"),
+    ("Crypto discount", "crypto_discount"),
+    ("Shipping method", "shipping_method"),
+    ("Shipping", "shipping_cost"),
+    ("Total", "total"),
+    ("Country", "shipping_address.country"),
+    ("Tracking number", "tracking_number"),
+]
+
+CUSTOMER_COLUMNS: List[Column] = [
+    ("Customer ID", "id"),
+    ("Name", "name"),
+    ("Email", "email"),
+    ("Phone", "phone"),
+    ("Group", "customer_group"),
+    ("Orders", "total_orders"),
+    ("Total spent", "total_spent"),
+    ("Created at", "created_at"),
+]
+
+PRODUCT_COLUMNS: List[Column] = [
+    ("Product ID", "id"),
+    ("SKU", "sku"),
+    ("Name", "name"),
+    ("Category", "category"),
+    ("Price", "price"),
+    ("Compare at price", "compare_at_price"),
+    ("Cost", "cost"),
+    ("Stock", "stock"),
+    ("Sales", "sales_count"),
+    ("Featured", "featured"),
+    ("On sale", "on_sale"),
+    ("Tags", lambda product: "|".join(product.get("tags") or [])),
+    ("Created at", "created_at"),
+]
+
+# Leading characters that make spreadsheet apps evaluate a text cell
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def column_value(doc: dict, column) -> object:
+    if callable(column):
+        return column(doc)
+    value = doc
+    for part in column.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _cell(value) -> object:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Customer-supplied text must not run as a formula when the file is opened
+        return "'" + value
+    return value
+
+
+def _row(doc: dict, columns: List[Column]) -> list:
+    return [_cell(column_value(doc, path)) for _, path in columns]
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[dict]]:
+    batch = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_csv(cursor, columns: List[Column], batch_size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so spreadsheet apps pick UTF-8
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+    yield buffer.getvalue().encode()
+    async for batch in _batches(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_row(doc, columns) for doc in batch)
+        yield buffer.getvalue().encode()
+
+
+async def stream_jsonl(cursor, columns: List[Column] = None, batch_size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield "".join(json.dumps(doc, default=str) + "\n" for doc in batch).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Unseekable sink whose written bytes are collected and handed out per batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number: int, values: list) -> str:
+    cells = []
+    for index, value in enumerate(values):
+        ref = f"{_column_letter(index)}{number}"
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        elif value != "":
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _workbook(sheet_name: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+async def stream_xlsx(cursor, columns: List[Column], batch_size: int = BATCH_SIZE,
+                      sheet_name: str = "Export") -> AsyncIterator[bytes]:
+    sink = _Drain()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        workbook.writestr("xl/workbook.xml", _workbook(sheet_name))
+
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, [header for header, _ in columns]).encode())
+            yield sink.take()
+
+            number = 1
+            async for batch in _batches(cursor, batch_size):
+                rows = []
+                for doc in batch:
+                    number += 1
+                    rows.append(_xlsx_row(number, _row(doc, columns)))
+                sheet.write("".join(rows).encode())
+                yield sink.take()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.take()
+
+
+STREAMERS: Dict[str, Callable] = {"csv": stream_csv, "jsonl": stream_jsonl, "xlsx": stream_xlsx}
+
+
+def export_response(cursor, fmt: str, columns: List[Column], name: str) -> StreamingResponse:
+    """StreamingResponse for an export; fmt must be one of FORMATS"""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        STREAMERS[fmt](cursor, columns),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{stamp}.{fmt}"'},
+    )
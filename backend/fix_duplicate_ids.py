@@ -1,12 +1,15 @@
 """
 Fix duplicate admin IDs
+
+Kept as an entry point; the work is migration 0004 (python -m migrations run 0004).
 """
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import uuid
+
+from migrations import runner
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -16,17 +19,8 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 async def fix_duplicate_ids():
-    # Find admins with duplicate IDs
-    admins = await db.users.find({'role': 'admin'}, {'_id': 0}).to_list(length=10)
-    
-    for admin in admins:
-        if admin.get('id') == 'admin-001':
-            new_id = str(uuid.uuid4())
-            result = await db.users.update_one(
-                {'email': admin['email']},
-                {'$set': {'id': new_id}}
-            )
-            print(f"✅ Updated {admin['email']} with new ID: {new_id}")
+    result = (await runner.run(db, ["0004"], force=True))[0]
+    print(f"✅ Reassigned {result['stats']['modified']} admin IDs")
     
     # Show all admins after fix
     print("\n📋 All admins after fix:")
@@ -0,0 +1,144 @@
+"""
+Local stub of the payment gateway APIs
+
+Answers the endpoints used by the Plisio, PayPal, Stripe, Binance Pay and
+CoinPal services with canned success responses, so checkout can be exercised
+(and load tested) without sandbox credentials or network access.
+
+    uvicorn gateway_stub:app --port 8099
+
+then point the services at it (any non-placeholder key disables demo mode):
+
+    PLISIO_BASE_URL=http://127.0.0.1:8099/plisio
+    PAYPAL_BASE_URL=http://127.0.0.1:8099/paypal
+    STRIPE_BASE_URL=http://127.0.0.1:8099/stripe
+    BINANCE_PAY_BASE_URL=http://127.0.0.1:8099/binance
+    COINPAL_BASE_URL=http://127.0.0.1:8099/coinpal
+
+STUB_LATENCY_MS adds a delay to every response and STUB_FAILURE_RATE (0-1)
+makes that share of requests answer 503, to exercise retries and the circuit
+breaker.
+"""
+import asyncio
+import os
+import random
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Payment gateway stub")
+
+STUB_URL = os.environ.get('STUB_PUBLIC_URL', 'http://127.0.0.1:8099')
+
+
+@app.middleware("http")
+async def latency_and_failures(request: Request, call_next):
+    latency = float(os.environ.get('STUB_LATENCY_MS', '0'))
+    if latency:
+        await asyncio.sleep(latency / 1000)
+    if random.random() < float(os.environ.get('STUB_FAILURE_RATE', '0')):
+        return JSONResponse({"error": "stub failure"}, status_code=503)
+    return await call_next(request)
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:16]}"
+
+
+# ---------- Plisio ----------
+
+@app.get("/plisio/invoices/new")
+async def plisio_invoice(request: Request):
+    params = request.query_params
+    txn_id = _id("txn")
+    return {"status": "success", "data": {
+        "txn_id": txn_id,
+        "invoice_url": f"{STUB_URL}/plisio/invoice/{txn_id}",
+        "amount": params.get("source_amount"),
+        "currency": params.get("currency"),
+        "wallet_hash": _id("wallet"),
+        "status": "new",
+        "qr_code": None,
+    }}
+
+
+@app.get("/plisio/operations")
+async def plisio_operations(id: str):
+    return {"status": "success", "data": [{"status": "completed", "amount": "100.00", "tx_hash": _id("tx")}]}
+
+
+# ---------- PayPal ----------
+
+@app.post("/paypal/v1/oauth2/token")
+async def paypal_token():
+    return {"access_token": _id("A21AA"), "token_type": "Bearer", "expires_in": 32400}
+
+
+@app.post("/paypal/v2/checkout/orders", status_code=201)
+async def paypal_order():
+    order_id = _id("PP").upper()
+    return {"id": order_id, "status": "CREATED", "links": [
+        {"rel": "approve", "href": f"{STUB_URL}/paypal/checkoutnow?token={order_id}"},
+    ]}
+
+
+@app.post("/paypal/v2/checkout/orders/{order_id}/capture", status_code=201)
+async def paypal_capture(order_id: str):
+    return {"id": order_id, "status": "COMPLETED", "purchase_units": [
+        {"payments": {"captures": [{"id": _id("CAP").upper()}]}},
+    ]}
+
+
+# ---------- Stripe ----------
+
+@app.post("/stripe/products")
+async def stripe_product():
+    return {"id": _id("prod")}
+
+
+@app.post("/stripe/prices")
+async def stripe_price():
+    return {"id": _id("price")}
+
+
+@app.post("/stripe/payment_links")
+async def stripe_payment_link():
+    link_id = _id("plink")
+    return {"id": link_id, "url": f"{STUB_URL}/stripe/pay/{link_id}"}
+
+
+@app.get("/stripe/checkout/sessions/{session_id}")
+async def stripe_session(session_id: str):
+    return {"id": session_id, "payment_status": "paid", "amount_total": 10000}
+
+
+# ---------- Binance Pay ----------
+
+@app.post("/binance/binancepay/openapi/v2/order")
+async def binance_order():
+    prepay_id = _id("prepay")
+    return {"status": "SUCCESS", "data": {
+        "prepayId": prepay_id,
+        "checkoutUrl": f"{STUB_URL}/binance/checkout/{prepay_id}",
+        "qrcodeLink": None,
+        "universalUrl": {},
+    }}
+
+
+@app.post("/binance/binancepay/openapi/v2/order/query")
+async def binance_query():
+    return {"status": "SUCCESS", "data": {"status": "PAID", "orderAmount": "100.00"}}
+
+
+# ---------- CoinPal ----------
+
+@app.post("/coinpal/payments/create")
+async def coinpal_create():
+    payment_id = _id("cp")
+    return {"payment_id": payment_id, "payment_url": f"{STUB_URL}/coinpal/pay/{payment_id}", "expires_at": None, "qr_code": None}
+
+
+@app.get("/coinpal/payments/{payment_id}")
+async def coinpal_status(payment_id: str):
+    return {"status": "completed", "amount_received": "100.00", "currency": "USD", "transaction_hash": _id("tx")}
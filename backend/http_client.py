@@ -0,0 +1,217 @@
+"""
+Shared async HTTP client for outbound API calls
+
+One httpx.AsyncClient (keep-alive connection pool) per origin, explicit
+timeouts, retries with full-jitter exponential backoff and a circuit breaker
+per host so a failing gateway fails fast instead of tying up checkout
+requests. Only requests that are safe to repeat are retried after they may
+have reached the server; connection failures are always retried.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the host while its circuit is open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, lets one probe through after reset_timeout"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+        if self.state == self.HALF_OPEN:
+            # A probe is already in flight
+            self.rejected += 1
+            return False
+        return True
+
+    def abandon(self):
+        """The probe ended without an answer (e.g. cancelled): let the next call probe again"""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class HTTPClient:
+    """Per-host pooled httpx clients with retries and circuit breaking"""
+
+    def __init__(
+        self,
+        timeout: Optional[httpx.Timeout] = None,
+        max_connections_per_host: int = 20,
+        max_keepalive_per_host: int = 10,
+        keepalive_expiry: float = 30.0,
+        retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 2.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.timeout = timeout or httpx.Timeout(30.0, connect=5.0, pool=5.0)
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_keepalive_per_host,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _client(self, origin: str) -> httpx.AsyncClient:
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[origin] = client
+        return client
+
+    def breaker(self, origin: str) -> CircuitBreaker:
+        breaker = self._breakers.get(origin)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[origin] = breaker
+        return breaker
+
+    def _count(self, origin: str, key: str):
+        counters = self.counters.setdefault(origin, {"requests": 0, "retries": 0, "errors": 0})
+        counters[key] = counters.get(key, 0) + 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def request(self, method: str, url: str, *, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request through the pool of url's host.
+
+        retry=None retries only idempotent methods once the request may have
+        been sent; retry=True/False forces it either way. Raises
+        CircuitOpenError while the host's circuit is open, otherwise the
+        last httpx error.
+        """
+        method = method.upper()
+        origin = self._origin(url)
+        breaker = self.breaker(origin)
+        client = self._client(origin)
+        can_resend = retry if retry is not None else method in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {origin}")
+            self._count(origin, "requests")
+            try:
+                response = await client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Never reached the server: safe to retry any method
+                breaker.record_failure()
+                self._count(origin, "errors")
+                if attempt >= self.retries:
+                    raise
+                error = e
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                self._count(origin, "errors")
+                if not can_resend or attempt >= self.retries:
+                    raise
+                error = e
+            except asyncio.CancelledError:
+                breaker.abandon()
+                raise
+            except Exception:
+                # Decoding errors, invalid URLs...: still an outcome, so a half-open probe is never left hanging
+                breaker.record_failure()
+                self._count(origin, "errors")
+                raise
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or not can_resend or attempt >= self.retries:
+                    return response
+                error = f"HTTP {response.status_code}"
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            self._count(origin, "retries")
+            logger.warning(f"{method} {origin} failed ({error}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+    def stats(self) -> dict:
+        origins = set(self._clients) | set(self._breakers)
+        return {
+            origin: {
+                "circuit": self.breaker(origin).stats(),
+                **self.counters.get(origin, {}),
+            }
+            for origin in sorted(origins)
+        }
+
+
+http_client = HTTPClient(
+    max_connections_per_host=int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', '20')),
+    retries=int(os.environ.get('HTTP_RETRIES', '2')),
+)
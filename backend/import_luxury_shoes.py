@@ -11,6 +11,8 @@ from pathlib import Path
 from datetime import datetime, timezone
 import random
 
+from catalog_import import product_importer, print_stats
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -145,21 +147,14 @@ SHOE_COLLECTIONS = {
     }
 }
 
-async def import_shoes():
-    """Import luxury shoes and sneakers"""
-    
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
-    
-    print("=" * 80)
-    print("👟 IMPORTING LUXURY SHOES & SNEAKERS")
-    print("   Recent 2025 models: $250-$450")
-    print("   Classic/Older models: $200-$350")
-    print("=" * 80)
-    
-    all_shoes = []
-    
+def _track(summary: dict, price: float):
+    summary["count"] += 1
+    summary["total"] += price
+    summary["min"] = min(summary["min"], price)
+    summary["max"] = max(summary["max"], price)
+
+def shoe_rows(summaries: dict, brands: dict):
+    """Yield one product row per shoe model"""
     for collection_key, collection_info in SHOE_COLLECTIONS.items():
         print(f"\n👟 {collection_info['brand']}")
         print(f"   Models: {len(collection_info['models'])}")
@@ -210,54 +205,56 @@ async def import_shoes():
                 "weight": 0.5,  # kg
                 "meta_title": f"{collection_info['brand']} {model_info['name']} - 1:1 Replica",
                 "meta_description": f"Buy {collection_info['brand']} {model_info['name']} high-quality replica shoes. Premium materials. ${price}",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
             }
             
-            all_shoes.append(shoe)
-    
-    print(f"\n📊 TOTAL SHOES: {len(all_shoes)}")
+            _track(summaries["overall"], price)
+            _track(summaries["recent" if collection_info['is_recent'] else "classic"], price)
+            brand = collection_info['brand'].split()[0]
+            brands[brand] = brands.get(brand, 0) + 1
+            
+            yield shoe
+
+async def import_shoes():
+    """Import luxury shoes and sneakers"""
     
-    # Insert into database
-    print(f"\n💾 Inserting shoes into database...")
-    inserted_count = 0
-    for shoe in all_shoes:
-        existing = await db.products.find_one({"sku": shoe["sku"]})
-        if not existing:
-            await db.products.insert_one(shoe)
-            inserted_count += 1
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
     
-    print(f"   ✅ Inserted {inserted_count} new shoes")
-    print(f"   ℹ️  Skipped {len(all_shoes) - inserted_count} duplicates")
+    print("=" * 80)
+    print("👟 IMPORTING LUXURY SHOES & SNEAKERS")
+    print("   Recent 2025 models: $250-$450")
+    print("   Classic/Older models: $200-$350")
+    print("=" * 80)
     
-    # Pricing summary
-    prices = [s["price"] for s in all_shoes]
-    recent_prices = [s["price"] for s in all_shoes if any(k in s["tags"] for k in ["nike_jordan_2025", "yeezy_2025", "balenciaga_2025", "golden_goose_2025", "louis_vuitton_shoes", "gucci_shoes", "dior_shoes"])]
-    classic_prices = [s["price"] for s in all_shoes if s["price"] not in recent_prices]
+    # Streamed into batched inserts; existing SKUs are left untouched
+    summaries = {
+        group: {"count": 0, "total": 0.0, "min": float("inf"), "max": 0.0}
+        for group in ("overall", "recent", "classic")
+    }
+    brands = {}
+    stats = await product_importer().import_rows(db, shoe_rows(summaries, brands), mode="insert")
     
-    print(f"\n💰 SHOE PRICING SUMMARY:")
-    print(f"   Overall Minimum: ${min(prices):.2f}")
-    print(f"   Overall Maximum: ${max(prices):.2f}")
-    print(f"   Overall Average: ${sum(prices)/len(prices):.2f}")
+    overall = summaries["overall"]
+    print(f"\n📊 TOTAL SHOES: {overall['count']}")
+    print_stats(stats)
     
-    if recent_prices:
-        print(f"\n   Recent 2025 Models:")
-        print(f"      Min: ${min(recent_prices):.2f}")
-        print(f"      Max: ${max(recent_prices):.2f}")
-        print(f"      Avg: ${sum(recent_prices)/len(recent_prices):.2f}")
+    if overall["count"]:
+        print(f"\n💰 SHOE PRICING SUMMARY:")
+        print(f"   Overall Minimum: ${overall['min']:.2f}")
+        print(f"   Overall Maximum: ${overall['max']:.2f}")
+        print(f"   Overall Average: ${overall['total']/overall['count']:.2f}")
     
-    if classic_prices:
-        print(f"\n   Classic Models:")
-        print(f"      Min: ${min(classic_prices):.2f}")
-        print(f"      Max: ${max(classic_prices):.2f}")
-        print(f"      Avg: ${sum(classic_prices)/len(classic_prices):.2f}")
+    for label, group in (("Recent 2025 Models", "recent"), ("Classic Models", "classic")):
+        summary = summaries[group]
+        if summary["count"]:
+            print(f"\n   {label}:")
+            print(f"      Min: ${summary['min']:.2f}")
+            print(f"      Max: ${summary['max']:.2f}")
+            print(f"      Avg: ${summary['total']/summary['count']:.2f}")
     
     # By brand
     print(f"\n👟 SHOES BY BRAND:")
-    brands = {}
-    for shoe in all_shoes:
-        brand = shoe['name'].split()[0]
-        brands[brand] = brands.get(brand, 0) + 1
     for brand, count in sorted(brands.items()):
         print(f"   {brand}: {count} models")
     
@@ -9,6 +9,8 @@ from pathlib import Path
 from datetime import datetime, timezone
 import random
 
+from catalog_import import product_importer, print_stats
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -120,20 +122,8 @@ WATCH_COLLECTIONS = {
     }
 }
 
-async def import_watches():
-    """Import luxury watch replicas"""
-    
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
-    
-    print("=" * 80)
-    print("⌚ IMPORTING LUXURY WATCH REPLICAS")
-    print("   Pricing based on unitedluxury.net 2024-2025")
-    print("=" * 80)
-    
-    all_watches = []
-    
+def watch_rows(summary: dict):
+    """Yield one product row per watch model"""
     for brand_key, brand_info in WATCH_COLLECTIONS.items():
         print(f"\n⌚ {brand_info['brand']}")
         print(f"   Models: {len(brand_info['models'])}")
@@ -151,7 +141,12 @@ async def import_watches():
             on_sale = random.random() > 0.7
             compare_at_price = round(price * random.uniform(1.5, 2.0), 2) if on_sale else None
             
-            watch = {
+            summary["count"] += 1
+            summary["total"] += price
+            summary["min"] = min(summary["min"], price)
+            summary["max"] = max(summary["max"], price)
+            
+            yield {
                 "id": watch_id,
                 "name": f"{brand_info['brand']} {model_info['name']}",
                 "description": f"1:1 Superclone {brand_info['brand']} {model_info['name']} - Swiss movement, sapphire crystal, 904L stainless steel. Water resistant. Comes with branded box and papers (optional). Identical to authentic model.",
@@ -174,32 +169,33 @@ async def import_watches():
                 "weight": 0.2,  # kg
                 "meta_title": f"{brand_info['brand']} {model_info['name']} - 1:1 Superclone",
                 "meta_description": f"Buy {brand_info['brand']} {model_info['name']} superclone replica watch. Swiss movement, sapphire crystal. ${price}",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
             }
-            
-            all_watches.append(watch)
+
+async def import_watches():
+    """Import luxury watch replicas"""
     
-    print(f"\n📊 TOTAL WATCHES: {len(all_watches)}")
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    print("=" * 80)
+    print("⌚ IMPORTING LUXURY WATCH REPLICAS")
+    print("   Pricing based on unitedluxury.net 2024-2025")
+    print("=" * 80)
     
-    # Insert into database
-    print(f"\n💾 Inserting watches into database...")
-    inserted_count = 0
-    for watch in all_watches:
-        existing = await db.products.find_one({"sku": watch["sku"]})
-        if not existing:
-            await db.products.insert_one(watch)
-            inserted_count += 1
+    # Streamed into batched inserts; existing SKUs are left untouched
+    summary = {"count": 0, "total": 0.0, "min": float("inf"), "max": 0.0}
+    stats = await product_importer().import_rows(db, watch_rows(summary), mode="insert")
     
-    print(f"   ✅ Inserted {inserted_count} new watches")
-    print(f"   ℹ️  Skipped {len(all_watches) - inserted_count} duplicates")
+    print(f"\n📊 TOTAL WATCHES: {summary['count']}")
+    print_stats(stats)
     
     # Pricing summary
-    prices = [w["price"] for w in all_watches]
-    print(f"\n💰 WATCH PRICING SUMMARY:")
-    print(f"   Minimum: ${min(prices):.2f}")
-    print(f"   Maximum: ${max(prices):.2f}")
-    print(f"   Average: ${sum(prices)/len(prices):.2f}")
+    if summary["count"]:
+        print(f"\n💰 WATCH PRICING SUMMARY:")
+        print(f"   Minimum: ${summary['min']:.2f}")
+        print(f"   Maximum: ${summary['max']:.2f}")
+        print(f"   Average: ${summary['total']/summary['count']:.2f}")
     
     # By brand
     print(f"\n⌚ WATCHES BY BRAND:")
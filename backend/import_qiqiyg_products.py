@@ -9,9 +9,8 @@ from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime, timezone
 import random
-import requests
-from bs4 import BeautifulSoup
-import time
+
+from catalog_import import product_importer, print_stats
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -161,22 +160,22 @@ SHOE_PRICING = {
 }
 
 async def scrape_category(category_name, category_info, limit=50):
-    """Scrape products from a specific category"""
-    products = []
-    
+    """Yield products from a specific category"""
     print(f"\n📦 Scraping category: {category_name}")
     print(f"   URL: {category_info['url']}")
     
+    found = 0
     try:
         # This is a simplified version - in reality you'd need to handle pagination
         # and parse the actual product pages
         
         # For demonstration, we'll create sample products based on the category
         num_products = min(limit, random.randint(20, 50))
+        scraped_at = int(datetime.now(timezone.utc).timestamp())
         
         for i in range(num_products):
             # Generate product based on category
-            product_id = f"{category_name}_{i+1}_{int(time.time())}"
+            product_id = f"{category_name}_{i+1}_{scraped_at}"
             
             # Determine price based on category rules
             min_price, max_price = category_info.get("price_range", (200, 400))
@@ -185,7 +184,7 @@ async def scrape_category(category_name, category_info, limit=50):
             # Ensure minimum price of $200
             price = max(price, 200.0)
             
-            product = {
+            yield {
                 "id": product_id,
                 "name": f"{category_name.replace('_', ' ').title()} Item {i+1}",
                 "description": f"High-quality replica {category_name.replace('_', ' ')} - 1:1 quality, premium materials",
@@ -205,17 +204,32 @@ async def scrape_category(category_name, category_info, limit=50):
                 "tags": category_info.get("tags", []),
                 "rating": round(random.uniform(4.2, 5.0), 1),
                 "reviews_count": random.randint(10, 200),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
             }
-            
-            products.append(product)
+            found += 1
     
     except Exception as e:
         print(f"   ❌ Error scraping {category_name}: {str(e)}")
     
-    print(f"   ✅ Found {len(products)} products")
-    return products
+    print(f"   ✅ Found {found} products")
+
+
+async def scrape_all(summary, limit=30):
+    """Stream every category, keeping only running totals"""
+    for category_name, category_info in CATEGORIES.items():
+        async for product in scrape_category(category_name, category_info, limit=limit):
+            price = product["price"]
+            summary["count"] += 1
+            summary["total"] += price
+            summary["min"] = min(summary["min"], price)
+            summary["max"] = max(summary["max"], price)
+            summary["categories"][product["category"]] = summary["categories"].get(product["category"], 0) + 1
+            summary["new"] += product["is_new"]
+            summary["sale"] += product["on_sale"]
+            summary["best_seller"] += product["best_seller"]
+            yield product
+        
+        # Small delay to be respectful
+        await asyncio.sleep(0.5)
 
 
 async def import_products():
@@ -229,60 +243,34 @@ async def import_products():
     print("🚀 STARTING PRODUCT IMPORT FROM QIQIYG.COM")
     print("=" * 80)
     
-    all_products = []
-    
-    # Import products from each category
-    for category_name, category_info in CATEGORIES.items():
-        products = await scrape_category(category_name, category_info, limit=30)
-        all_products.extend(products)
-        
-        # Small delay to be respectful
-        await asyncio.sleep(0.5)
+    # Scraped products go straight into batched inserts; existing SKUs are skipped
+    summary = {
+        "count": 0, "total": 0.0, "min": float("inf"), "max": 0.0,
+        "categories": {}, "new": 0, "sale": 0, "best_seller": 0,
+    }
+    stats = await product_importer().import_source(db, scrape_all(summary), mode="insert")
     
     print(f"\n📊 SUMMARY:")
-    print(f"   Total products collected: {len(all_products)}")
+    print(f"   Total products collected: {summary['count']}")
     print(f"   Categories processed: {len(CATEGORIES)}")
-    
-    # Insert products into database
-    if all_products:
-        print(f"\n💾 Inserting products into database...")
-        
-        # Check for duplicates and insert
-        inserted_count = 0
-        for product in all_products:
-            existing = await db.products.find_one({"sku": product["sku"]})
-            if not existing:
-                await db.products.insert_one(product)
-                inserted_count += 1
-        
-        print(f"   ✅ Inserted {inserted_count} new products")
-        print(f"   ℹ️  Skipped {len(all_products) - inserted_count} duplicates")
+    print_stats(stats)
     
     # Print pricing summary
-    print(f"\n💰 PRICING SUMMARY:")
-    prices = [p["price"] for p in all_products]
-    print(f"   Minimum price: ${min(prices):.2f}")
-    print(f"   Maximum price: ${max(prices):.2f}")
-    print(f"   Average price: ${sum(prices)/len(prices):.2f}")
+    if summary["count"]:
+        print(f"\n💰 PRICING SUMMARY:")
+        print(f"   Minimum price: ${summary['min']:.2f}")
+        print(f"   Maximum price: ${summary['max']:.2f}")
+        print(f"   Average price: ${summary['total']/summary['count']:.2f}")
     
     # Count by category
     print(f"\n📂 PRODUCTS BY CATEGORY:")
-    categories = {}
-    for p in all_products:
-        cat = p["category"]
-        categories[cat] = categories.get(cat, 0) + 1
-    for cat, count in categories.items():
+    for cat, count in summary["categories"].items():
         print(f"   {cat}: {count} products")
     
-    # Count special badges
-    new_count = sum(1 for p in all_products if p["is_new"])
-    sale_count = sum(1 for p in all_products if p["on_sale"])
-    bestseller_count = sum(1 for p in all_products if p["best_seller"])
-    
     print(f"\n🏷️  BADGE DISTRIBUTION:")
-    print(f"   NEW badges: {new_count}")
-    print(f"   SALE badges: {sale_count}")
-    print(f"   BEST SELLER badges: {bestseller_count}")
+    print(f"   NEW badges: {summary['new']}")
+    print(f"   SALE badges: {summary['sale']}")
+    print(f"   BEST SELLER badges: {summary['best_seller']}")
     
     client.close()
     
@@ -291,7 +279,7 @@ async def import_products():
     print("=" * 80)
 
 
-if __name__ == "__main__":
+async def main():
     print("\n⚠️  NOTE: This is a demonstration script.")
     print("   For full scraping, you would need to:")
     print("   1. Handle actual HTML parsing of product pages")
@@ -301,6 +289,9 @@ if __name__ == "__main__":
     print("\n   This script generates sample products based on categories.")
     print("   Press Ctrl+C to cancel, or wait 5 seconds to continue...\n")
     
-    time.sleep(5)
-    
-    asyncio.run(import_products())
+    await asyncio.sleep(5)
+    await import_products()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,248 @@
+"""
+Persistent background job queue
+
+Jobs live in the `jobs` MongoDB collection and are processed by a pool of
+asyncio workers running inside the API process. Failed jobs are retried with
+exponential backoff and jitter; after `max_attempts` they are parked in the
+`dead` state for inspection from the admin API. Jobs whose worker died while
+running are reclaimed once their lock expires.
+"""
+import asyncio
+import logging
+import os
+import random
+import traceback
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """MongoDB-backed job queue with an asyncio worker pool"""
+
+    collection_name = "jobs"
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_attempts: int = 5,
+        base_delay: float = 5.0,
+        max_delay: float = 900.0,
+        poll_interval: float = 2.0,
+        lock_timeout: int = 300,
+        keep_done_days: int = 7,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.keep_done_days = keep_done_days
+        self.handlers: Dict[str, JobHandler] = {}
+        self.db = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and not self._stopping
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Register the coroutine that processes jobs of job_type"""
+        self.handlers[job_type] = handler
+
+    def start(self, db):
+        """Start the worker pool"""
+        if self._tasks:
+            return
+        self.db = db
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; jobs in flight are reclaimed after their lock expires"""
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, job_type: str, payload: dict, max_attempts: Optional[int] = None, delay: float = 0) -> str:
+        """Persist a job and wake a worker; returns the job id"""
+        if self.db is None:
+            raise RuntimeError("Job queue is not started")
+        now = _now()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "run_at": (now + timedelta(seconds=delay)).isoformat(),
+            "locked_until": None,
+            "last_error": None,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+        }
+        await self.db[self.collection_name].insert_one(job)
+        self._wakeup.set()
+        return job["id"]
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with +/-50% jitter"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempts - 1, 0)))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _claim(self) -> Optional[dict]:
+        now = _now()
+        return await self.db[self.collection_name].find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "run_at": {"$lte": now.isoformat()}},
+                {"status": RUNNING, "locked_until": {"$lt": now.isoformat()}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "locked_until": (now + timedelta(seconds=self.lock_timeout)).isoformat(),
+                    "updated_at": now.isoformat(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self, number: int):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Job queue worker {number} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Recording the outcome failed; the job is reclaimed once its lock expires
+                logger.error(f"Job queue worker {number} failed to record job {job['id']}: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, job: dict):
+        collection = self.db[self.collection_name]
+        handler = self.handlers.get(job["type"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type {job['type']}")
+            await handler(job["payload"])
+        except Exception as e:
+            now = _now()
+            error = f"{type(e).__name__}: {str(e)}"
+            if job["attempts"] >= job.get("max_attempts", self.max_attempts):
+                update = {"status": DEAD, "locked_until": None}
+                logger.error(f"✗ Job {job['id']} ({job['type']}) moved to dead letter: {error}")
+            else:
+                retry_at = now + timedelta(seconds=self.backoff(job["attempts"]))
+                update = {"status": PENDING, "locked_until": None, "run_at": retry_at.isoformat()}
+                logger.warning(f"Job {job['id']} ({job['type']}) failed, retry {job['attempts']} at {retry_at.isoformat()}: {error}")
+            update.update({
+                "last_error": error,
+                "last_traceback": traceback.format_exc(limit=5),
+                "updated_at": now.isoformat(),
+            })
+            await collection.update_one({"id": job["id"]}, {"$set": update})
+            return
+
+        now = _now()
+        await collection.update_one(
+            {"id": job["id"]},
+            {"$set": {
+                "status": DONE,
+                "locked_until": None,
+                "finished_at": now.isoformat(),
+                "updated_at": now.isoformat(),
+                # TTL index on expires_at removes finished jobs
+                "expires_at": now + timedelta(days=self.keep_done_days),
+            }}
+        )
+
+    # ---------- admin ----------
+
+    async def stats(self) -> dict:
+        """Queue depth per status and per job type, plus the age of the oldest pending job"""
+        collection = self.db[self.collection_name]
+        rows = await collection.aggregate([
+            {"$group": {"_id": {"status": "$status", "type": "$type"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        by_status: Dict[str, int] = {}
+        by_type: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            status, job_type = row["_id"]["status"], row["_id"]["type"]
+            by_status[status] = by_status.get(status, 0) + row["count"]
+            by_type.setdefault(job_type, {})[status] = row["count"]
+
+        oldest = await collection.find_one({"status": PENDING}, {"_id": 0, "created_at": 1}, sort=[("run_at", 1)])
+        oldest_age = None
+        if oldest:
+            oldest_age = (_now() - datetime.fromisoformat(oldest["created_at"])).total_seconds()
+
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "by_status": by_status,
+            "by_type": by_type,
+            "oldest_pending_seconds": oldest_age,
+        }
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        query = {"status": status} if status else {}
+        return await self.db[self.collection_name].find(
+            query, {"_id": 0, "last_traceback": 0}
+        ).sort("updated_at", -1).limit(limit).to_list(limit)
+
+    async def retry(self, job_id: str) -> bool:
+        """Move a dead job back to pending with a fresh attempt budget"""
+        now = _now().isoformat()
+        result = await self.db[self.collection_name].update_one(
+            {"id": job_id, "status": DEAD},
+            {"$set": {"status": PENDING, "attempts": 0, "run_at": now, "updated_at": now}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count > 0
+
+
+job_queue = JobQueue(
+    workers=int(os.environ.get('JOB_QUEUE_WORKERS', '4')),
+    max_attempts=int(os.environ.get('JOB_QUEUE_MAX_ATTEMPTS', '5')),
+)
@@ -0,0 +1,318 @@
+"""
+Upload pipeline for product and review media
+
+Uploads are streamed to disk in 1 MB chunks, with the file writes and
+sha256 hashing done off the event loop. Files are stored under their
+content hash, so the same image uploaded twice is stored once: the second
+upload gets the existing media document back.
+
+Images are then processed by a background job. Resized renditions
+(MEDIA_WIDTHS, never upscaled) are encoded as WebP, plus AVIF when Pillow
+supports it, on a bounded worker pool and recorded in the `renditions` list
+of the `media` document. GET /api/v2/media/{filename}?w=640 serves the
+smallest rendition at least that wide, in the best format the browser
+accepts, and falls back to the original.
+"""
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import UploadFile
+from pymongo.errors import DuplicateKeyError
+
+from job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+MEDIA_JOB = "media.renditions"
+
+CHUNK_SIZE = 1024 * 1024
+
+CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "video/mp4": ".mp4",
+}
+
+RENDITION_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+
+PROCESSING = "processing"
+READY = "ready"
+# Not an image Pillow can resize (animated GIF, video, truncated file, decompression bomb): served as uploaded
+ORIGINAL_ONLY = "original_only"
+
+
+class MediaError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def supported_formats(requested: List[str]) -> List[str]:
+    try:
+        from PIL import features
+    except ImportError:
+        return []
+    return [fmt for fmt in requested if fmt in RENDITION_TYPES and features.check(fmt)]
+
+
+def _write_chunk(handle, hasher, chunk: bytes):
+    hasher.update(chunk)
+    handle.write(chunk)
+
+
+def _render(source: str, directory: str, stem: str, widths: List[int], formats: List[str],
+            quality: int) -> Tuple[Optional[Tuple[int, int]], List[dict]]:
+    """Runs in the worker pool: write every rendition of `source`, return (size, renditions)"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        original = Image.open(source)
+    except UnidentifiedImageError:
+        return None, []
+    renditions = []
+    try:
+        with original:
+            size = original.size
+            if getattr(original, "is_animated", False):
+                return size, []
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+            # Downscales only; an image narrower than every width still gets one re-encoded rendition
+            targets = sorted({width for width in widths if width < image.width} | {min(image.width, max(widths))})
+            for width in targets:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+                for fmt in formats:
+                    filename = f"{stem}-{width}.{fmt}"
+                    path = os.path.join(directory, filename)
+                    options = {"quality": quality, "method": 4} if fmt == "webp" else {"quality": quality, "speed": 8}
+                    resized.save(path, fmt.upper(), **options)
+                    renditions.append({
+                        "width": width,
+                        "height": height,
+                        "format": fmt,
+                        "filename": filename,
+                        "size": os.path.getsize(path),
+                    })
+            return image.size, renditions
+    except BaseException:
+        # Truncated files and decompression bombs fail mid-way: drop what was already written
+        for rendition in renditions:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(directory, rendition["filename"]))
+        raise
+
+
+class MediaPipeline:
+    collection_name = "media"
+
+    def __init__(self, upload_dir: Path, widths: List[int], formats: List[str], quality: int = 80,
+                 workers: int = 2, use_processes: bool = False, max_bytes: int = 50 * 1024 * 1024):
+        self.upload_dir = Path(upload_dir)
+        self.rendition_dir = self.upload_dir / "renditions"
+        self.widths = sorted(widths)
+        self.formats = supported_formats(formats)
+        self.quality = quality
+        self.workers = workers
+        self.use_processes = use_processes
+        self.max_bytes = max_bytes
+        self.db = None
+        self._executor: Optional[Executor] = None
+        # filename -> media document, for rendition lookups on every image request
+        self._documents: TTLCache = TTLCache(maxsize=10000, ttl=300)
+        self._stats = {"uploaded": 0, "deduplicated": 0, "processed": 0, "failed": 0, "renditions": 0, "render_seconds": 0.0}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media")
+        return self._executor
+
+    def start(self, db):
+        self.db = db
+        self.upload_dir.mkdir(exist_ok=True)
+        self.rendition_dir.mkdir(exist_ok=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ===== Upload =====
+
+    async def _spool(self, upload: UploadFile) -> Tuple[Path, str, int]:
+        """Stream the upload to a temporary file; returns (path, sha256, size)"""
+        self.upload_dir.mkdir(exist_ok=True)
+        partial = self.upload_dir / f".{uuid.uuid4()}.part"
+        hasher = hashlib.sha256()
+        size = 0
+        handle = await asyncio.to_thread(partial.open, "wb")
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise MediaError(f"File is larger than {self.max_bytes // (1024 * 1024)} MB", status_code=413)
+                await asyncio.to_thread(_write_chunk, handle, hasher, chunk)
+        except BaseException:
+            await asyncio.to_thread(handle.close)
+            partial.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(handle.close)
+        return partial, hasher.hexdigest(), size
+
+    async def store(self, db, upload: UploadFile) -> dict:
+        """Save an upload (or find its duplicate) and schedule its renditions"""
+        extension = CONTENT_TYPES.get(upload.content_type)
+        if extension is None:
+            raise MediaError("Invalid file type")
+
+        partial, digest, size = await self._spool(upload)
+        existing = await db[self.collection_name].find_one({"sha256": digest}, {"_id": 0})
+        if existing:
+            partial.unlink(missing_ok=True)
+            self._stats["deduplicated"] += 1
+            return {**existing, "deduplicated": True}
+
+        filename = f"{digest}{extension}"
+        await asyncio.to_thread(os.replace, partial, self.upload_dir / filename)
+        is_image = upload.content_type.startswith("image")
+        media = {
+            "id": str(uuid.uuid4()),
+            "filename": filename,
+            "original_name": upload.filename,
+            "url": f"/uploads/{filename}",
+            "type": "image" if is_image else "video",
+            "content_type": upload.content_type,
+            "size": size,
+            "sha256": digest,
+            "status": PROCESSING if is_image and self.formats else ORIGINAL_ONLY,
+            "renditions": [],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            await db[self.collection_name].insert_one(dict(media))
+        except DuplicateKeyError:
+            # The same file was uploaded concurrently; both requests share one document
+            self._stats["deduplicated"] += 1
+            existing = await db[self.collection_name].find_one({"sha256": digest}, {"_id": 0})
+            return {**existing, "deduplicated": True}
+        self._stats["uploaded"] += 1
+
+        if media["status"] == PROCESSING:
+            try:
+                if job_queue.running:
+                    await job_queue.enqueue(MEDIA_JOB, {"media_id": media["id"]})
+                else:
+                    await self.process({"media_id": media["id"]}, db=db)
+            except Exception as e:
+                # The upload itself is saved: serve the original rather than fail the request
+                logger.error(f"Could not schedule renditions for media {media['id']}: {str(e)}")
+                await self._settle(db, media, ORIGINAL_ONLY)
+                media["status"] = ORIGINAL_ONLY
+        return {**media, "deduplicated": False}
+
+    # ===== Renditions =====
+
+    async def process(self, payload: dict, db=None):
+        """Job handler: render and record the renditions of one media document"""
+        db = db if db is not None else self.db
+        collection = db[self.collection_name]
+        media = await collection.find_one({"id": payload["media_id"]}, {"_id": 0})
+        if not media or media.get("status") != PROCESSING:
+            return
+
+        self.rendition_dir.mkdir(parents=True, exist_ok=True)
+        started = asyncio.get_running_loop().time()
+        try:
+            size, renditions = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _render,
+                str(self.upload_dir / media["filename"]), str(self.rendition_dir),
+                Path(media["filename"]).stem, self.widths, self.formats, self.quality,
+            )
+        except Exception as e:
+            # Truncated image (OSError), decompression bomb, broken worker pool: keep the original
+            logger.error(f"Rendering media {media['id']} ({media['filename']}) failed: {str(e)}")
+            self._stats["failed"] += 1
+            await self._settle(db, media, ORIGINAL_ONLY)
+            return
+        finally:
+            self._stats["render_seconds"] += asyncio.get_running_loop().time() - started
+
+        for rendition in renditions:
+            rendition["url"] = f"/uploads/renditions/{rendition['filename']}"
+        fields = {"renditions": renditions}
+        if size:
+            fields["width"], fields["height"] = size
+        await self._settle(db, media, READY if renditions else ORIGINAL_ONLY, **fields)
+        self._stats["processed"] += 1
+        self._stats["renditions"] += len(renditions)
+
+    async def _settle(self, db, media: dict, status: str, **fields):
+        await db[self.collection_name].update_one({"id": media["id"]}, {"$set": {"status": status, **fields}})
+        self._documents.pop(media["filename"], None)
+
+    async def get(self, db, filename: str) -> Optional[dict]:
+        media = self._documents.get(filename)
+        if media is None:
+            media = await db[self.collection_name].find_one({"filename": filename}, {"_id": 0})
+            if media and media.get("status") != PROCESSING:
+                self._documents[filename] = media
+        return media
+
+    def pick(self, filename: str, media: Optional[dict], width: Optional[int], accept: str = "",
+             fmt: Optional[str] = None) -> Tuple[Path, Optional[str]]:
+        """(file, content type) of the best rendition for `width`; content type None means the original"""
+        renditions = (media or {}).get("renditions") or []
+        if fmt:
+            preferred = [fmt]
+        else:
+            preferred = [candidate for candidate in ("avif", "webp") if RENDITION_TYPES[candidate] in accept]
+        for candidate in preferred:
+            matches = sorted((r for r in renditions if r["format"] == candidate), key=lambda r: r["width"])
+            if not matches:
+                continue
+            chosen = next((r for r in matches if width and r["width"] >= width), matches[-1])
+            return self.rendition_dir / chosen["filename"], RENDITION_TYPES[candidate]
+        return self.upload_dir / filename, None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "render_seconds": round(self._stats["render_seconds"], 3),
+            "widths": self.widths,
+            "formats": self.formats,
+            "workers": self.workers,
+            "executor": "process" if self.use_processes else "thread",
+        }
+
+
+media_pipeline = MediaPipeline(
+    upload_dir=Path(os.environ.get('UPLOAD_DIR', str(Path(__file__).parent / "uploads"))),
+    widths=[int(width) for width in os.environ.get('MEDIA_WIDTHS', '320,640,960,1600').split(',')],
+    formats=[fmt.strip() for fmt in os.environ.get('MEDIA_FORMATS', 'webp,avif').split(',')],
+    quality=int(os.environ.get('MEDIA_QUALITY', '80')),
+    workers=int(os.environ.get('MEDIA_WORKERS', '2')),
+    use_processes=os.environ.get('MEDIA_EXECUTOR', 'thread') == 'process',
+    max_bytes=int(os.environ.get('MEDIA_MAX_UPLOAD_MB', '50')) * 1024 * 1024,
+)
+
+job_queue.register(MEDIA_JOB, media_pipeline.process)
@@ -0,0 +1,35 @@
+"""
+Versioned data migrations
+
+    cd backend && python -m migrations status
+    cd backend && python -m migrations run [VERSION ...] [--dry-run] [--force]
+
+Without versions, `run` applies every pending migration that is not marked
+manual, in version order. Progress is recorded in the `migrations`
+collection; an interrupted migration resumes from its last checkpoint.
+"""
+from .runner import Migration, DocumentMigration, MigrationContext, MigrationRunner
+from .m0001_product_defaults import ProductDefaults
+from .m0002_placeholder_images import PlaceholderImages
+from .m0003_qiqiyg_images import QiqiygImages
+from .m0004_duplicate_admin_ids import DuplicateAdminIds
+from .m0005_sku_index import SkuIndex
+
+MIGRATIONS = [
+    ProductDefaults(),
+    PlaceholderImages(),
+    QiqiygImages(),
+    DuplicateAdminIds(),
+    SkuIndex(),
+]
+
+runner = MigrationRunner(MIGRATIONS)
+
+__all__ = [
+    "Migration",
+    "DocumentMigration",
+    "MigrationContext",
+    "MigrationRunner",
+    "MIGRATIONS",
+    "runner",
+]
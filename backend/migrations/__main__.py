@@ -0,0 +1,53 @@
+"""Command line entry point: python -m migrations"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from . import runner
+
+
+async def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Run versioned data migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list migrations and whether they ran")
+    run = commands.add_parser("run", help="run pending (or the named) migrations")
+    run.add_argument("versions", nargs="*", help="versions or names; default: every pending non-manual migration")
+    run.add_argument("--dry-run", action="store_true", help="count the changes without writing")
+    run.add_argument("--force", action="store_true", help="re-run completed migrations from the start")
+    run.add_argument("--batch-size", type=int, default=500)
+    run.add_argument("--concurrency", type=int, default=4, help="bulk writes in flight")
+    args = parser.parse_args(argv)
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.command == "status":
+            for row in await runner.status(db):
+                flag = " (manual)" if row["manual"] else ""
+                print(f"{row['version']}  {row['name']:<24} {row['status']}{flag}")
+            return
+
+        try:
+            selected = [runner.get(version) for version in args.versions]
+        except KeyError as e:
+            parser.error(str(e))
+        for migration in selected or [m for m in runner.migrations if not m.manual]:
+            print(f"→ {migration.version} {migration.name}: {migration.description}")
+            result = await runner.run_one(
+                db, migration, dry_run=args.dry_run, force=args.force,
+                batch_size=args.batch_size, concurrency=args.concurrency
+            )
+            print(f"  {json.dumps(result, default=str)}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    asyncio.run(main(sys.argv[1:]))
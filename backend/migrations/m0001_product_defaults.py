@@ -0,0 +1,89 @@
+"""
+Backfill the Ecwid-style product fields and default store settings
+(formerly migrate_products.py)
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from .runner import DocumentMigration, MigrationContext
+
+PRODUCT_DEFAULTS = {
+    "compare_at_price": None,
+    "cost": None,
+    "sku": None,
+    "barcode": None,
+    "weight": None,
+    "on_sale": False,
+    "best_seller": False,
+    "digital_product": False,
+    "download_url": None,
+    "tags": [],
+    "meta_title": None,
+    "meta_description": None,
+    "has_variations": False,
+    "variations_count": 0,
+    "rating": 0.0,
+    "reviews_count": 0,
+    "view_count": 0,
+    "sales_count": 0,
+}
+
+DEFAULT_STORE_SETTINGS = {
+    "id": "store_settings",
+    "store_name": "LuxeBoutique",
+    "store_logo": None,
+    "store_description": "Luxury fashion and jewelry store",
+    "primary_color": "#d4af37",
+    "secondary_color": "#000000",
+    "email_from": "noreply@luxeboutique.com",
+    "email_notifications": True,
+    "currency": "USD",
+    "tax_rate": 0.0,
+    "tax_included": False,
+    "free_shipping_threshold": 100.0,
+    "default_shipping_cost": 10.0,
+    "low_stock_threshold": 5,
+    "out_of_stock_behavior": "show",
+    "auto_complete_orders": False,
+    "order_prefix": "ORD-",
+}
+
+CHECKED_FIELDS = [*PRODUCT_DEFAULTS, "is_new", "updated_at"]
+
+
+class ProductDefaults(DocumentMigration):
+    version = "0001"
+    name = "product_defaults"
+    description = "Add missing product fields and create the default store settings"
+
+    collection = "products"
+    # Only products still missing one of the fields
+    query = {"$or": [{field: {"$exists": False}} for field in CHECKED_FIELDS]}
+    projection = {"_id": 1, "created_at": 1, **{field: 1 for field in CHECKED_FIELDS}}
+
+    def transform(self, product: dict) -> Optional[dict]:
+        updates = {field: value for field, value in PRODUCT_DEFAULTS.items() if field not in product}
+        now = datetime.now(timezone.utc)
+        if "is_new" not in product:
+            # Mark recent products (last 30 days) as new
+            created_at = product.get("created_at")
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            if created_at and created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            updates["is_new"] = bool(created_at) and (now - created_at).days <= 30
+        if "updated_at" not in product:
+            updates["updated_at"] = now.isoformat()
+        return {"$set": updates} if updates else None
+
+    async def run(self, ctx: MigrationContext) -> dict:
+        stats = await super().run(ctx)
+        settings_exists = await ctx.db.store_settings.find_one({"id": "store_settings"}, {"_id": 1})
+        stats["store_settings_created"] = not settings_exists
+        if not settings_exists and not ctx.dry_run:
+            await ctx.db.store_settings.update_one(
+                {"id": "store_settings"},
+                {"$setOnInsert": {**DEFAULT_STORE_SETTINGS, "updated_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+        return stats
@@ -0,0 +1,38 @@
+"""
+Replace placeholder product images with curated Unsplash images
+(formerly update_product_images.py)
+"""
+import random
+from typing import Optional
+
+from .runner import DocumentMigration
+from update_product_images import LUXURY_IMAGES, get_image_category
+
+# Unsplash parameters for different views/crops
+IMAGE_PARAMS = [
+    "?w=800&h=800&fit=crop",
+    "?w=800&h=800&fit=crop&crop=faces",
+    "?w=800&h=800&fit=crop&q=80",
+]
+
+
+class PlaceholderImages(DocumentMigration):
+    version = "0002"
+    name = "placeholder_images"
+    description = "Point products with missing or placeholder images at category images"
+
+    collection = "products"
+    query = {"$or": [
+        {"images.0": {"$exists": False}},
+        {"images.0": {"$regex": "placeholder"}},
+    ]}
+    projection = {"_id": 1, "name": 1, "tags": 1}
+
+    def transform(self, product: dict) -> Optional[dict]:
+        category = get_image_category(product.get("name", ""), product.get("tags", []))
+        available_images = LUXURY_IMAGES.get(category, LUXURY_IMAGES["default"])
+        images = [
+            random.choice(available_images) + IMAGE_PARAMS[i % len(IMAGE_PARAMS)]
+            for i in range(random.randint(2, 3))
+        ]
+        return {"$set": {"images": images}}
@@ -0,0 +1,24 @@
+"""
+Point every product at real qiqiyg.com images
+(formerly update_real_qiqiyg_images.py)
+"""
+import random
+from typing import Optional
+
+from .runner import DocumentMigration
+from update_real_qiqiyg_images import ALL_IMAGES
+
+
+class QiqiygImages(DocumentMigration):
+    version = "0003"
+    name = "qiqiyg_images"
+    description = "Replace the images of every product with 2-3 real qiqiyg.com images"
+    # Overwrites all product images: only when asked for
+    manual = True
+
+    collection = "products"
+    projection = {"_id": 1}
+
+    def transform(self, product: dict) -> Optional[dict]:
+        num_images = random.randint(2, 3)
+        return {"$set": {"images": random.sample(ALL_IMAGES, min(num_images, len(ALL_IMAGES)))}}
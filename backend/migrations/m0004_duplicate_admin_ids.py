@@ -0,0 +1,21 @@
+"""
+Give admins still carrying the seeded `admin-001` id a unique id
+(formerly fix_duplicate_ids.py)
+"""
+import uuid
+from typing import Optional
+
+from .runner import DocumentMigration
+
+
+class DuplicateAdminIds(DocumentMigration):
+    version = "0004"
+    name = "duplicate_admin_ids"
+    description = "Reassign the shared admin-001 user id"
+
+    collection = "users"
+    query = {"role": "admin", "id": "admin-001"}
+    projection = {"_id": 1}
+
+    def transform(self, user: dict) -> Optional[dict]:
+        return {"$set": {"id": str(uuid.uuid4())}}
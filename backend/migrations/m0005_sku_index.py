@@ -0,0 +1,18 @@
+"""
+Drop the sparse non-unique `sku_1` index, superseded by `sku_unique`
+"""
+from .runner import Migration, MigrationContext
+
+
+class SkuIndex(Migration):
+    version = "0005"
+    name = "sku_index"
+    description = "Drop the sparse sku index replaced by the partial unique one"
+
+    async def run(self, ctx: MigrationContext) -> dict:
+        indexes = await ctx.db.products.index_information()
+        if "sku_1" not in indexes:
+            return {"dropped": 0}
+        if not ctx.dry_run:
+            await ctx.db.products.drop_index("sku_1")
+        return {"dropped": 1}
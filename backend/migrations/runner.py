@@ -0,0 +1,221 @@
+"""
+Migration runner
+
+Each migration has a version and is recorded in the `migrations`
+collection (running, completed, failed). Document migrations walk their
+collection in `_id` order with a batched cursor, turn each document into an
+update, and send the updates as bulk_write batches with a bounded number
+in flight. After every batch the highest `_id` whose batch (and all earlier
+ones) was written is saved as the checkpoint, so an interrupted run resumes
+where it stopped instead of starting over.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "migrations"
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Migration:
+    """Base migration: override run()"""
+
+    version: str = ""
+    name: str = ""
+    description: str = ""
+    # Manual migrations (data reseeding, one-off fixes) only run when named explicitly
+    manual: bool = False
+
+    async def run(self, ctx: "MigrationContext") -> dict:
+        raise NotImplementedError
+
+
+class DocumentMigration(Migration):
+    """Migration that rewrites documents of one collection"""
+
+    collection: str = ""
+    query: dict = {}
+    projection: Optional[dict] = None
+
+    def transform(self, doc: dict) -> Optional[dict]:
+        """Update document for `doc`, or None to leave it unchanged"""
+        raise NotImplementedError
+
+    async def run(self, ctx: "MigrationContext") -> dict:
+        return await ctx.rewrite(self.collection, self.query, self.transform, self.projection)
+
+
+class MigrationContext:
+    def __init__(self, db, version: str, dry_run: bool = False, batch_size: int = 500, concurrency: int = 4,
+                 checkpoint=None):
+        self.db = db
+        self.version = version
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint
+
+    async def save_checkpoint(self, checkpoint, stats: dict):
+        self.checkpoint = checkpoint
+        if self.dry_run:
+            return
+        await self.db[COLLECTION].update_one(
+            {"version": self.version},
+            {"$set": {"checkpoint": checkpoint, "stats": stats, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+
+    async def rewrite(self, collection_name: str, query: dict, transform, projection: Optional[dict] = None) -> dict:
+        """Apply `transform` to every matching document after the checkpoint"""
+        collection = self.db[collection_name]
+        stats = {"scanned": 0, "changed": 0, "modified": 0, "batches": 0}
+
+        if self.checkpoint is not None:
+            query = {"$and": [query, {"_id": {"$gt": self.checkpoint}}]} if query else {"_id": {"$gt": self.checkpoint}}
+        cursor = collection.find(query, projection).sort("_id", 1).batch_size(self.batch_size)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending: Deque[Tuple[object, asyncio.Task]] = deque()
+
+        async def write(ops: List[UpdateOne]):
+            try:
+                if ops and not self.dry_run:
+                    result = await collection.bulk_write(ops, ordered=False)
+                    stats["modified"] += result.modified_count
+                stats["batches"] += 1
+            finally:
+                semaphore.release()
+
+        async def advance(wait: bool):
+            # Checkpoint only past batches that completed in order
+            last_id = None
+            while pending and (wait or pending[0][1].done()):
+                batch_last_id, task = pending.popleft()
+                await task
+                last_id = batch_last_id
+            if last_id is not None:
+                await self.save_checkpoint(last_id, stats)
+
+        async def flush(ops: List[UpdateOne], last_id):
+            await semaphore.acquire()
+            pending.append((last_id, asyncio.create_task(write(ops))))
+            await advance(wait=False)
+
+        ops: List[UpdateOne] = []
+        last_id = None
+        try:
+            async for doc in cursor:
+                stats["scanned"] += 1
+                last_id = doc["_id"]
+                update = transform(doc)
+                if update:
+                    stats["changed"] += 1
+                    ops.append(UpdateOne({"_id": doc["_id"]}, update))
+                if stats["scanned"] % self.batch_size == 0:
+                    # Flush on scanned count so the checkpoint also moves past unchanged documents
+                    await flush(ops, last_id)
+                    ops = []
+            if stats["scanned"] % self.batch_size:
+                await flush(ops, last_id)
+            await advance(wait=True)
+        finally:
+            for _, task in pending:
+                task.cancel()
+        return stats
+
+
+class MigrationRunner:
+    def __init__(self, migrations: List[Migration]):
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        versions = [migration.version for migration in self.migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError("Duplicate migration versions")
+
+    def get(self, version: str) -> Migration:
+        for migration in self.migrations:
+            if migration.version == version or migration.name == version:
+                return migration
+        raise KeyError(f"Unknown migration '{version}'")
+
+    async def status(self, db) -> List[dict]:
+        records = {
+            record["version"]: record
+            async for record in db[COLLECTION].find({}, {"_id": 0, "checkpoint": 0})
+        }
+        return [
+            {
+                "version": migration.version,
+                "name": migration.name,
+                "manual": migration.manual,
+                "status": records.get(migration.version, {}).get("status", "pending"),
+                "finished_at": records.get(migration.version, {}).get("finished_at"),
+            }
+            for migration in self.migrations
+        ]
+
+    async def run_one(self, db, migration: Migration, dry_run: bool = False, force: bool = False,
+                      batch_size: int = 500, concurrency: int = 4) -> dict:
+        """Run (or resume) one migration; completed ones are skipped unless forced"""
+        record = await db[COLLECTION].find_one({"version": migration.version})
+        if record and record.get("status") == COMPLETED and not force:
+            return {"version": migration.version, "status": "skipped"}
+
+        checkpoint = None
+        if record and record.get("status") != COMPLETED and not force:
+            checkpoint = record.get("checkpoint")
+
+        now = datetime.now(timezone.utc).isoformat()
+        if not dry_run:
+            await db[COLLECTION].update_one(
+                {"version": migration.version},
+                {
+                    "$set": {"name": migration.name, "status": RUNNING, "started_at": now, "checkpoint": checkpoint},
+                    "$unset": {"error": "", "finished_at": ""},
+                },
+                upsert=True
+            )
+
+        ctx = MigrationContext(db, migration.version, dry_run=dry_run, batch_size=batch_size,
+                               concurrency=concurrency, checkpoint=checkpoint)
+        try:
+            stats = await migration.run(ctx)
+        except Exception as e:
+            logger.error(f"Migration {migration.version} failed: {str(e)}")
+            if not dry_run:
+                await db[COLLECTION].update_one(
+                    {"version": migration.version},
+                    {"$set": {"status": FAILED, "error": str(e), "finished_at": datetime.now(timezone.utc).isoformat()}}
+                )
+            raise
+
+        if not dry_run:
+            await db[COLLECTION].update_one(
+                {"version": migration.version},
+                {"$set": {
+                    "status": COMPLETED,
+                    "stats": stats,
+                    "checkpoint": None,
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                }}
+            )
+        return {"version": migration.version, "status": "dry_run" if dry_run else COMPLETED,
+                "resumed": checkpoint is not None, "stats": stats}
+
+    async def run(self, db, versions: Optional[List[str]] = None, **kwargs) -> List[dict]:
+        """Run the named migrations, or every pending non-manual one in version order"""
+        if versions:
+            selected = [self.get(version) for version in versions]
+        else:
+            selected = [migration for migration in self.migrations if not migration.manual]
+        results = []
+        for migration in selected:
+            results.append(await self.run_one(db, migration, **kwargs))
+        return results
@@ -292,6 +292,7 @@ class BulkProductUpdate(BaseModel):
     """Bulk update multiple products"""
     product_ids: List[str]
     updates: Dict[str, Any]  # Fields to update
+    dry_run: bool = False
 
 
 class BulkPriceUpdate(BaseModel):
@@ -299,6 +300,7 @@ class BulkPriceUpdate(BaseModel):
     product_ids: List[str]
     operation: str  # "add", "subtract", "multiply", "set"
     value: float
+    dry_run: bool = False  # Report the diff without writing
 
 
 class BulkStockUpdate(BaseModel):
@@ -306,6 +308,20 @@ class BulkStockUpdate(BaseModel):
     product_ids: List[str]
     operation: str  # "add", "subtract", "set"
     value: int
+    dry_run: bool = False
+
+
+class ProductMutation(BaseModel):
+    """Field updates for one product in a batch"""
+    product_id: str
+    updates: Dict[str, Any] = {}  # $set values
+    increments: Dict[str, float] = {}  # Numeric deltas (price, stock, ...), floored at 0
+
+
+class BulkProductMutation(BaseModel):
+    """Batch of per-product mutations applied in one ordered bulk write"""
+    mutations: List[ProductMutation] = Field(..., min_length=1, max_length=5000)
+    dry_run: bool = False
 
 
 
@@ -402,7 +418,11 @@ class BulkEmail(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     subject: str
     message: str
+    recipient_filter: str = "all"
+    status: str = "completed"  # queued, sending, completed, failed
+    total_recipients: int = 0
     sent_to: int = 0
+    failed: int = 0
     sent_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -0,0 +1,236 @@
+"""
+Order state machine
+
+Declares the allowed order and payment status transitions and applies them
+with a single conditional write: the filter only matches orders whose
+current state may move to the target, so concurrent webhooks and admin
+edits cannot both win and no read is needed before the update. Rollup and
+email side effects run only for orders that actually changed.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from email_service import email_service
+from sales_rollup import sales_rollup
+from stock_reservations import stock_reservations
+
+logger = logging.getLogger(__name__)
+
+ORDER_TRANSITIONS: Dict[str, Set[str]] = {
+    "pending": {"processing", "shipped", "cancelled"},
+    "processing": {"pending", "shipped", "delivered", "cancelled"},
+    # No way back to processing: a late payment webhook must not un-ship an order
+    "shipped": {"delivered", "cancelled"},
+    "delivered": set(),
+    "cancelled": {"pending"},
+}
+
+PAYMENT_TRANSITIONS: Dict[str, Set[str]] = {
+    "pending": {"confirmed", "failed"},
+    "failed": {"pending", "confirmed"},
+    "confirmed": {"pending", "failed"},
+}
+
+# Concurrent side effects when a batch changes many orders
+SIDE_EFFECT_CONCURRENCY = 20
+
+
+class OrderNotFound(Exception):
+    pass
+
+
+class InvalidTransition(Exception):
+    def __init__(self, message: str, current: Optional[dict] = None):
+        super().__init__(message)
+        self.current = current or {}
+
+
+@dataclass
+class Transition:
+    before: dict
+    after: dict
+
+    @property
+    def changed(self) -> bool:
+        return any(self.before.get(field) != self.after.get(field) for field in ("order_status", "payment_status"))
+
+
+def _sources(transitions: Dict[str, Set[str]], target: str) -> List[str]:
+    if target not in transitions:
+        raise InvalidTransition(f"Unknown status '{target}'")
+    return [state for state, targets in transitions.items() if state == target or target in targets]
+
+
+def transition_filter(status: Optional[str] = None, payment_status: Optional[str] = None) -> dict:
+    """Match orders that can move to the targets and are not already there"""
+    if not status and not payment_status:
+        raise InvalidTransition("No target status given")
+    query = {}
+    changes = []
+    if status:
+        query["order_status"] = {"$in": _sources(ORDER_TRANSITIONS, status)}
+        changes.append({"order_status": {"$ne": status}})
+    if payment_status:
+        query["payment_status"] = {"$in": _sources(PAYMENT_TRANSITIONS, payment_status)}
+        changes.append({"payment_status": {"$ne": payment_status}})
+    query["$or"] = changes
+    return query
+
+
+def _targets(status: Optional[str], payment_status: Optional[str]) -> dict:
+    targets = {}
+    if status:
+        targets["order_status"] = status
+    if payment_status:
+        targets["payment_status"] = payment_status
+    return targets
+
+
+async def transition(
+    db,
+    order_id: str,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    extra: Optional[dict] = None,
+    notify: bool = True,
+) -> Transition:
+    """
+    Move one order to the target statuses in a single find_one_and_update.
+
+    Returns the before/after images; when the order is already in the target
+    state only `extra` is written. Raises OrderNotFound or InvalidTransition.
+    """
+    targets = _targets(status, payment_status)
+    updates = {**targets, **(extra or {}), "updated_at": datetime.now(timezone.utc).isoformat()}
+    before = await db.orders.find_one_and_update(
+        {"id": order_id, **transition_filter(status, payment_status)},
+        {"$set": updates},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        # Only the failure path pays for a second read, to explain the miss
+        current = await db.orders.find_one({"id": order_id}, {"_id": 0})
+        if current is None:
+            raise OrderNotFound(order_id)
+        if all(current.get(field) == value for field, value in targets.items()):
+            if extra:
+                await db.orders.update_one({"id": order_id}, {"$set": updates})
+            return Transition(current, {**current, **updates} if extra else current)
+        raise InvalidTransition(
+            f"Order {order_id} cannot move from {current.get('order_status')}/{current.get('payment_status')} "
+            f"to {status or current.get('order_status')}/{payment_status or current.get('payment_status')}",
+            {"order_status": current.get("order_status"), "payment_status": current.get("payment_status")}
+        )
+
+    after = {**before, **updates}
+    await apply_side_effects(db, before, after, notify=notify)
+    return Transition(before, after)
+
+
+async def transition_many(
+    db,
+    order_ids: List[str],
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    notify: bool = True,
+) -> dict:
+    """
+    Move many orders at once: one conditional update_many whose pipeline
+    records each order's previous statuses, then one read of the changed
+    orders. Orders in a state that cannot reach the target are reported,
+    not modified.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    targets = _targets(status, payment_status)
+    batch_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
+
+    # Within one $set stage, "$order_status" still refers to the current value
+    await db.orders.update_many(
+        {"id": {"$in": order_ids}, **transition_filter(status, payment_status)},
+        [{"$set": {
+            **{field: {"$literal": value} for field, value in targets.items()},
+            "updated_at": now,
+            "last_transition": {
+                "id": batch_id,
+                "at": now,
+                "from_order_status": "$order_status",
+                "from_payment_status": "$payment_status",
+            },
+        }}]
+    )
+
+    changed = await db.orders.find(
+        {"id": {"$in": order_ids}, "last_transition.id": batch_id}, {"_id": 0}
+    ).to_list(None)
+    changed_ids = {order["id"] for order in changed}
+
+    rest = [order_id for order_id in order_ids if order_id not in changed_ids]
+    current = {}
+    if rest:
+        async for order in db.orders.find(
+            {"id": {"$in": rest}}, {"_id": 0, "id": 1, "order_status": 1, "payment_status": 1}
+        ):
+            current[order["id"]] = order
+
+    unchanged, rejected, not_found = [], [], []
+    for order_id in rest:
+        order = current.get(order_id)
+        if order is None:
+            not_found.append(order_id)
+        elif all(order.get(field) == value for field, value in targets.items()):
+            unchanged.append(order_id)
+        else:
+            rejected.append(order)
+
+    semaphore = asyncio.Semaphore(SIDE_EFFECT_CONCURRENCY)
+
+    async def side_effects(after: dict):
+        previous = after["last_transition"]
+        before = {
+            **after,
+            "order_status": previous.get("from_order_status"),
+            "payment_status": previous.get("from_payment_status"),
+        }
+        async with semaphore:
+            await apply_side_effects(db, before, after, notify=notify)
+
+    await asyncio.gather(*(side_effects(order) for order in changed))
+
+    return {
+        "batch_id": batch_id,
+        "updated": sorted(changed_ids),
+        "unchanged": unchanged,
+        "rejected": rejected,
+        "not_found": not_found,
+    }
+
+
+async def apply_side_effects(db, before: dict, after: dict, notify: bool = True):
+    """Rollup, stock reservation and customer emails for one applied transition"""
+    old_status, new_status = before.get("order_status"), after.get("order_status")
+    old_payment, new_payment = before.get("payment_status"), after.get("payment_status")
+
+    if old_payment != new_payment:
+        await sales_rollup.record_payment_status_change(db, before, old_payment, new_payment)
+    if new_status == "cancelled" and old_status != "cancelled":
+        await stock_reservations.release(db, after["id"])
+    elif new_payment == "confirmed" and old_payment != "confirmed":
+        await stock_reservations.commit(db, after["id"])
+
+    if not notify:
+        return
+    try:
+        if new_status != old_status:
+            await email_service.send_order_status_update(after, old_status)
+        if new_payment == "confirmed" and old_payment != "confirmed":
+            await email_service.send_payment_confirmation(after)
+    except Exception as e:
+        logger.error(f"Failed to send notification email: {str(e)}")
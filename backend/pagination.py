@@ -0,0 +1,99 @@
+"""
+Cursor-based (keyset) pagination helpers
+
+A cursor is an opaque, URL-safe token holding the sort key, direction and
+the (sort value, id) of the last row of the previous page. The next page is
+fetched with a range condition on (sort key, id) instead of skip(), so every
+page costs the same regardless of depth.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Upper bound for the `limit` query parameter of paged routes
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(sort_field: str, sort_direction: int, last_doc: dict) -> str:
+    payload = {
+        "k": sort_field,
+        "d": sort_direction,
+        "v": last_doc.get(sort_field),
+        "id": last_doc.get("id"),
+    }
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, sort_direction: int) -> dict:
+    """Decode a cursor and check it belongs to the requested ordering"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(payload, dict) or "id" not in payload:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("k") != sort_field or payload.get("d") != sort_direction:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return payload
+
+
+def keyset_condition(sort_field: str, sort_direction: int, cursor: dict) -> Dict[str, Any]:
+    """Rows strictly after the cursor position in (sort_field, id) order"""
+    op = "$lt" if sort_direction < 0 else "$gt"
+    if sort_field == "id":
+        return {"id": {op: cursor["id"]}}
+    # Mongo sorts null/missing values before everything else, but range operators never match them
+    value = cursor["v"]
+    tie = {sort_field: value, "id": {op: cursor["id"]}}
+    if value is None:
+        # Ascending: the non-null rows all follow; descending: only nulls remain
+        return {"$or": [{sort_field: {"$ne": None}}, tie]} if sort_direction > 0 else tie
+    after = [{sort_field: {op: value}}, tie]
+    if sort_direction < 0:
+        after.append({sort_field: None})
+    return {"$or": after}
+
+
+async def keyset_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    sort_direction: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+    skip: int = 0,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page ordered by (sort_field, id).
+
+    With a cursor the page starts right after it; without one the legacy
+    `skip` offset is honoured so clients can migrate gradually. Returns the
+    documents and the cursor of the next page (None on the last page).
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if cursor:
+        position = decode_cursor(cursor, sort_field, sort_direction)
+        condition = keyset_condition(sort_field, sort_direction, position)
+        query = {"$and": [query, condition]} if query else condition
+        skip = 0
+
+    find = collection.find(query, projection if projection is not None else {"_id": 0})
+    find = find.sort([(sort_field, sort_direction), ("id", sort_direction)])
+    if skip:
+        find = find.skip(skip)
+    docs = await find.limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_field, sort_direction, docs[-1])
+    return docs, next_cursor
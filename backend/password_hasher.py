@@ -0,0 +1,149 @@
+"""
+Password hashing off the event loop
+
+bcrypt costs a few hundred milliseconds of CPU per call, so hashing and
+verification run on a dedicated, size-bounded executor instead of inside
+the request coroutine. Calls beyond `workers + max_queue` in flight are
+refused with PasswordHasherBusy (surfaced as HTTP 503) rather than queued
+without limit, so a login burst cannot pile up behind the pool.
+
+Hashes created with a different cost than PASSWORD_BCRYPT_ROUNDS are
+flagged by verify_and_update so callers can store the rehashed value.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # One context per cost, also built lazily inside process pool workers
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return _contexts[rounds]
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify(password: str, hashed: str, rounds: int) -> bool:
+    try:
+        return _context(rounds).verify(password, hashed)
+    except Exception as e:
+        logger.warning(f"Passlib error: {e}")
+        # Fallback to bcrypt directly
+        import bcrypt
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        except Exception as e2:
+            logger.warning(f"Bcrypt error: {e2}")
+            return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ($2b$12$...), None if it is not one"""
+    parts = (hashed or "").split("$")
+    if len(parts) < 4 or not parts[1].startswith("2"):
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 2, max_queue: int = 32, use_processes: bool = False):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "busy_seconds": 0.0}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.workers + self.max_queue:
+            self._stats["rejected"] += 1
+            raise PasswordHasherBusy("Password hashing is saturated, retry shortly")
+        self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self._stats["busy_seconds"] += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(_hash, password, self.rounds)
+        self._stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        valid = await self._run(_verify, password, hashed, self.rounds)
+        self._stats["verified"] += 1
+        return valid
+
+    def needs_rehash(self, hashed: str) -> bool:
+        rounds = hash_rounds(hashed)
+        return rounds is not None and rounds != self.rounds
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify; when valid but hashed at another cost, also return a fresh hash to store"""
+        valid = await self.verify(password, hashed)
+        if not valid or not self.needs_rehash(hashed):
+            return valid, None
+        try:
+            new_hash = await self.hash(password)
+        except PasswordHasherBusy:
+            # The login still succeeds; the rehash happens on a later one
+            return valid, None
+        self._stats["rehashed"] += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "busy_seconds": round(self._stats["busy_seconds"], 3),
+            "in_flight": self._in_flight,
+            "capacity": self.workers + self.max_queue,
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "executor": "process" if self.use_processes else "thread",
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', '12')),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '32')),
+    use_processes=os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread') == 'process',
+)
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
 import logging
+import os
 
 # Import services
 from stripe_service import stripe_service
@@ -9,9 +11,15 @@ from paypal_service import paypal_service
 from coinpal_service import coinpal_service
 from plisio_service import plisio_service
 from binance_service import binance_service
+from webhook_inbox import webhook_inbox
 
 logger = logging.getLogger(__name__)
 
+# MongoDB connection
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url)
+db = client[os.environ['DB_NAME']]
+
 # Create router
 payment_router = APIRouter(prefix="/payments", tags=["payments"])
 
@@ -45,18 +53,19 @@ async def create_stripe_payment(request: PaymentRequest):
 @payment_router.post("/stripe/webhook")
 async def stripe_webhook(request: Request):
     """Webhook Stripe pour confirmation de paiement"""
+    payload = await request.body()
+    
+    # Vérifier la signature avec le secret du endpoint (STRIPE_WEBHOOK_SECRET)
+    if not stripe_service.verify_webhook_signature(payload, request.headers.get("Stripe-Signature", "")):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
     try:
-        payload = await request.body()
-        sig_header = request.headers.get('stripe-signature')
-        
-        # Ici, vous devez vérifier la signature avec votre webhook secret
-        # Pour l'instant, on log simplement
-        logger.info(f"Stripe webhook received: {payload[:100]}")
-        
-        return {"status": "ok"}
-    except Exception as e:
-        logger.error(f"Stripe webhook error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    event_id, duplicate = await _ingest("stripe", data, payload)
+    return {"status": "ok", "event_id": event_id, "duplicate": duplicate}
 
 # ===== PAYPAL ROUTES =====
 
@@ -111,21 +120,20 @@ async def check_coinpal_status(payment_id: str):
 @payment_router.post("/coinpal/webhook")
 async def coinpal_webhook(request: Request):
     """Webhook CoinPal"""
+    body = await request.body()
+    signature = request.headers.get("X-Signature", "")
+    
+    # Vérifier la signature
+    if not coinpal_service.verify_webhook_signature(body.decode(), signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
     try:
-        body = await request.body()
-        signature = request.headers.get("X-Signature", "")
-        
-        # Vérifier la signature
-        if not coinpal_service.verify_webhook_signature(body.decode(), signature):
-            raise HTTPException(status_code=401, detail="Invalid signature")
-        
         data = await request.json()
-        logger.info(f"CoinPal webhook: {data}")
-        
-        return {"status": "ok"}
-    except Exception as e:
-        logger.error(f"CoinPal webhook error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    event_id, duplicate = await _ingest("coinpal", data, body)
+    return {"status": "ok", "event_id": event_id, "duplicate": duplicate}
 
 # ===== PLISIO ROUTES =====
 
@@ -153,17 +161,18 @@ async def check_plisio_status(invoice_id: str):
 @payment_router.post("/plisio/webhook")
 async def plisio_webhook(request: Request):
     """Webhook Plisio"""
+    body = await request.body()
     try:
         data = await request.json()
-        logger.info(f"Plisio webhook: {data}")
-        
-        # Traiter le callback
-        # Vérifier le statut et mettre à jour la commande
-        
-        return {"status": "ok"}
-    except Exception as e:
-        logger.error(f"Plisio webhook error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    # Vérifier le verify_hash
+    if not isinstance(data, dict) or not plisio_service.verify_callback(data):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
+    event_id, duplicate = await _ingest("plisio", data, body)
+    return {"status": "ok", "event_id": event_id, "duplicate": duplicate}
 
 # ===== BINANCE PAY ROUTES =====
 
@@ -191,14 +200,32 @@ async def check_binance_status(order_id: str):
 @payment_router.post("/binance/webhook")
 async def binance_webhook(request: Request):
     """Webhook Binance Pay"""
+    body = await request.body()
+    
+    # Vérifier la signature Binance
+    try:
+        verified = await binance_service.verify_webhook_signature(request.headers, body)
+    except Exception as e:
+        # Certificates unavailable: FAIL makes Binance Pay retry the notification
+        logger.error(f"Binance webhook verification error: {str(e)}")
+        return {"returnCode": "FAIL", "returnMessage": "Signature could not be verified"}
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
     try:
         data = await request.json()
-        logger.info(f"Binance Pay webhook: {data}")
-        
-        # Vérifier la signature Binance
-        # Traiter le callback
+        await webhook_inbox.ingest(db, "binance", data, body)
         
         return {"returnCode": "SUCCESS", "returnMessage": None}
     except Exception as e:
+        # FAIL makes Binance Pay retry the notification
         logger.error(f"Binance webhook error: {str(e)}")
         return {"returnCode": "FAIL", "returnMessage": str(e)}
+
+async def _ingest(provider: str, data: dict, body: bytes):
+    """Persist a provider callback; a 503 makes the provider retry"""
+    try:
+        return await webhook_inbox.ingest(db, provider, data, body)
+    except Exception as e:
+        logger.error(f"{provider} webhook error: {str(e)}")
+        raise HTTPException(status_code=503, detail="Webhook not recorded")
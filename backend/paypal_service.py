@@ -1,11 +1,100 @@
 import os
-import requests
+import asyncio
 import base64
 import logging
-from typing import Dict
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from http_client import http_client
 
 logger = logging.getLogger(__name__)
 
+
+class AccessTokenCache:
+    """
+    OAuth2 access token cache
+
+    Honors expires_in, refreshes in the background `refresh_margin` seconds
+    before expiry, and shares a single in-flight fetch between concurrent
+    callers (single-flight).
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Optional[dict]]], refresh_margin: float = 300.0, retry_delay: float = 30.0):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.token: Optional[str] = None
+        self.obtained_at = 0.0
+        self.expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.metrics = {"hits": 0, "joined": 0, "fetches": 0, "background_refreshes": 0, "failures": 0, "invalidations": 0}
+
+    def valid(self) -> bool:
+        return self.token is not None and time.monotonic() < self.expires_at
+
+    async def get(self) -> Optional[str]:
+        if self.valid():
+            self.metrics["hits"] += 1
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> Optional[str]:
+        """Fetch a new token, joining the fetch already in flight if any"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        else:
+            self.metrics["joined"] += 1
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> Optional[str]:
+        self.metrics["fetches"] += 1
+        data = await self.fetch()
+        if not data or not data.get("access_token"):
+            self.metrics["failures"] += 1
+            # Keep serving the current token while it is still valid
+            self._schedule(self.retry_delay)
+            return self.token if self.valid() else None
+
+        now = time.monotonic()
+        expires_in = float(data.get("expires_in") or 0) or 3600.0
+        self.token = data["access_token"]
+        self.obtained_at = now
+        self.expires_at = now + expires_in
+        self._schedule(max(expires_in - self.refresh_margin, expires_in / 2))
+        return self.token
+
+    def _schedule(self, delay: float):
+        if self._refresh_task and not self._refresh_task.done() and self._refresh_task is not asyncio.current_task():
+            self._refresh_task.cancel()
+        self._refresh_task = asyncio.create_task(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self.metrics["background_refreshes"] += 1
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Background token refresh failed: {str(e)}")
+
+    def invalidate(self, token: Optional[str] = None):
+        """Drop the cached token (only if it is still `token` when given)"""
+        if token is None or token == self.token:
+            self.token = None
+            self.expires_at = 0.0
+            self.metrics["invalidations"] += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "cached": self.valid(),
+            "token_age_seconds": round(now - self.obtained_at, 1) if self.token else None,
+            "expires_in_seconds": round(self.expires_at - now, 1) if self.token else None,
+            "refresh_margin_seconds": self.refresh_margin,
+            **self.metrics,
+        }
+
+
 class PayPalService:
     """
     Service pour intégrer PayPal Payment Links
@@ -21,12 +110,20 @@ class PayPalService:
             self.base_url = "https://api-m.sandbox.paypal.com"
         else:
             self.base_url = "https://api-m.paypal.com"
+        self.base_url = os.environ.get('PAYPAL_BASE_URL', self.base_url)
         
         self.is_demo = self.client_id == 'your_paypal_client_id'
-        self.access_token = None
+        self.token_cache = AccessTokenCache(
+            self._fetch_access_token,
+            refresh_margin=float(os.environ.get('PAYPAL_TOKEN_REFRESH_MARGIN', '300')),
+        )
     
-    def _get_access_token(self) -> str:
-        """Obtenir un token d'accès OAuth2"""
+    async def _get_access_token(self) -> Optional[str]:
+        """Token d'accès OAuth2 (mis en cache jusqu'à expiration)"""
+        return await self.token_cache.get()
+
+    async def _fetch_access_token(self) -> Optional[dict]:
+        """Obtenir un token d'accès OAuth2 (access_token + expires_in)"""
         try:
             auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
             
@@ -35,21 +132,37 @@ class PayPalService:
                 "Content-Type": "application/x-www-form-urlencoded"
             }
             
-            response = requests.post(
+            response = await http_client.post(
                 f"{self.base_url}/v1/oauth2/token",
                 headers=headers,
                 data={"grant_type": "client_credentials"},
-                timeout=30
+                retry=True
             )
             
             if response.status_code == 200:
-                return response.json().get("access_token")
+                return response.json()
             
+            logger.error(f"PayPal token request failed: HTTP {response.status_code}")
             return None
         except Exception as e:
             logger.error(f"Failed to get PayPal access token: {str(e)}")
             return None
     
+    async def _authorized_post(self, url: str, **kwargs):
+        """POST with the cached bearer token; on 401 refresh it once and retry"""
+        for attempt in (1, 2):
+            token = await self._get_access_token()
+            if not token:
+                return None
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token}"
+            }
+            response = await http_client.post(url, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt == 2:
+                return response
+            self.token_cache.invalidate(token)
+
     async def create_order(
         self,
         order_id: str,
@@ -80,17 +193,6 @@ class PayPalService:
             }
         
         try:
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-            
-            if not self.access_token:
-                return {"success": False, "error": "Failed to authenticate"}
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.access_token}"
-            }
-            
             payload = {
                 "intent": "CAPTURE",
                 "purchase_units": [{
@@ -110,13 +212,14 @@ class PayPalService:
                 }
             }
             
-            response = requests.post(
+            response = await self._authorized_post(
                 f"{self.base_url}/v2/checkout/orders",
-                json=payload,
-                headers=headers,
-                timeout=30
+                json=payload
             )
             
+            if response is None:
+                return {"success": False, "error": "Failed to authenticate"}
+            
             if response.status_code == 201:
                 data = response.json()
                 
@@ -161,20 +264,13 @@ class PayPalService:
             }
         
         try:
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.access_token}"
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/v2/checkout/orders/{paypal_order_id}/capture",
-                headers=headers,
-                timeout=30
+            response = await self._authorized_post(
+                f"{self.base_url}/v2/checkout/orders/{paypal_order_id}/capture"
             )
             
+            if response is None:
+                return {"success": False, "error": "Failed to authenticate"}
+            
             if response.status_code == 201:
                 data = response.json()
                 return {
@@ -1,10 +1,15 @@
 import os
-import requests
+import hmac
+import hashlib
+import html
+import json
 import logging
 from typing import Dict, Optional
 from dotenv import load_dotenv
 from pathlib import Path
 
+from http_client import http_client
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -19,7 +24,7 @@ class PlisioService:
     
     def __init__(self):
         self.api_key = os.environ.get('PLISIO_API_KEY', 'your_plisio_api_key')
-        self.base_url = "https://plisio.net/api/v1"
+        self.base_url = os.environ.get('PLISIO_BASE_URL', "https://plisio.net/api/v1")
         self.is_demo = self.api_key == 'your_plisio_api_key'
         logger.info(f"Plisio initialized - Demo mode: {self.is_demo}, Key: {self.api_key[:20]}...")
     
@@ -93,10 +98,11 @@ class PlisioService:
                 "api_key": self.api_key
             }
             
-            response = requests.get(
+            # GET with side effects: only retried when the connection failed
+            response = await http_client.get(
                 f"{self.base_url}/invoices/new",
                 params=params,
-                timeout=30
+                retry=False
             )
             
             if response.status_code == 200:
@@ -166,10 +172,9 @@ class PlisioService:
                 "id": invoice_id
             }
             
-            response = requests.get(
+            response = await http_client.get(
                 f"{self.base_url}/operations",
-                params=params,
-                timeout=30
+                params=params
             )
             
             if response.status_code == 200:
@@ -198,5 +203,28 @@ class PlisioService:
                 "error": str(e)
             }
 
+    def verify_callback(self, data: Dict) -> bool:
+        """
+        Vérifier le verify_hash d'un callback Plisio (callback_url avec json=true)
+        
+        Plisio signe les champs du callback, sans verify_hash, sérialisés en
+        JSON compact dans l'ordre reçu: HMAC SHA1 avec la clé secrète.
+        
+        Returns:
+            True si le hash est valide
+        """
+        received = data.get("verify_hash")
+        if self.is_demo or not isinstance(received, str):
+            return False
+        fields = {key: value for key, value in data.items() if key != "verify_hash"}
+        # Normalisations faites par les SDK Plisio avant le calcul du hash
+        if "expire_utc" in fields:
+            fields["expire_utc"] = str(fields["expire_utc"])
+        if isinstance(fields.get("tx_urls"), str):
+            fields["tx_urls"] = html.unescape(fields["tx_urls"])
+        message = json.dumps(fields, separators=(",", ":"), ensure_ascii=False)
+        expected = hmac.new(self.api_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha1).hexdigest()
+        return hmac.compare_digest(expected, received)
+
 # Initialize Plisio service
 plisio_service = PlisioService()
@@ -0,0 +1,181 @@
+"""
+Server-side cart pricing
+
+Prices cart lines from the catalog rather than from client-sent amounts:
+all referenced products and product_variations are loaded with one `$in`
+query per collection, then subtotal, coupon discount, the Plisio crypto
+discount and shipping are computed in one pass. A CatalogLookup memoizes
+documents for the duration of a request so later steps (order creation,
+stock checks) reuse them instead of refetching.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 15% off when paying with crypto through Plisio
+CRYPTO_DISCOUNT_RATES = {"plisio": 0.15}
+
+SHIPPING_RATES = {"free": 0.0, "fedex": 10.0}
+
+PRODUCT_PROJECTION = {"_id": 0, "id": 1, "name": 1, "price": 1, "images": 1, "stock": 1, "sku": 1, "digital_product": 1}
+VARIATION_PROJECTION = {"_id": 0, "id": 1, "product_id": 1, "name": 1, "price_modifier": 1, "stock": 1, "sku": 1, "image": 1}
+
+
+class PricingError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _money(value: float) -> float:
+    return round(value, 2)
+
+
+class CatalogLookup:
+    """Per-request memo of product and variation documents"""
+
+    def __init__(self, db):
+        self.db = db
+        self.products: Dict[str, Optional[dict]] = {}
+        self.variations: Dict[str, Optional[dict]] = {}
+
+    async def _load(self, collection, memo: Dict[str, Optional[dict]], ids, projection: dict):
+        missing = [item_id for item_id in dict.fromkeys(ids) if item_id and item_id not in memo]
+        if not missing:
+            return
+        async for doc in collection.find({"id": {"$in": missing}}, projection):
+            memo[doc["id"]] = doc
+        for item_id in missing:
+            memo.setdefault(item_id, None)
+
+    async def load(self, product_ids, variation_ids=()):
+        """Fetch whatever is not memoized yet: one query per collection, run together"""
+        await asyncio.gather(
+            self._load(self.db.products, self.products, product_ids, PRODUCT_PROJECTION),
+            self._load(self.db.product_variations, self.variations, variation_ids, VARIATION_PROJECTION),
+        )
+
+
+def coupon_discount(coupon: Optional[dict], subtotal: float) -> float:
+    """Validate a coupon document against a subtotal; raises PricingError"""
+    if not coupon:
+        raise PricingError("Invalid coupon code", 404)
+
+    expires_at = coupon.get("expires_at")
+    if isinstance(expires_at, str):
+        expires_at = datetime.fromisoformat(expires_at)
+    if expires_at and expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at and expires_at < datetime.now(timezone.utc):
+        raise PricingError("Coupon has expired")
+
+    if coupon.get("max_uses") and coupon.get("used_count", 0) >= coupon["max_uses"]:
+        raise PricingError("Coupon usage limit reached")
+
+    min_purchase = coupon.get("min_purchase") or 0.0
+    if subtotal < min_purchase:
+        raise PricingError(f"Minimum purchase of ${min_purchase} required")
+
+    if coupon.get("discount_type") == "percentage":
+        discount = subtotal * (coupon["discount_value"] / 100)
+    else:
+        discount = coupon["discount_value"]
+    return _money(min(discount, subtotal))
+
+
+async def find_coupon(db, code: str) -> Optional[dict]:
+    return await db.coupons.find_one({"code": code, "active": True}, {"_id": 0})
+
+
+async def price_cart(
+    db,
+    items: List[dict],
+    coupon_code: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    shipping_method: Optional[str] = None,
+    lookup: Optional[CatalogLookup] = None,
+) -> dict:
+    """
+    Price cart lines ({product_id, quantity, variation_id?}) from the catalog.
+
+    Raises PricingError for unknown products or shipping methods. An invalid
+    coupon does not fail the quote: it is reported in `coupon_error` so the
+    cart can still display totals; callers that require it check the field.
+    """
+    lookup = lookup or CatalogLookup(db)
+    shipping_method = shipping_method or "free"
+    if shipping_method not in SHIPPING_RATES:
+        raise PricingError(f"Unknown shipping method '{shipping_method}'")
+
+    coupon, _ = await asyncio.gather(
+        find_coupon(db, coupon_code) if coupon_code else asyncio.sleep(0),
+        lookup.load(
+            [item.get("product_id") for item in items],
+            [item.get("variation_id") for item in items],
+        ),
+    )
+
+    lines = []
+    subtotal = 0.0
+    for item in items:
+        product = lookup.products.get(item.get("product_id"))
+        if product is None:
+            raise PricingError(f"Product {item.get('product_id')} not found")
+        try:
+            quantity = int(item.get("quantity") or 0)
+        except (TypeError, ValueError):
+            raise PricingError(f"Invalid quantity for product {product['id']}")
+        if quantity < 1:
+            raise PricingError(f"Invalid quantity for product {product['id']}")
+
+        price = product.get("price") or 0.0
+        name = product.get("name")
+        image = (product.get("images") or [None])[0]
+        variation_id = item.get("variation_id")
+        if variation_id:
+            variation = lookup.variations.get(variation_id)
+            if variation is None or variation.get("product_id") != product["id"]:
+                raise PricingError(f"Variation {variation_id} not found")
+            price += variation.get("price_modifier") or 0.0
+            name = f"{name} - {variation['name']}" if variation.get("name") else name
+            image = variation.get("image") or image
+
+        line_total = _money(price * quantity)
+        subtotal += line_total
+        lines.append({
+            "product_id": product["id"],
+            "variation_id": variation_id,
+            "name": name,
+            "price": _money(price),
+            "quantity": quantity,
+            "image": image,
+            "line_total": line_total,
+        })
+    subtotal = _money(subtotal)
+
+    discount_amount = 0.0
+    coupon_error = None
+    if coupon_code:
+        try:
+            discount_amount = coupon_discount(coupon, subtotal)
+        except PricingError as e:
+            coupon_error = str(e)
+
+    crypto_discount = _money(subtotal * CRYPTO_DISCOUNT_RATES.get(payment_method, 0.0))
+    shipping_cost = SHIPPING_RATES[shipping_method]
+    total = _money(max(subtotal - discount_amount - crypto_discount, 0.0) + shipping_cost)
+
+    return {
+        "items": lines,
+        "subtotal": subtotal,
+        "coupon_code": coupon_code if coupon_code and not coupon_error else None,
+        "coupon_error": coupon_error,
+        "discount_amount": discount_amount,
+        "crypto_discount": crypto_discount,
+        "shipping_method": shipping_method,
+        "shipping_cost": shipping_cost,
+        "total": total,
+    }
@@ -0,0 +1,80 @@
+"""
+Authenticated principal cache
+
+get_current_user used to load the user document on every authenticated
+request. Principals are now kept in a short-TTL, size-bounded cache keyed
+by user id and token version. Access tokens carry the user's token
+version (`tv`) plus role and permission claims. Writes that change who a
+user is or what they may do bump `token_version` in the users collection
+and invalidate the cache entry, so older tokens stop matching and the
+claims are never trusted past a change.
+"""
+import os
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+
+# Never cached or returned with the principal
+SECRET_FIELDS = ("_id", "password", "password_hash", "reset_token", "reset_expires", "reset_token_expiry")
+
+PRINCIPAL_PROJECTION = {field: 0 for field in SECRET_FIELDS}
+
+
+def token_version(user: dict) -> int:
+    return int(user.get("token_version") or 0)
+
+
+def token_claims(user: dict) -> dict:
+    """JWT claims for a user document"""
+    claims = {"sub": user["id"], "tv": token_version(user), "role": user.get("role", "customer")}
+    if user.get("role") == "admin":
+        claims["super"] = bool(user.get("is_super_admin", False))
+        claims["perms"] = dict(user.get("permissions") or {})
+    return claims
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = 10000, ttl: int = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, version: int) -> Optional[dict]:
+        entry = self._cache.get(user_id)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user: dict):
+        self._cache[user["id"]] = (token_version(user), user)
+
+    def invalidate(self, *user_ids: Optional[str]):
+        for user_id in user_ids:
+            if user_id and self._cache.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000')),
+    ttl=int(os.environ.get('PRINCIPAL_CACHE_TTL', '30')),
+)
@@ -0,0 +1,327 @@
+"""
+Rate limiting for auth, search and checkout
+
+An ASGI middleware matches each request against per-route policies and
+counts it under the client IP and, for policies scoped to an account,
+under the email sent with the request (JSON body or query string). A
+request over any of its limits is answered 429 with a Retry-After header
+before it reaches the route, so bots never touch MongoDB or bcrypt.
+
+Policies use either a token bucket (`limit` tokens refilled over `window`
+seconds, from throttling.TokenBucket) or a sliding window counter (the
+previous fixed window weighted by how much of it still overlaps). Counters
+live in process memory by default. RATE_LIMIT_BACKEND=mongo shares them
+between workers through the `rate_limits` collection; the shared store
+counts every policy as a sliding window with the same limit and window.
+
+Limits are overridden per policy with RATE_LIMITS, e.g.
+`RATE_LIMITS="login_ip=30/60,search_ip=off"`. Behind a reverse proxy set
+RATE_LIMIT_PROXY_HOPS to the number of proxies that append to
+X-Forwarded-For, otherwise the proxy address is used as the client IP.
+"""
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+
+from throttling import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET = "token_bucket"
+SLIDING_WINDOW = "sliding_window"
+
+# Bodies larger than this are not inspected for an account key
+MAX_INSPECTED_BODY = 64 * 1024
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    name: str
+    method: str
+    paths: Tuple[str, ...]
+    limit: int
+    window: float
+    algorithm: str = SLIDING_WINDOW
+    # "ip", or "account" keyed by `account_field` from the JSON body or the query string
+    scope: str = "ip"
+    account_field: Optional[str] = None
+    account_source: str = "json"
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and path in self.paths
+
+
+DEFAULT_POLICIES: List[RatePolicy] = [
+    RatePolicy("login_ip", "POST", ("/api/auth/login",), limit=20, window=60),
+    RatePolicy("login_account", "POST", ("/api/auth/login",), limit=5, window=300,
+               scope="account", account_field="email"),
+    RatePolicy("forgot_password_ip", "POST", ("/api/auth/forgot-password",), limit=5, window=300),
+    RatePolicy("forgot_password_account", "POST", ("/api/auth/forgot-password",), limit=3, window=3600,
+               scope="account", account_field="email", account_source="query"),
+    RatePolicy("search_ip", "GET", ("/api/products/search", "/api/products/search/suggest"),
+               limit=30, window=3, algorithm=TOKEN_BUCKET),
+    RatePolicy("checkout_ip", "POST", ("/api/orders",), limit=10, window=60),
+    RatePolicy("checkout_account", "POST", ("/api/orders",), limit=5, window=60,
+               scope="account", account_field="user_email"),
+    RatePolicy("coupon_ip", "POST", ("/api/coupons/validate",), limit=20, window=60, algorithm=TOKEN_BUCKET),
+]
+
+
+def configure_policies(policies: List[RatePolicy], overrides: str) -> List[RatePolicy]:
+    """Apply `name=limit/window` or `name=off` overrides"""
+    settings = {}
+    for item in filter(None, (part.strip() for part in (overrides or "").split(","))):
+        name, _, value = item.partition("=")
+        settings[name.strip()] = value.strip()
+    configured = []
+    for policy in policies:
+        value = settings.get(policy.name)
+        if value is None:
+            configured.append(policy)
+        elif value != "off":
+            limit, _, window = value.partition("/")
+            configured.append(replace(policy, limit=int(limit), window=float(window or policy.window)))
+    return configured
+
+
+def _sliding_retry_after(previous: int, needed: int, limit: int, window: float, elapsed: float) -> float:
+    """Seconds until previous * overlap + needed fits within the limit"""
+    if needed > limit or not previous:
+        return window - elapsed
+    # previous * (1 - t / window) + needed <= limit once t >= window * (1 - (limit - needed) / previous)
+    return max(0.0, window * (1 - (limit - needed) / previous) - elapsed)
+
+
+class MemoryStore:
+    """Per-process counters"""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: Dict[float, TTLCache] = {}
+        self._windows: Dict[float, TTLCache] = {}
+
+    def _cache(self, caches: Dict[float, TTLCache], window: float) -> TTLCache:
+        # Idle entries expire: an untouched bucket is full again and an old window no longer counts
+        if window not in caches:
+            caches[window] = TTLCache(maxsize=self.maxsize, ttl=window * 2)
+        return caches[window]
+
+    async def hit(self, policy: RatePolicy, key: str) -> Tuple[bool, float]:
+        if policy.algorithm == TOKEN_BUCKET:
+            buckets = self._cache(self._buckets, policy.window)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TokenBucket(policy.limit / policy.window, capacity=policy.limit)
+            else:
+                buckets[key] = bucket  # refresh the idle timer
+            if bucket.try_acquire():
+                return True, 0.0
+            return False, bucket.wait_time()
+
+        windows = self._cache(self._windows, policy.window)
+        now = time.time()
+        index, elapsed = divmod(now, policy.window)
+        start, current, previous = windows.get(key, (index, 0, 0))
+        if start != index:
+            previous = current if start == index - 1 else 0
+            current = 0
+        weighted = previous * (1 - elapsed / policy.window) + current
+        if weighted + 1 > policy.limit:
+            windows[key] = (index, current, previous)
+            return False, _sliding_retry_after(previous, current + 1, policy.limit, policy.window, elapsed)
+        windows[key] = (index, current + 1, previous)
+        return True, 0.0
+
+
+class MongoStore:
+    """Sliding window counters shared by every worker"""
+
+    collection_name = "rate_limits"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def hit(self, policy: RatePolicy, key: str) -> Tuple[bool, float]:
+        collection = self.db[self.collection_name]
+        now = time.time()
+        index, elapsed = divmod(now, policy.window)
+        prefix = f"{policy.name}:{key}"
+        counter = await collection.find_one_and_update(
+            {"_id": f"{prefix}:{int(index)}"},
+            {
+                "$inc": {"count": 1},
+                # TTL index removes windows once they can no longer be the previous one
+                "$setOnInsert": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=policy.window * 2)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        current = counter["count"]
+        previous_doc = await collection.find_one({"_id": f"{prefix}:{int(index) - 1}"})
+        previous = previous_doc["count"] if previous_doc else 0
+        if previous * (1 - elapsed / policy.window) + current <= policy.limit:
+            return True, 0.0
+        # Rejected requests do not count against the window
+        await collection.update_one({"_id": f"{prefix}:{int(index)}"}, {"$inc": {"count": -1}})
+        return False, _sliding_retry_after(previous, current, policy.limit, policy.window, elapsed)
+
+
+class RateLimiter:
+    def __init__(self, policies: List[RatePolicy], enabled: bool = True, proxy_hops: int = 0,
+                 backend: str = "memory"):
+        self.policies = policies
+        self.enabled = enabled
+        self.proxy_hops = proxy_hops
+        self.backend = backend
+        self.store = MemoryStore()
+        self._stats = {policy.name: {"allowed": 0, "rejected": 0} for policy in policies}
+        self.store_errors = 0
+
+    def start(self, db):
+        """Switch to the shared store when configured"""
+        if self.backend == "mongo":
+            self.store = MongoStore(db)
+
+    def match(self, method: str, path: str) -> List[RatePolicy]:
+        return [policy for policy in self.policies if policy.matches(method, path)] if self.enabled else []
+
+    def client_ip(self, scope) -> str:
+        if self.proxy_hops:
+            for name, value in scope.get("headers") or []:
+                if name == b"x-forwarded-for":
+                    hops = [part.strip() for part in value.decode("latin-1").split(",") if part.strip()]
+                    if hops:
+                        # The entry appended by the outermost trusted proxy
+                        return hops[-min(self.proxy_hops, len(hops))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def check(self, policies: List[RatePolicy], ip: str, accounts: Dict[str, Optional[str]]) -> float:
+        """0 when allowed, otherwise seconds the client should wait"""
+        retry_after = 0.0
+        for policy in policies:
+            key = ip if policy.scope == "ip" else accounts.get(policy.name)
+            if not key:
+                continue
+            try:
+                allowed, wait = await self.store.hit(policy, key)
+            except Exception as e:
+                # Fail open: a broken shared store must not take the site down
+                self.store_errors += 1
+                logger.error(f"Rate limit store error for {policy.name}: {str(e)}")
+                continue
+            self._stats[policy.name]["allowed" if allowed else "rejected"] += 1
+            if not allowed:
+                retry_after = max(retry_after, wait)
+                # Remaining policies are not charged for a request that will not run
+                break
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": "mongo" if isinstance(self.store, MongoStore) else "memory",
+            "store_errors": self.store_errors,
+            "policies": [
+                {
+                    "name": policy.name,
+                    "method": policy.method,
+                    "paths": list(policy.paths),
+                    "scope": policy.scope,
+                    "algorithm": policy.algorithm,
+                    "limit": policy.limit,
+                    "window": policy.window,
+                    **self._stats[policy.name],
+                }
+                for policy in self.policies
+            ],
+        }
+
+
+def _account_key(policy: RatePolicy, body: Optional[bytes], query_string: bytes) -> Optional[str]:
+    value = None
+    if policy.account_source == "query":
+        value = (parse_qs(query_string.decode("latin-1")).get(policy.account_field) or [None])[0]
+    elif body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        value = payload.get(policy.account_field) if isinstance(payload, dict) else None
+    return str(value).strip().lower() if value else None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying `limiter` before routing"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        policies = self.limiter.match(scope["method"], scope["path"])
+        if not policies:
+            return await self.app(scope, receive, send)
+
+        body = None
+        if any(policy.scope == "account" and policy.account_source == "json" for policy in policies):
+            body, receive = await _buffer_body(receive)
+        accounts = {
+            policy.name: _account_key(policy, body, scope.get("query_string", b""))
+            for policy in policies if policy.scope == "account"
+        }
+
+        retry_after = await self.limiter.check(policies, self.limiter.client_ip(scope), accounts)
+        if not retry_after:
+            return await self.app(scope, receive, send)
+
+        content = json.dumps({"detail": "Too many requests, please retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(content)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+
+async def _buffer_body(receive):
+    """Read the request body (up to MAX_INSPECTED_BODY) and return a receive that replays it"""
+    messages, size, more = [], 0, True
+    while more and size <= MAX_INSPECTED_BODY:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        more = message.get("more_body", False)
+    body = b"".join(message.get("body", b"") for message in messages) if not more and size <= MAX_INSPECTED_BODY else None
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+rate_limiter = RateLimiter(
+    configure_policies(DEFAULT_POLICIES, os.environ.get('RATE_LIMITS', '')),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() != 'false',
+    proxy_hops=int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0')),
+    backend=os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+)
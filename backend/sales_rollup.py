@@ -0,0 +1,217 @@
+"""
+Daily sales rollup
+
+Maintains one `sales_daily` document per UTC day with order count, gross
+sales, units and confirmed revenue, broken down per payment method. Order
+routes and payment webhooks update it with atomic $inc operations so the
+dashboards read a handful of small documents instead of the order history.
+
+Backfill the rollup from existing orders with:
+    python sales_rollup.py backfill
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from pymongo import ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED = "confirmed"
+
+
+def _day(created_at) -> str:
+    """UTC day key (YYYY-MM-DD) for an ISO string or datetime"""
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo:
+            created_at = created_at.astimezone(timezone.utc)
+        return created_at.strftime("%Y-%m-%d")
+    if isinstance(created_at, str) and len(created_at) >= 10:
+        return created_at[:10]
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _method_key(payment_method: Optional[str]) -> str:
+    """Payment method usable as a field name (no dots or leading $)"""
+    key = (payment_method or "unknown").replace(".", "_")
+    return key.lstrip("$") or "unknown"
+
+
+def _units(order: dict) -> int:
+    return sum(int(item.get("quantity", 0) or 0) for item in order.get("items") or [])
+
+
+class SalesRollup:
+    """Keeps the sales_daily collection in step with the orders collection"""
+
+    collection_name = "sales_daily"
+
+    async def _inc(self, db, order: dict, fields: Dict[str, float]):
+        day = _day(order.get("created_at"))
+        method = _method_key(order.get("payment_method"))
+        inc = {}
+        for field, value in fields.items():
+            inc[field] = value
+            inc[f"payment_methods.{method}.{field}"] = value
+        await db[self.collection_name].update_one(
+            {"_id": day},
+            {
+                "$inc": inc,
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+                "$setOnInsert": {"date": day},
+            },
+            upsert=True
+        )
+
+    def _created_fields(self, order: dict, sign: int) -> Dict[str, float]:
+        total = float(order.get("total", 0) or 0)
+        fields = {
+            "orders": sign,
+            "gross": sign * total,
+            "units": sign * _units(order),
+        }
+        if order.get("payment_status") == CONFIRMED:
+            fields.update({"confirmed_orders": sign, "revenue": sign * total})
+        return fields
+
+    async def record_order_created(self, db, order: dict):
+        try:
+            await self._inc(db, order, self._created_fields(order, 1))
+        except Exception as e:
+            logger.error(f"Failed to update sales rollup for new order {order.get('id')}: {str(e)}")
+
+    async def record_order_deleted(self, db, order: dict):
+        try:
+            await self._inc(db, order, self._created_fields(order, -1))
+        except Exception as e:
+            logger.error(f"Failed to update sales rollup for deleted order {order.get('id')}: {str(e)}")
+
+    async def record_payment_status_change(self, db, order: dict, old_status: Optional[str], new_status: Optional[str]):
+        """Move an order in or out of confirmed revenue when payment_status changes"""
+        was_confirmed = old_status == CONFIRMED
+        is_confirmed = new_status == CONFIRMED
+        if was_confirmed == is_confirmed:
+            return
+        sign = 1 if is_confirmed else -1
+        total = float(order.get("total", 0) or 0)
+        try:
+            await self._inc(db, order, {"confirmed_orders": sign, "revenue": sign * total})
+        except Exception as e:
+            logger.error(f"Failed to update sales rollup for order {order.get('id')}: {str(e)}")
+
+    async def backfill(self, db, batch_size: int = 500) -> int:
+        """Rebuild every day from the orders collection; returns the number of days written"""
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "day": {"$cond": [
+                        {"$eq": [{"$type": "$created_at"}, "date"]},
+                        {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        {"$substrCP": ["$created_at", 0, 10]}
+                    ]},
+                    "method": {"$ifNull": ["$payment_method", "unknown"]},
+                },
+                "orders": {"$sum": 1},
+                "gross": {"$sum": "$total"},
+                "units": {"$sum": {"$sum": "$items.quantity"}},
+                "confirmed_orders": {"$sum": {"$cond": [{"$eq": ["$payment_status", CONFIRMED]}, 1, 0]}},
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", CONFIRMED]}, "$total", 0]}},
+            }},
+            {"$sort": {"_id.day": 1}},
+        ]
+        fields = ("orders", "gross", "units", "confirmed_orders", "revenue")
+        now = datetime.now(timezone.utc).isoformat()
+
+        days_written = 0
+        current: Optional[dict] = None
+        batch = []
+
+        async def flush():
+            nonlocal batch, days_written
+            if batch:
+                await db[self.collection_name].bulk_write(batch, ordered=False)
+                days_written += len(batch)
+                batch = []
+
+        async for row in db.orders.aggregate(pipeline, allowDiskUse=True):
+            day = row["_id"]["day"]
+            method = _method_key(row["_id"]["method"])
+            if current is None or current["_id"] != day:
+                if current is not None:
+                    batch.append(ReplaceOne({"_id": current["_id"]}, current, upsert=True))
+                    if len(batch) >= batch_size:
+                        await flush()
+                current = {"_id": day, "date": day, "payment_methods": {}, "updated_at": now}
+                current.update({field: 0 for field in fields})
+            breakdown = current["payment_methods"].setdefault(method, {field: 0 for field in fields})
+            for field in fields:
+                current[field] += row[field]
+                breakdown[field] += row[field]
+
+        if current is not None:
+            batch.append(ReplaceOne({"_id": current["_id"]}, current, upsert=True))
+        await flush()
+        logger.info(f"✓ Sales rollup backfilled - {days_written} days")
+        return days_written
+
+    async def ensure_backfilled(self, db):
+        """Backfill once when the rollup is empty but orders exist"""
+        try:
+            if await db[self.collection_name].estimated_document_count() == 0 and await db.orders.find_one({}, {"_id": 1}):
+                await self.backfill(db)
+        except Exception as e:
+            logger.error(f"Sales rollup backfill failed: {str(e)}")
+
+    async def days(self, db, start: datetime, end: Optional[datetime] = None):
+        """Rollup documents for days in [start, end], oldest first"""
+        query = {"_id": {"$gte": _day(start)}}
+        if end is not None:
+            query["_id"]["$lte"] = _day(end)
+        return await db[self.collection_name].find(query).sort("_id", 1).to_list(None)
+
+    async def totals(self, db) -> dict:
+        """All-time totals summed over the rollup"""
+        result = await db[self.collection_name].aggregate([
+            {"$group": {
+                "_id": None,
+                "orders": {"$sum": "$orders"},
+                "gross": {"$sum": "$gross"},
+                "units": {"$sum": "$units"},
+                "confirmed_orders": {"$sum": "$confirmed_orders"},
+                "revenue": {"$sum": "$revenue"},
+            }}
+        ]).to_list(1)
+        if not result:
+            return {"orders": 0, "gross": 0.0, "units": 0, "confirmed_orders": 0, "revenue": 0.0}
+        result[0].pop("_id", None)
+        return result[0]
+
+
+sales_rollup = SalesRollup()
+
+
+async def main(argv):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    ROOT_DIR = Path(__file__).parent
+    load_dotenv(ROOT_DIR / '.env')
+
+    if len(argv) < 2 or argv[1] != "backfill":
+        print("Usage: python sales_rollup.py backfill")
+        return
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    print("Rebuilding sales_daily from orders...")
+    days = await sales_rollup.backfill(db)
+    print(f"✅ {days} days written")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv))
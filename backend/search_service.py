@@ -0,0 +1,319 @@
+"""
+Product search service
+
+In-process inverted index over the catalog with tokenization, light English
+stemming, BM25F-style ranking and prefix autocomplete. The index is built
+from MongoDB at startup, updated incrementally by the product routes and
+fully rebuilt periodically so edits made by scripts or other workers are
+picked up.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Field weights used when accumulating term frequencies (BM25F)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.0,
+    "category": 1.5,
+    "description": 1.0,
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "with", "this", "that", "your", "our",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Suffix rules applied in order, first match wins: (suffix, replacement, min stem length)
+SUFFIX_RULES = [
+    ("sses", "ss", 2),
+    ("ies", "y", 2),
+    ("ches", "ch", 2),
+    ("shes", "sh", 2),
+    ("xes", "x", 2),
+    ("ness", "", 3),
+    ("ments", "", 3),
+    ("ment", "", 3),
+    ("ings", "", 3),
+    ("ing", "", 3),
+    ("edly", "", 3),
+    ("ed", "", 3),
+    ("ly", "", 3),
+    ("s", "", 3),
+]
+
+VOWELS = set("aeiouy")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents"""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_RE.findall(normalize(text))
+
+
+def stem(token: str) -> str:
+    """Light suffix-stripping stemmer (watches -> watch, running -> run)"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement, min_len in SUFFIX_RULES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_len:
+            if suffix == "s" and token[-2] in "su":
+                return token
+            base = token[: len(token) - len(suffix)] + replacement
+            # shipped -> shipp -> ship
+            if suffix in ("ing", "ings", "ed") and len(base) > 3 and base[-1] == base[-2] and base[-1] not in VOWELS | set("lsz"):
+                base = base[:-1]
+            return base
+    return token
+
+
+class SearchIndex:
+    """Inverted index over products with BM25F ranking"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Set[str]] = {}
+        self.doc_surfaces: Dict[str, Set[str]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.doc_names: Dict[str, str] = {}
+        self.total_length = 0.0
+        # Sorted surface vocabulary for prefix lookups, with document frequency
+        self.surfaces: List[str] = []
+        self.surface_df: Dict[str, int] = {}
+        self.ready = False
+        self.built_at: Optional[float] = None
+
+    # ---------- maintenance ----------
+
+    def upsert(self, product: dict):
+        """Index or re-index a single product document"""
+        product_id = product.get("id")
+        if not product_id:
+            return
+        self.remove(product_id)
+
+        weighted_tf: Dict[str, float] = defaultdict(float)
+        surfaces: Set[str] = set()
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field)
+            if not value:
+                continue
+            text = " ".join(value) if isinstance(value, list) else str(value)
+            for token in tokenize(text):
+                if token in STOPWORDS:
+                    continue
+                weighted_tf[stem(token)] += weight
+                surfaces.add(token)
+                length += weight
+
+        for term, tf in weighted_tf.items():
+            self.postings[term][product_id] = tf
+        for surface in surfaces:
+            count = self.surface_df.get(surface, 0)
+            if count == 0:
+                bisect.insort(self.surfaces, surface)
+            self.surface_df[surface] = count + 1
+
+        self.doc_terms[product_id] = set(weighted_tf)
+        self.doc_surfaces[product_id] = surfaces
+        self.doc_lengths[product_id] = length
+        self.doc_names[product_id] = product.get("name", "")
+        self.total_length += length
+
+    def remove(self, product_id: str):
+        """Drop a product from the index"""
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self.postings[term]
+        for surface in self.doc_surfaces.pop(product_id, set()):
+            count = self.surface_df.get(surface, 0) - 1
+            if count <= 0:
+                self.surface_df.pop(surface, None)
+                i = bisect.bisect_left(self.surfaces, surface)
+                if i < len(self.surfaces) and self.surfaces[i] == surface:
+                    self.surfaces.pop(i)
+            else:
+                self.surface_df[surface] = count
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+        self.doc_names.pop(product_id, None)
+
+    # ---------- querying ----------
+
+    def complete(self, prefix: str, limit: int = 50) -> List[str]:
+        """Vocabulary words starting with prefix, most frequent first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.surfaces, prefix)
+        matches = []
+        for surface in self.surfaces[start:]:
+            if not surface.startswith(prefix):
+                break
+            matches.append(surface)
+        matches.sort(key=lambda s: -self.surface_df.get(s, 0))
+        return matches[:limit]
+
+    def search(self, query: str, limit: int = 10, prefix_last: bool = True) -> List[Tuple[str, float]]:
+        """Return (product_id, score) pairs ordered by relevance"""
+        tokens = [t for t in tokenize(query) if t not in STOPWORDS]
+        if not tokens or not self.doc_lengths:
+            return []
+
+        # term -> query weight; the last token also matches as a prefix
+        query_terms: Dict[str, float] = {}
+        for token in tokens:
+            query_terms[stem(token)] = 1.0
+        if prefix_last:
+            for surface in self.complete(tokens[-1], limit=25):
+                query_terms.setdefault(stem(surface), 0.5)
+
+        n_docs = len(self.doc_lengths)
+        avg_length = (self.total_length / n_docs) or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term, query_weight in query_terms.items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for product_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[product_id] / avg_length)
+                scores[product_id] += query_weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "documents": len(self.doc_lengths),
+            "terms": len(self.postings),
+            "vocabulary": len(self.surfaces),
+            "built_at": self.built_at,
+        }
+
+
+class SearchService:
+    """Owns the live search index and keeps it in sync with MongoDB"""
+
+    PROJECTION = {"_id": 0, "id": 1, "name": 1, "description": 1, "tags": 1, "category": 1}
+
+    def __init__(self):
+        self.index = SearchIndex()
+        self.rebuild_interval = int(os.environ.get('SEARCH_REBUILD_INTERVAL', '900'))
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Incremental writes made while a rebuild runs, replayed onto the new index before the swap
+        self._pending: Optional[List[Tuple[str, object]]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index.ready
+
+    def start(self, db):
+        """Build the index in the background and keep it periodically refreshed"""
+        if self._task and not self._task.done():
+            return self._task
+        self._task = asyncio.create_task(self._run(db))
+        return self._task
+
+    async def _run(self, db):
+        while True:
+            try:
+                await self.rebuild(db)
+            except Exception as e:
+                logger.error(f"Search index rebuild failed: {str(e)}")
+            if self.rebuild_interval <= 0:
+                return
+            await asyncio.sleep(self.rebuild_interval)
+
+    async def rebuild(self, db) -> dict:
+        """Build a fresh index from the products collection and swap it in"""
+        async with self._lock:
+            started = time.monotonic()
+            index = SearchIndex()
+            self._pending = []
+            try:
+                async for product in db.products.find({}, self.PROJECTION):
+                    index.upsert(product)
+                # The scan may have read a product before an edit that was applied to the old index
+                for operation, value in self._pending:
+                    if operation == "upsert":
+                        index.upsert(value)
+                    else:
+                        index.remove(value)
+            finally:
+                self._pending = None
+            index.ready = True
+            index.built_at = time.time()
+            self.index = index
+            logger.info(f"✓ Search index built - {len(index.doc_lengths)} products in {time.monotonic() - started:.2f}s")
+            return index.stats()
+
+    def index_product(self, product: dict):
+        self.index.upsert(product)
+        if self._pending is not None:
+            self._pending.append(("upsert", product))
+
+    def remove_product(self, product_id: str):
+        self.index.remove(product_id)
+        if self._pending is not None:
+            self._pending.append(("remove", product_id))
+
+    async def refresh_products(self, db, product_ids: Iterable[str]):
+        """Re-index the given products from the database (bulk edits)"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        found = set()
+        async for product in db.products.find({"id": {"$in": product_ids}}, self.PROJECTION):
+            self.index_product(product)
+            found.add(product["id"])
+        for product_id in product_ids:
+            if product_id not in found:
+                self.remove_product(product_id)
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """Product ids ordered by relevance"""
+        return [product_id for product_id, _ in self.index.search(query, limit=limit)]
+
+    def suggest(self, query: str, limit: int = 8) -> dict:
+        """Prefix autocomplete: completed words and matching product names"""
+        tokens = tokenize(query)
+        if not tokens:
+            return {"terms": [], "products": []}
+        head = " ".join(tokens[:-1])
+        terms = [f"{head} {t}".strip() for t in self.index.complete(tokens[-1], limit=limit)]
+        products = [
+            {"id": product_id, "name": self.index.doc_names.get(product_id, "")}
+            for product_id, _ in self.index.search(query, limit=limit)
+        ]
+        return {"terms": terms, "products": products}
+
+
+search_service = SearchService()
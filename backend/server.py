@@ -1,17 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, status, Request, Response, UploadFile, File, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import re
 import uuid
+import tempfile
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 import jwt
 
 # Import payment services
@@ -19,6 +22,27 @@ from email_service import email_service
 from plisio_service import plisio_service
 from stripe_service import stripe_service
 from oauth_service import oauth_service
+from db_indexes import index_manager
+from search_service import search_service
+from catalog_cache import catalog_cache, normalize_params
+from pagination import keyset_page, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from sales_rollup import sales_rollup
+from job_queue import job_queue
+from campaign_service import campaign_service
+from http_client import http_client
+from paypal_service import paypal_service
+from webhook_inbox import webhook_inbox
+import order_state
+import pricing
+from stock_reservations import stock_reservations, InsufficientStock
+import catalog_import
+from password_hasher import password_hasher, PasswordHasherBusy
+from principal_cache import principal_cache, token_claims, token_version, PRINCIPAL_PROJECTION
+from session_store import session_store, SessionError
+from rate_limiter import rate_limiter, RateLimitMiddleware
+from media_pipeline import media_pipeline
+import exports
+from admin_routes import order_filter_query, customer_filter_query
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -36,10 +60,9 @@ db = client[db_name]
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production-' + str(uuid.uuid4()))
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Short-lived; clients renew them with the session's refresh token
+ACCESS_TOKEN_EXPIRE_MINUTES = int(session_store.access_ttl.total_seconds() // 60)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # Create the main app
@@ -72,6 +95,11 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class Category(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -171,7 +199,14 @@ class ProductUpdate(BaseModel):
 
 class CartItem(BaseModel):
     product_id: str
-    quantity: int
+    quantity: int = Field(..., ge=1)
+    variation_id: Optional[str] = None
+
+class CartPriceRequest(BaseModel):
+    items: List[CartItem] = Field(..., min_length=1, max_length=200)
+    coupon_code: Optional[str] = None
+    payment_method: Optional[str] = None
+    shipping_method: Optional[str] = "free"
 
 class Coupon(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -246,32 +281,32 @@ class OrderCreate(BaseModel):
     shipping_cost: Optional[float] = 0.0
     phone: str
     notes: Optional[str] = None
+    coupon_code: Optional[str] = None
+
+class OrderBatchStatusUpdate(BaseModel):
+    order_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    status: Optional[str] = None
+    payment_status: Optional[str] = None
+    notify: bool = True
 
 # ===== HELPER FUNCTIONS =====
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new hash to store when the bcrypt cost changed)"""
     # For admin login, use simple password check temporarily
     if plain_password == "Admin123!" and "kayicom509@gmail.com" in str(hashed_password):
-        return True
+        return True, None
     
     try:
-        result = pwd_context.verify(plain_password, hashed_password)
-        print(f"Passlib verification result: {result}")
-        return result
-    except Exception as e:
-        print(f"Passlib error: {e}")
-        # Fallback to bcrypt directly
-        import bcrypt
-        try:
-            result = bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-            print(f"Bcrypt verification result: {result}")
-            return result
-        except Exception as e2:
-            print(f"Bcrypt error: {e2}")
-            return False
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -280,27 +315,61 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Decoded access token claims (sub, tv, role, and perms/super for admins)"""
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+    # Answered from the in-memory revocation filter; tokens issued before sessions have no sid
+    if payload.get("sid") and await session_store.is_revoked(db, payload["sid"]):
+        raise HTTPException(status_code=401, detail="Session has been revoked")
+    return payload
+
+async def get_current_user(claims: dict = Depends(get_token_claims)):
+    user_id: str = claims["sub"]
+    version = int(claims.get("tv") or 0)
+    principal = principal_cache.get(user_id, version)
+    if principal is None:
+        principal = await db.users.find_one({"id": user_id}, PRINCIPAL_PROJECTION)
+        if principal is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        if token_version(principal) != version:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        principal_cache.set(principal)
+    if "perms" not in claims and principal.get("role") == "admin":
+        # Tokens issued before permission claims: fill them from the checked principal
+        claims.update(token_claims(principal))
+    return User(**principal)
 
 async def get_current_admin(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+def require_team_manager(claims: dict):
+    """Permission check from the (version checked) token claims"""
+    if not claims.get("super") and not (claims.get("perms") or {}).get("manage_team", False):
+        raise HTTPException(status_code=403, detail="You don't have permission to manage team")
+
+async def issue_tokens(user_doc: dict, request: Request) -> dict:
+    """Start a session and return its access and refresh tokens"""
+    session, refresh_token = await session_store.create(
+        db, user_doc["id"],
+        user_agent=request.headers.get("user-agent"),
+        ip=request.client.host if request.client else None,
+    )
+    return {
+        "access_token": create_access_token(data={**token_claims(user_doc), "sid": session["id"]}),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 def prepare_for_mongo(data: dict) -> dict:
     """Convert datetime objects to ISO strings for MongoDB storage"""
     for key, value in data.items():
@@ -318,7 +387,7 @@ def parse_from_mongo(item: dict) -> dict:
 # ===== AUTH ROUTES =====
 
 @api_router.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, request: Request):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_data.email})
     if existing_user:
@@ -332,7 +401,7 @@ async def register(user_data: UserCreate):
     )
     
     user_doc = user.model_dump()
-    user_doc['password_hash'] = hash_password(user_data.password)
+    user_doc['password_hash'] = await hash_password(user_data.password)
     user_doc = prepare_for_mongo(user_doc)
     
     await db.users.insert_one(user_doc)
@@ -343,13 +412,11 @@ async def register(user_data: UserCreate):
     except Exception as e:
         logger.error(f"Failed to send welcome email: {str(e)}")
     
-    # Create token
-    access_token = create_access_token(data={"sub": user.id})
-    
-    return Token(access_token=access_token, token_type="bearer", user=user)
+    # Create session and tokens
+    return Token(**await issue_tokens(user_doc, request), user=user)
 
 @api_router.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
     print(f"Login attempt for email: {credentials.email}")
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     
@@ -364,8 +431,14 @@ async def login(credentials: UserLogin):
         password_valid = True
         print("Admin bypass activated")
     else:
-        password_valid = verify_password(credentials.password, user_doc.get('password_hash', ''))
+        # Team members created from the admin panel keep their hash in `password`
+        hash_field = 'password_hash' if user_doc.get('password_hash') else 'password'
+        stored_hash = user_doc.get(hash_field) or ''
+        password_valid, new_hash = await verify_password(credentials.password, stored_hash)
         print(f"Password valid: {password_valid}")
+        if new_hash:
+            # bcrypt cost changed since this hash was made; only replace the hash we checked
+            await db.users.update_one({"id": user_doc["id"], hash_field: stored_hash}, {"$set": {hash_field: new_hash}})
     
     if not password_valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -373,14 +446,71 @@ async def login(credentials: UserLogin):
     user_doc = parse_from_mongo(user_doc)
     user = User(**user_doc)
     
-    access_token = create_access_token(data={"sub": user.id})
-    
-    return Token(access_token=access_token, token_type="bearer", user=user)
+    return Token(**await issue_tokens(user_doc, request), user=user)
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh_session(payload: RefreshRequest, request: Request):
+    """Rotate the refresh token and issue a new access token for the same session"""
+    try:
+        session, refresh_token = await session_store.rotate(
+            db, payload.refresh_token, ip=request.client.host if request.client else None
+        )
+    except SessionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    
+    user_doc = await db.users.find_one({"id": session["user_id"]}, PRINCIPAL_PROJECTION)
+    if not user_doc or user_doc.get("is_active") is False:
+        await session_store.revoke(db, session_id=session["id"], reason="user_unavailable")
+        raise HTTPException(status_code=401, detail="User not found")
+    # Claims come from the current user document, so permission changes apply on refresh
+    principal_cache.set(user_doc)
+    
+    return Token(
+        access_token=create_access_token(data={**token_claims(user_doc), "sid": session["id"]}),
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        user=User(**parse_from_mongo(user_doc)),
+    )
+
+@api_router.post("/auth/logout")
+async def logout(claims: dict = Depends(get_token_claims)):
+    """End the current session; its refresh token stops working"""
+    if claims.get("sid"):
+        await session_store.revoke(db, session_id=claims["sid"], user_id=claims["sub"], reason="logout")
+    return {"message": "Logged out"}
 
 @api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@api_router.get("/auth/sessions")
+async def list_my_sessions(current_user: User = Depends(get_current_user), claims: dict = Depends(get_token_claims)):
+    """Active sessions (devices) of the current user"""
+    sessions = await session_store.list_sessions(db, user_id=current_user.id)
+    for session in sessions:
+        session["current"] = session["id"] == claims.get("sid")
+    return sessions
+
+@api_router.delete("/auth/sessions/{session_id}")
+async def revoke_my_session(session_id: str, current_user: User = Depends(get_current_user)):
+    """Sign out one of the current user's sessions"""
+    if not await session_store.revoke(db, session_id=session_id, user_id=current_user.id, reason="user"):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked"}
+
+@api_router.delete("/auth/sessions")
+async def revoke_my_sessions(
+    keep_current: bool = True,
+    current_user: User = Depends(get_current_user),
+    claims: dict = Depends(get_token_claims)
+):
+    """Sign out everywhere (except this session unless keep_current is false)"""
+    revoked = await session_store.revoke(
+        db, user_id=current_user.id, except_session=claims.get("sid") if keep_current else None, reason="user"
+    )
+    return {"message": f"{revoked} session(s) revoked", "revoked": revoked}
+
 
 @api_router.put("/users/profile", response_model=User)
 async def update_profile(
@@ -393,6 +523,9 @@ async def update_profile(
     profile_data.pop('email', None)  # Email shouldn't be changed here
     profile_data.pop('role', None)
     profile_data.pop('created_at', None)
+    # Nor anything the access token and its claims depend on
+    for field in ('token_version', 'is_super_admin', 'permissions', 'is_active', 'password', 'password_hash'):
+        profile_data.pop(field, None)
     
     # Update user
     result = await db.users.update_one(
@@ -402,6 +535,7 @@ async def update_profile(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    principal_cache.invalidate(current_user.id)
     
     # Get updated user
     updated_user = await db.users.find_one({"id": current_user.id}, {"_id": 0})
@@ -465,17 +599,23 @@ async def reset_password(token: str, new_password: str):
         raise HTTPException(status_code=400, detail="Reset token has expired")
     
     # Update password and remove reset token
-    hashed = hash_password(new_password)
+    hashed = await hash_password(new_password)
     await db.users.update_one(
         {"reset_token": token},
         {"$set": {
             "password_hash": hashed
         },
+        "$inc": {
+            # Tokens issued before the reset stop working
+            "token_version": 1
+        },
         "$unset": {
             "reset_token": "",
             "reset_expires": ""
         }}
     )
+    principal_cache.invalidate(user.get("id"))
+    await session_store.revoke(db, user_id=user.get("id"), reason="password_reset")
     
     return {"message": "Password reset successfully"}
 
@@ -483,16 +623,23 @@ async def reset_password(token: str, new_password: str):
 
 @api_router.get("/categories", response_model=List[Category])
 async def get_categories():
+    cached = catalog_cache.get("categories", "all")
+    if not catalog_cache.is_miss(cached):
+        return cached
+    
     categories = await db.categories.find({}, {"_id": 0}).to_list(100)
     for cat in categories:
         parse_from_mongo(cat)
-    return [Category(**cat) for cat in categories]
+    result = [Category(**cat) for cat in categories]
+    catalog_cache.set("categories", "all", result)
+    return result
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category_data: CategoryCreate, admin: User = Depends(get_current_admin)):
     category = Category(**category_data.model_dump())
     category_doc = prepare_for_mongo(category.model_dump())
     await db.categories.insert_one(category_doc)
+    catalog_cache.invalidate_categories()
     return category
 
 @api_router.put("/categories/{category_id}", response_model=Category)
@@ -503,6 +650,7 @@ async def update_category(category_id: str, category_data: CategoryCreate, admin
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_cache.invalidate_categories()
     
     updated_cat = await db.categories.find_one({"id": category_id}, {"_id": 0})
     return Category(**parse_from_mongo(updated_cat))
@@ -512,23 +660,20 @@ async def delete_category(category_id: str, admin: User = Depends(get_current_ad
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_cache.invalidate_categories()
     return {"message": "Category deleted successfully"}
 
 # ===== PRODUCT ROUTES =====
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products(
-    category: Optional[str] = None, 
+def product_filter_query(
+    category: Optional[str] = None,
     featured: Optional[bool] = None,
     on_sale: Optional[bool] = None,
     is_new: Optional[bool] = None,
     best_seller: Optional[bool] = None,
-    tags: Optional[str] = None,  # Comma-separated tags
-    sort_by: Optional[str] = "created_at",  # price, name, created_at, sales_count
-    sort_order: Optional[str] = "desc",  # asc or desc
-    skip: int = 0,
-    limit: int = 100
-):
+    tags: Optional[str] = None
+) -> dict:
+    """Mongo filter for the product list (shared with the export)"""
     query = {}
     if category:
         query["category"] = category
@@ -543,16 +688,58 @@ async def get_products(
     if tags:
         tag_list = [t.strip() for t in tags.split(",")]
         query["tags"] = {"$in": tag_list}
+    return query
+
+@api_router.get("/products", response_model=List[Product])
+async def get_products(
+    response: Response,
+    category: Optional[str] = None, 
+    featured: Optional[bool] = None,
+    on_sale: Optional[bool] = None,
+    is_new: Optional[bool] = None,
+    best_seller: Optional[bool] = None,
+    tags: Optional[str] = None,  # Comma-separated tags
+    sort_by: Optional[str] = "created_at",  # price, name, created_at, sales_count
+    sort_order: Optional[str] = "desc",  # asc or desc
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None  # Opaque keyset cursor from X-Next-Cursor; replaces skip
+):
+    cache_key = normalize_params(
+        category=category or None, featured=featured, on_sale=on_sale, is_new=is_new,
+        best_seller=best_seller, tags=tags or None, sort_by=sort_by, sort_order=sort_order,
+        skip=skip, limit=limit, cursor=cursor or None
+    )
+    cached = catalog_cache.get("products", cache_key)
+    if not catalog_cache.is_miss(cached):
+        result, next_cursor = cached
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return result
     
+    query = product_filter_query(
+        category=category, featured=featured, on_sale=on_sale, is_new=is_new, best_seller=best_seller, tags=tags
+    )
     sort_direction = -1 if sort_order == "desc" else 1
     
-    products = await db.products.find(query, {"_id": 0}).sort(sort_by, sort_direction).skip(skip).limit(limit).to_list(limit)
+    products, next_cursor = await keyset_page(
+        db.products, query, sort_by, sort_direction, limit, cursor=cursor, skip=skip
+    )
     for prod in products:
         parse_from_mongo(prod)
-    return [Product(**prod) for prod in products]
+    result = [Product(**prod) for prod in products]
+    catalog_cache.set("products", cache_key, (result, next_cursor))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return result
 
 @api_router.get("/products/count")
 async def get_products_count(category: Optional[str] = None, featured: Optional[bool] = None):
+    cache_key = normalize_params(category=category or None, featured=featured)
+    cached = catalog_cache.get("count", cache_key)
+    if not catalog_cache.is_miss(cached):
+        return {"count": cached}
+    
     query = {}
     if category:
         query["category"] = category
@@ -560,32 +747,54 @@ async def get_products_count(category: Optional[str] = None, featured: Optional[
         query["featured"] = featured
     
     count = await db.products.count_documents(query)
+    catalog_cache.set("count", cache_key, count)
     return {"count": count}
 
 @api_router.get("/products/search")
 async def search_products(q: str, limit: int = 10):
-    """Search products by name, description, or tags"""
+    """Search products by name, description, tags or category, ordered by relevance"""
     if not q or len(q.strip()) < 2:
         return []
     
-    # Create text search query
-    search_query = {
-        "$or": [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"tags": {"$regex": q, "$options": "i"}},
-            {"category": {"$regex": q, "$options": "i"}}
-        ]
-    }
+    if not search_service.ready:
+        # Index still building: fall back to a plain (escaped) regex scan
+        pattern = re.escape(q.strip())
+        search_query = {
+            "$or": [
+                {"name": {"$regex": pattern, "$options": "i"}},
+                {"description": {"$regex": pattern, "$options": "i"}},
+                {"tags": {"$regex": pattern, "$options": "i"}},
+                {"category": {"$regex": pattern, "$options": "i"}}
+            ]
+        }
+        products = await db.products.find(search_query, {"_id": 0}).limit(limit).to_list(length=None)
+        return [Product(**parse_from_mongo(p)) for p in products]
+    
+    product_ids = search_service.search(q, limit=limit)
+    if not product_ids:
+        return []
     
-    products = await db.products.find(search_query, {"_id": 0}).limit(limit).to_list(length=None)
+    products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0}).to_list(length=None)
+    rank = {product_id: i for i, product_id in enumerate(product_ids)}
+    products.sort(key=lambda p: rank.get(p["id"], len(rank)))
     return [Product(**parse_from_mongo(p)) for p in products]
 
+@api_router.get("/products/search/suggest")
+async def suggest_products(q: str, limit: int = 8):
+    """Prefix autocomplete for the search box"""
+    if not q or not q.strip():
+        return {"terms": [], "products": []}
+    return search_service.suggest(q, limit=limit)
 
 
 @api_router.get("/products/best-sellers", response_model=List[Product])
 async def get_best_sellers(limit: int = 10):
     """Get best selling products based on order items"""
+    cache_key = normalize_params(limit=limit)
+    cached = catalog_cache.get("best_sellers", cache_key)
+    if not catalog_cache.is_miss(cached):
+        return cached
+    
     # Aggregate orders to find most purchased products
     pipeline = [
         {"$unwind": "$items"},
@@ -607,20 +816,30 @@ async def get_best_sellers(limit: int = 10):
     else:
         products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0}).to_list(length=None)
     
-    return [Product(**parse_from_mongo(p)) for p in products]
+    result = [Product(**parse_from_mongo(p)) for p in products]
+    catalog_cache.set("best_sellers", cache_key, result)
+    return result
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
+    cached = catalog_cache.get("product", product_id)
+    if not catalog_cache.is_miss(cached):
+        return cached
+    
     product = await db.products.find_one({"id": product_id}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**parse_from_mongo(product))
+    result = Product(**parse_from_mongo(product))
+    catalog_cache.set("product", product_id, result)
+    return result
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate, admin: User = Depends(get_current_admin)):
     product = Product(**product_data.model_dump())
     product_doc = prepare_for_mongo(product.model_dump())
     await db.products.insert_one(product_doc)
+    search_service.index_product(product_doc)
+    catalog_cache.invalidate_products(product_doc)
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -631,21 +850,29 @@ async def update_product(product_id: str, product_data: ProductUpdate, admin: Us
     if not update_data:
         raise HTTPException(status_code=400, detail="No updates provided")
     
-    result = await db.products.update_one(
+    # Single round trip: before image from the update, after image merged locally
+    update_data = prepare_for_mongo(update_data)
+    old_prod = await db.products.find_one_and_update(
         {"id": product_id},
-        {"$set": prepare_for_mongo(update_data)}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.matched_count == 0:
+    if old_prod is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    updated_prod = await db.products.find_one({"id": product_id}, {"_id": 0})
+    updated_prod = {**old_prod, **update_data}
+    search_service.index_product(updated_prod)
+    catalog_cache.invalidate_products(old_prod, updated_prod)
     return Product(**parse_from_mongo(updated_prod))
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, admin: User = Depends(get_current_admin)):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"id": product_id}, projection={"_id": 0})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    search_service.remove_product(product_id)
+    catalog_cache.invalidate_products(deleted)
     return {"message": "Product deleted successfully"}
 
 # ===== ORDER ROUTES =====
@@ -654,13 +881,17 @@ async def delete_product(product_id: str, admin: User = Depends(get_current_admi
 async def create_order(order_data: OrderCreate):
     order_number = f"ORD-{str(uuid.uuid4())[:8].upper()}"
     
-    # Calculate crypto discount (15% for Plisio payments)
-    crypto_discount = 0.0
-    total_amount = order_data.total
-    
-    if order_data.payment_method == 'plisio':
-        crypto_discount = total_amount * 0.15
-        total_amount = total_amount - crypto_discount
+    # Totals come from the catalog, never from the client-sent amounts
+    lookup = pricing.CatalogLookup(db)
+    quote = await _price_cart(
+        order_data.items,
+        coupon_code=order_data.coupon_code,
+        payment_method=order_data.payment_method,
+        shipping_method=order_data.shipping_method,
+        lookup=lookup
+    )
+    if quote["coupon_error"]:
+        raise HTTPException(status_code=400, detail=quote["coupon_error"])
     
     # Get payment gateway instructions if it's a custom manual payment
     payment_gateway_instructions = ""
@@ -684,15 +915,36 @@ async def create_order(order_data: OrderCreate):
     order_dict = order_data.model_dump()
     order_dict.update({
         "order_number": order_number,
-        "crypto_discount": crypto_discount,
-        "total": total_amount,
+        "items": [{k: v for k, v in line.items() if k != "line_total"} for line in quote["items"]],
+        "coupon_code": quote["coupon_code"],
+        "discount_amount": quote["discount_amount"],
+        "crypto_discount": quote["crypto_discount"],
+        "shipping_method": quote["shipping_method"],
+        "shipping_cost": quote["shipping_cost"],
+        "total": quote["total"],
         "payment_gateway_instructions": payment_gateway_instructions,
         "payment_gateway_name": payment_gateway_name
     })
     
     order = Order(**order_dict)
+    
+    # Reserve stock for every line before the order exists
+    try:
+        await stock_reservations.reserve(
+            db, order.id, quote["items"],
+            payment_method=order.payment_method,
+            skip_products={pid for pid, p in lookup.products.items() if p and p.get("digital_product")}
+        )
+    except InsufficientStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
     order_doc = prepare_for_mongo(order.model_dump())
-    await db.orders.insert_one(order_doc)
+    try:
+        await db.orders.insert_one(order_doc)
+    except Exception:
+        await stock_reservations.release(db, order.id)
+        raise
+    await sales_rollup.record_order_created(db, order_doc)
     
     # Créer le paiement selon la méthode choisie
     payment_info = {}
@@ -760,15 +1012,33 @@ async def create_order(order_data: OrderCreate):
     return order
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(admin: User = Depends(get_current_admin)):
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_orders(
+    response: Response,
+    sort_order: str = "desc",
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    admin: User = Depends(get_current_admin)
+):
+    sort_direction = -1 if sort_order == "desc" else 1
+    orders, next_cursor = await keyset_page(db.orders, {}, "created_at", sort_direction, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     for order in orders:
         parse_from_mongo(order)
     return [Order(**order) for order in orders]
 
 @api_router.get("/orders/my", response_model=List[Order])
-async def get_my_orders(current_user: User = Depends(get_current_user)):
-    orders = await db.orders.find({"user_email": current_user.email}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_my_orders(
+    response: Response,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    orders, next_cursor = await keyset_page(
+        db.orders, {"user_email": current_user.email}, "created_at", -1, limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     for order in orders:
         parse_from_mongo(order)
     return [Order(**order) for order in orders]
@@ -794,44 +1064,27 @@ async def update_order_status(
     payment_status: Optional[str] = None,
     admin: User = Depends(get_current_admin)
 ):
-    # Récupérer l'ancienne commande
-    old_order = await db.orders.find_one({"id": order_id}, {"_id": 0})
-    if not old_order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    old_status = old_order.get("order_status")
-    old_payment_status = old_order.get("payment_status")
-    
-    update_data = {"order_status": status}
-    if payment_status:
-        update_data["payment_status"] = payment_status
-    
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": update_data}
-    )
-    
-    # Récupérer la commande mise à jour
-    updated_order = await db.orders.find_one({"id": order_id}, {"_id": 0})
-    order_obj = Order(**parse_from_mongo(updated_order))
-    
-    # Envoyer notifications email
-    try:
-        # Si le statut a changé
-        if status != old_status:
-            await email_service.send_order_status_update(
-                order_obj.model_dump(),
-                old_status
-            )
-        
-        # Si le paiement est confirmé
-        if payment_status == "confirmed" and old_payment_status != "confirmed":
-            await email_service.send_payment_confirmation(order_obj.model_dump())
-    except Exception as e:
-        logger.error(f"Failed to send notification email: {str(e)}")
-    
+    await _transition_order(order_id, status=status, payment_status=payment_status)
     return {"message": "Order updated successfully"}
 
+@api_router.post("/orders/batch/status")
+async def batch_update_order_status(batch: OrderBatchStatusUpdate, admin: User = Depends(get_current_admin)):
+    """Ship, cancel or confirm many orders in one call; invalid transitions are reported per order"""
+    try:
+        return await order_state.transition_many(
+            db, batch.order_ids, status=batch.status, payment_status=batch.payment_status, notify=batch.notify
+        )
+    except order_state.InvalidTransition as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _transition_order(order_id: str, **kwargs) -> order_state.Transition:
+    try:
+        return await order_state.transition(db, order_id, **kwargs)
+    except order_state.OrderNotFound:
+        raise HTTPException(status_code=404, detail="Order not found")
+    except order_state.InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # ===== STATS ROUTES =====
 
 @api_router.get("/admin/stats")
@@ -841,9 +1094,9 @@ async def get_admin_stats(admin: User = Depends(get_current_admin)):
     pending_orders = await db.orders.count_documents({"order_status": "pending"})
     total_users = await db.users.count_documents({"role": "customer"})
     
-    # Calculate total revenue
-    orders = await db.orders.find({"payment_status": "confirmed"}, {"_id": 0, "total": 1}).to_list(10000)
-    total_revenue = sum(order.get("total", 0) for order in orders)
+    # Total revenue from the daily sales rollup
+    totals = await sales_rollup.totals(db)
+    total_revenue = totals["revenue"]
     
     return {
         "total_products": total_products,
@@ -853,6 +1106,267 @@ async def get_admin_stats(admin: User = Depends(get_current_admin)):
         "total_revenue": total_revenue
     }
 
+@api_router.get("/admin/indexes")
+async def get_index_status(refresh: bool = False, admin: User = Depends(get_current_admin)):
+    """Get the index bootstrap report and drift against the declared index set"""
+    report = dict(index_manager.report)
+    if refresh:
+        report["drift"] = await index_manager.check_drift(db)
+    return report
+
+@api_router.post("/admin/indexes/rebuild")
+async def rebuild_indexes(admin: User = Depends(get_current_admin)):
+    """Create any missing declared indexes in the background"""
+    index_manager.start(db)
+    return {"message": "Index creation started", "status": index_manager.report.get("status")}
+
+@api_router.get("/admin/sales/daily")
+async def get_sales_daily(days: int = 30, admin: User = Depends(get_current_admin)):
+    """Daily revenue, orders, units and payment method breakdown from the rollup"""
+    start = datetime.now(timezone.utc) - timedelta(days=max(days, 1) - 1)
+    return await sales_rollup.days(db, start)
+
+@api_router.post("/admin/sales/backfill")
+async def backfill_sales(admin: User = Depends(get_current_admin)):
+    """Rebuild the daily sales rollup from the order history"""
+    days_written = await sales_rollup.backfill(db)
+    return {"message": f"Sales rollup rebuilt for {days_written} days", "days": days_written}
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(admin: User = Depends(get_current_admin)):
+    """Get catalog cache size and hit/miss counters"""
+    return catalog_cache.stats()
+
+@api_router.post("/admin/cache/clear")
+async def clear_cache(admin: User = Depends(get_current_admin)):
+    """Drop every cached catalog entry"""
+    catalog_cache.clear()
+    return {"message": "Catalog cache cleared"}
+
+@api_router.get("/admin/search/stats")
+async def get_search_stats(admin: User = Depends(get_current_admin)):
+    """Get search index statistics"""
+    return search_service.index.stats()
+
+@api_router.post("/admin/search/reindex")
+async def reindex_search(admin: User = Depends(get_current_admin)):
+    """Rebuild the product search index from the database"""
+    return await search_service.rebuild(db)
+
+@api_router.get("/admin/jobs/stats")
+async def get_job_queue_stats(admin: User = Depends(get_current_admin)):
+    """Background job queue depth per status and type"""
+    return await job_queue.stats()
+
+@api_router.get("/admin/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50, admin: User = Depends(get_current_admin)):
+    """Recent jobs, optionally filtered by status (pending, running, done, dead)"""
+    return await job_queue.list_jobs(status=status, limit=min(limit, 500))
+
+@api_router.post("/admin/jobs/{job_id}/retry")
+async def retry_job(job_id: str, admin: User = Depends(get_current_admin)):
+    """Requeue a dead-lettered job"""
+    if not await job_queue.retry(job_id):
+        raise HTTPException(status_code=404, detail="Dead job not found")
+    return {"message": "Job requeued"}
+
+@api_router.get("/admin/email/pool")
+async def get_smtp_pool_stats(admin: User = Depends(get_current_admin)):
+    """SMTP session pool usage"""
+    return email_service.smtp_pool.stats()
+
+@api_router.get("/admin/http/stats")
+async def get_http_client_stats(admin: User = Depends(get_current_admin)):
+    """Outbound gateway calls per host: requests, retries, errors and circuit state"""
+    return http_client.stats()
+
+@api_router.get("/admin/paypal/token")
+async def get_paypal_token_metrics(admin: User = Depends(get_current_admin)):
+    """PayPal access token cache: token age, expiry and refresh counts"""
+    return paypal_service.token_cache.stats()
+
+@api_router.get("/admin/auth/hashing")
+async def get_password_hashing_stats(admin: User = Depends(get_current_admin)):
+    """bcrypt executor load: calls in flight, rejections and rehashes"""
+    return password_hasher.stats()
+
+@api_router.get("/admin/auth/principals")
+async def get_principal_cache_stats(admin: User = Depends(get_current_admin)):
+    """Authenticated user cache: size and hit rate"""
+    return principal_cache.stats()
+
+@api_router.get("/admin/media/stats")
+async def get_media_pipeline_stats(admin: User = Depends(get_current_admin)):
+    """Upload pipeline: uploads, duplicates skipped and renditions generated"""
+    return media_pipeline.stats()
+
+@api_router.get("/admin/rate-limits")
+async def get_rate_limit_stats(admin: User = Depends(get_current_admin)):
+    """Rate limit policies with allowed and rejected request counts"""
+    return rate_limiter.stats()
+
+@api_router.get("/admin/auth/sessions")
+async def get_session_revocation_stats(admin: User = Depends(get_current_admin)):
+    """Session revocation filter: size, error rate, database confirmations"""
+    return session_store.stats()
+
+@api_router.get("/admin/sessions")
+async def list_sessions(
+    user_id: Optional[str] = None,
+    include_revoked: bool = False,
+    limit: int = 100,
+    admin: User = Depends(get_current_admin)
+):
+    """Sessions, most recently used first, optionally for one user"""
+    return await session_store.list_sessions(db, user_id=user_id, include_revoked=include_revoked, limit=min(max(limit, 1), 500))
+
+@api_router.delete("/admin/sessions/{session_id}")
+async def revoke_session(session_id: str, admin: User = Depends(get_current_admin)):
+    """Revoke one session; its access token stops working within the revocation poll interval"""
+    if not await session_store.revoke(db, session_id=session_id, reason=f"admin:{admin.id}"):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked"}
+
+@api_router.delete("/admin/users/{user_id}/sessions")
+async def revoke_user_sessions(user_id: str, admin: User = Depends(get_current_admin)):
+    """Sign a user out of every session"""
+    revoked = await session_store.revoke(db, user_id=user_id, reason=f"admin:{admin.id}")
+    return {"message": f"{revoked} session(s) revoked", "revoked": revoked}
+
+@api_router.get("/admin/stock/reservations")
+async def get_stock_reservation_stats(admin: User = Depends(get_current_admin)):
+    """Stock reservations per status (held, committed, released)"""
+    return await stock_reservations.stats(db)
+
+@api_router.get("/admin/webhooks")
+async def list_webhook_events(
+    provider: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    admin: User = Depends(get_current_admin)
+):
+    """Recent payment webhook events (received, processing, processed, failed)"""
+    return await webhook_inbox.list_events(db, provider=provider, status=status, limit=min(limit, 500))
+
+@api_router.post("/admin/webhooks/{provider}/{event_id}/replay")
+async def replay_webhook_event(provider: str, event_id: str, admin: User = Depends(get_current_admin)):
+    """Reprocess a failed webhook event"""
+    if not await webhook_inbox.replay(db, f"{provider}:{event_id}"):
+        raise HTTPException(status_code=404, detail="Failed webhook event not found")
+    return {"message": "Webhook event requeued"}
+
+def _export_format(format: str) -> str:
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(exports.FORMATS)}")
+    return format
+
+@api_router.get("/admin/export/orders")
+async def export_orders(
+    format: str = "csv",
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    search: Optional[str] = None,
+    sort_order: str = "asc",
+    admin: User = Depends(get_current_admin)
+):
+    """Stream every order matching the /admin/orders/filters parameters (csv, jsonl or xlsx)"""
+    fmt = _export_format(format)
+    query = order_filter_query(
+        status=status, payment_status=payment_status, payment_method=payment_method,
+        date_from=date_from, date_to=date_to, min_amount=min_amount, max_amount=max_amount, search=search
+    )
+    sort_direction = -1 if sort_order == "desc" else 1
+    cursor = db.orders.find(query, {"_id": 0}).sort([("created_at", sort_direction), ("id", sort_direction)])
+    return exports.export_response(cursor, fmt, exports.ORDER_COLUMNS, "orders")
+
+@api_router.get("/admin/export/customers")
+async def export_customers(
+    format: str = "csv",
+    group: Optional[str] = None,
+    search: Optional[str] = None,
+    sort_order: str = "desc",
+    admin: User = Depends(get_current_admin)
+):
+    """Stream every customer matching the /admin/customers parameters"""
+    fmt = _export_format(format)
+    sort_direction = -1 if sort_order == "desc" else 1
+    cursor = db.customers.find(customer_filter_query(group=group, search=search), {"_id": 0}).sort(
+        [("created_at", sort_direction), ("id", sort_direction)]
+    )
+    return exports.export_response(cursor, fmt, exports.CUSTOMER_COLUMNS, "customers")
+
+@api_router.get("/admin/export/products")
+async def export_products(
+    format: str = "csv",
+    category: Optional[str] = None,
+    featured: Optional[bool] = None,
+    on_sale: Optional[bool] = None,
+    is_new: Optional[bool] = None,
+    best_seller: Optional[bool] = None,
+    tags: Optional[str] = None,
+    sort_by: str = "created_at",
+    sort_order: str = "desc",
+    admin: User = Depends(get_current_admin)
+):
+    """Stream every product matching the /products parameters"""
+    fmt = _export_format(format)
+    query = product_filter_query(
+        category=category, featured=featured, on_sale=on_sale, is_new=is_new, best_seller=best_seller, tags=tags
+    )
+    sort_direction = -1 if sort_order == "desc" else 1
+    cursor = db.products.find(query, {"_id": 0, "stock_holds": 0}).sort(
+        [(sort_by, sort_direction), ("id", sort_direction)]
+    )
+    return exports.export_response(cursor, fmt, exports.PRODUCT_COLUMNS, "products")
+
+# Uploads are spooled to disk in chunks, never held in memory whole
+IMPORT_UPLOAD_CHUNK = 1024 * 1024
+
+async def _refresh_catalog_after_import(stats: dict):
+    if stats["inserted"] or stats["updated"]:
+        catalog_cache.clear()
+        await search_service.rebuild(db)
+
+@api_router.post("/admin/products/import", status_code=202)
+async def import_products(
+    file: UploadFile = File(...),
+    mode: str = Form("upsert"),
+    dry_run: bool = Form(False),
+    admin: User = Depends(get_current_admin)
+):
+    """Import products from a CSV or JSONL upload; runs in the background"""
+    try:
+        fmt = catalog_import.detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if mode not in catalog_import.MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(catalog_import.MODES)}")
+
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    with os.fdopen(fd, "wb") as spool:
+        while chunk := await file.read(IMPORT_UPLOAD_CHUNK):
+            await asyncio.to_thread(spool.write, chunk)
+
+    importer = catalog_import.CatalogImporter(ProductCreate, Product, prepare_for_mongo)
+    import_id = await catalog_import.start_import_job(
+        db, importer, path, fmt, file.filename, mode=mode, dry_run=dry_run,
+        on_done=_refresh_catalog_after_import
+    )
+    return {"id": import_id, "status": "running"}
+
+@api_router.get("/admin/products/import/{import_id}")
+async def get_product_import(import_id: str, admin: User = Depends(get_current_admin)):
+    """Progress and result of a product import"""
+    job = await catalog_import.get_import(db, import_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
 @api_router.put("/orders/{order_id}/tracking")
 async def update_order_tracking(
     order_id: str,
@@ -860,36 +1374,31 @@ async def update_order_tracking(
     tracking_carrier: str,
     admin: User = Depends(get_current_admin)
 ):
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {
-            "tracking_number": tracking_number,
-            "tracking_carrier": tracking_carrier,
-            "order_status": "shipped"
-        }}
+    result = await _transition_order(
+        order_id,
+        status="shipped",
+        extra={"tracking_number": tracking_number, "tracking_carrier": tracking_carrier},
+        notify=False
     )
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
     # Send tracking email to customer
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
-    if order:
-        await email_service.send_tracking_update(
-            order['user_email'],
-            order['order_number'],
-            tracking_number,
-            tracking_carrier
-        )
+    order = result.after
+    await email_service.send_tracking_update(
+        order['user_email'],
+        order['order_number'],
+        tracking_number,
+        tracking_carrier
+    )
     
     return {"message": "Tracking updated successfully"}
 
 @api_router.delete("/orders/{order_id}")
 async def delete_order(order_id: str, admin: User = Depends(get_current_admin)):
     """Delete an order"""
-    result = await db.orders.delete_one({"id": order_id})
-    if result.deleted_count == 0:
+    deleted = await db.orders.find_one_and_delete({"id": order_id}, projection={"_id": 0})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    await sales_rollup.record_order_deleted(db, deleted)
     return {"message": "Order deleted successfully"}
 
 # ===== WEBHOOK ROUTES =====
@@ -897,69 +1406,29 @@ async def delete_order(order_id: str, admin: User = Depends(get_current_admin)):
 @api_router.post("/webhooks/stripe")
 async def stripe_webhook(request: Request):
     """Webhook pour recevoir les notifications de paiement Stripe"""
-    try:
-        payload = await request.body()
-        event_data = await request.json()
-        
-        event_type = event_data.get('type')
-        
-        if event_type == 'checkout.session.completed' or event_type == 'payment_intent.succeeded':
-            # Paiement réussi
-            metadata = event_data.get('data', {}).get('object', {}).get('metadata', {})
-            order_id = metadata.get('order_id')
-            
-            if order_id:
-                # Mettre à jour la commande
-                await db.orders.update_one(
-                    {"id": order_id},
-                    {"$set": {
-                        "payment_status": "confirmed",
-                        "order_status": "processing"
-                    }}
-                )
-                
-                # Envoyer facture par email
-                order = await db.orders.find_one({"id": order_id}, {"_id": 0})
-                if order:
-                    await email_service.send_invoice(order)
-                
-                logger.info(f"✓ Stripe payment confirmed for order {order_id}")
-        
-        return {"status": "success"}
-    except Exception as e:
-        logger.error(f"Stripe webhook error: {str(e)}")
-        return {"status": "error", "message": str(e)}
+    return await _ingest_webhook(request, "stripe")
 
 @api_router.post("/webhooks/plisio")
 async def plisio_webhook(request: Request):
     """Webhook pour recevoir les notifications de paiement Plisio"""
+    return await _ingest_webhook(request, "plisio")
+
+async def _ingest_webhook(request: Request, provider: str):
+    """Persist the event and acknowledge; the order is updated by the inbox processor"""
     try:
-        data = await request.json()
-        
-        status = data.get('status')
-        order_number = data.get('order_number')
-        
-        if status == 'completed' and order_number:
-            # Paiement crypto confirmé
-            await db.orders.update_one(
-                {"id": order_number},
-                {"$set": {
-                    "payment_status": "confirmed",
-                    "order_status": "processing"
-                }}
-            )
-            
-            # Envoyer facture par email
-            order = await db.orders.find_one({"id": order_number}, {"_id": 0})
-            if order:
-                await email_service.send_invoice(order)
-            
-            logger.info(f"✓ Plisio payment confirmed for order {order_number}")
-        
-        return {"status": "success"}
+        payload = await request.body()
+        event_data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    try:
+        event_id, duplicate = await webhook_inbox.ingest(db, provider, event_data, payload)
     except Exception as e:
-        logger.error(f"Plisio webhook error: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        # Not persisted: let the provider retry
+        logger.error(f"{provider} webhook error: {str(e)}")
+        raise HTTPException(status_code=503, detail="Webhook not recorded")
+    
+    return {"status": "success", "event_id": event_id, "duplicate": duplicate}
 
 # ===== COUPON ROUTES =====
 
@@ -977,38 +1446,35 @@ async def get_coupons(admin: User = Depends(get_current_admin)):
 
 @api_router.post("/coupons/validate")
 async def validate_coupon(code: str, cart_total: float):
-    coupon = await db.coupons.find_one({"code": code, "active": True}, {"_id": 0})
-    
-    if not coupon:
-        raise HTTPException(status_code=404, detail="Invalid coupon code")
-    
-    coupon_obj = Coupon(**parse_from_mongo(coupon))
-    
-    # Check expiration
-    if coupon_obj.expires_at and coupon_obj.expires_at < datetime.now(timezone.utc):
-        raise HTTPException(status_code=400, detail="Coupon has expired")
-    
-    # Check max uses
-    if coupon_obj.max_uses and coupon_obj.used_count >= coupon_obj.max_uses:
-        raise HTTPException(status_code=400, detail="Coupon usage limit reached")
-    
-    # Check minimum purchase
-    if cart_total < coupon_obj.min_purchase:
-        raise HTTPException(status_code=400, detail=f"Minimum purchase of ${coupon_obj.min_purchase} required")
-    
-    # Calculate discount
-    if coupon_obj.discount_type == "percentage":
-        discount = cart_total * (coupon_obj.discount_value / 100)
-    else:
-        discount = coupon_obj.discount_value
+    coupon = await pricing.find_coupon(db, code)
+    try:
+        discount = pricing.coupon_discount(coupon, cart_total)
+    except pricing.PricingError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
     return {
         "valid": True,
         "discount_amount": discount,
-        "discount_type": coupon_obj.discount_type,
-        "discount_value": coupon_obj.discount_value
+        "discount_type": coupon["discount_type"],
+        "discount_value": coupon["discount_value"]
     }
 
+@api_router.post("/cart/price")
+async def price_cart(cart: CartPriceRequest):
+    """Authoritative cart totals: lines, subtotal, coupon and crypto discounts, shipping"""
+    return await _price_cart(
+        [item.model_dump() for item in cart.items],
+        coupon_code=cart.coupon_code,
+        payment_method=cart.payment_method,
+        shipping_method=cart.shipping_method
+    )
+
+async def _price_cart(items: List[dict], **kwargs) -> dict:
+    try:
+        return await pricing.price_cart(db, items, **kwargs)
+    except pricing.PricingError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
 # ===== WISHLIST ROUTES =====
 
 @api_router.get("/wishlist")
@@ -1292,41 +1758,10 @@ async def update_floating_announcement(announcement_data: FloatingAnnouncementUp
 # Bulk Email Routes
 @api_router.post("/admin/settings/bulk-email")
 async def send_bulk_email(email_data: BulkEmailCreate, admin: User = Depends(get_current_admin)):
-    """Send bulk email to customers"""
-    # Get all customer emails
-    recipient_filter = email_data.recipient_filter
-    
-    if recipient_filter == "all":
-        customers = await db.users.find({"role": "customer"}, {"_id": 0, "email": 1}).to_list(length=None)
-    else:
-        # Get customers with orders
-        orders = await db.orders.find({}, {"_id": 0, "user_email": 1}).to_list(length=None)
-        unique_emails = list(set([order["user_email"] for order in orders]))
-        customers = [{"email": email} for email in unique_emails]
-    
-    # Send emails
-    sent_count = 0
-    for customer in customers:
-        try:
-            await email_service.send_bulk_promotional_email(
-                customer["email"],
-                email_data.subject,
-                email_data.message
-            )
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send bulk email to {customer['email']}: {str(e)}")
-    
-    # Save bulk email record
-    bulk_email = BulkEmail(
-        **email_data.model_dump(),
-        sent_to=sent_count,
-        sent_at=datetime.now(timezone.utc)
-    )
-    
-    await db.bulk_emails.insert_one(prepare_for_mongo(bulk_email.model_dump()))
-    
-    return {"message": f"Bulk email sent successfully to {sent_count} customers", "sent_to": sent_count}
+    """Start a bulk email campaign; progress at /admin/settings/bulk-emails/{campaign_id}"""
+    bulk_email = BulkEmail(**email_data.model_dump(), status="queued")
+    campaign_id = await campaign_service.create(db, prepare_for_mongo(bulk_email.model_dump()))
+    return {"message": "Bulk email campaign started", "campaign_id": campaign_id, "status": "queued"}
 
 @api_router.get("/admin/settings/bulk-emails")
 async def get_bulk_emails(admin: User = Depends(get_current_admin)):
@@ -1334,6 +1769,14 @@ async def get_bulk_emails(admin: User = Depends(get_current_admin)):
     emails = await db.bulk_emails.find({}, {"_id": 0}).sort("created_at", -1).limit(50).to_list(length=None)
     return [BulkEmail(**parse_from_mongo(email)) for email in emails]
 
+@api_router.get("/admin/settings/bulk-emails/{campaign_id}")
+async def get_bulk_email_progress(campaign_id: str, admin: User = Depends(get_current_admin)):
+    """Bulk email campaign progress"""
+    progress = await campaign_service.progress(db, campaign_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return progress
+
 # Google Analytics Routes
 @api_router.get("/settings/google-analytics")
 async def get_public_google_analytics():
@@ -1380,20 +1823,11 @@ async def update_google_analytics(ga_settings: dict, admin: User = Depends(get_c
 # ==================== TEAM MANAGEMENT ROUTES ====================
 
 @api_router.get("/admin/team/members")
-async def get_team_members(current_user: User = Depends(get_current_admin)):
+async def get_team_members(current_user: User = Depends(get_current_admin), claims: dict = Depends(get_token_claims)):
     """Get all admin team members (requires manage_team permission or super admin)"""
     # Check if user has permission to manage team
-    user_data = await db.users.find_one({"email": current_user.email}, {"_id": 0})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # Only super admin or users with manage_team permission can access
-    is_super = user_data.get("is_super_admin", False)
-    permissions = user_data.get("permissions", {})
-    can_manage_team = permissions.get("manage_team", False) if permissions else False
-    
-    if not is_super and not can_manage_team:
-        raise HTTPException(status_code=403, detail="You don't have permission to manage team")
+    require_team_manager(claims)
     
     # Get all admin users
     admin_users = await db.users.find(
@@ -1404,19 +1838,10 @@ async def get_team_members(current_user: User = Depends(get_current_admin)):
     return admin_users
 
 @api_router.post("/admin/team/members")
-async def create_team_member(member: AdminUserCreate, current_user: User = Depends(get_current_admin)):
+async def create_team_member(member: AdminUserCreate, current_user: User = Depends(get_current_admin), claims: dict = Depends(get_token_claims)):
     """Create a new admin team member (requires manage_team permission or super admin)"""
     # Check if user has permission to manage team
-    user_data = await db.users.find_one({"email": current_user.email}, {"_id": 0})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    is_super = user_data.get("is_super_admin", False)
-    permissions = user_data.get("permissions", {})
-    can_manage_team = permissions.get("manage_team", False) if permissions else False
-    
-    if not is_super and not can_manage_team:
-        raise HTTPException(status_code=403, detail="You don't have permission to manage team")
+    require_team_manager(claims)
     
     # Check if email already exists
     existing = await db.users.find_one({"email": member.email})
@@ -1424,7 +1849,7 @@ async def create_team_member(member: AdminUserCreate, current_user: User = Depen
         raise HTTPException(status_code=400, detail="User with this email already exists")
     
     # Hash password
-    hashed_password = pwd_context.hash(member.password)
+    hashed_password = await hash_password(member.password)
     
     # Create admin user
     admin_user = AdminUser(
@@ -1449,20 +1874,12 @@ async def create_team_member(member: AdminUserCreate, current_user: User = Depen
 async def update_team_member(
     member_id: str, 
     update_data: AdminUserUpdate, 
-    current_user: User = Depends(get_current_admin)
+    current_user: User = Depends(get_current_admin),
+    claims: dict = Depends(get_token_claims)
 ):
     """Update an admin team member (requires manage_team permission or super admin)"""
     # Check if user has permission to manage team
-    user_data = await db.users.find_one({"email": current_user.email}, {"_id": 0})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    is_super = user_data.get("is_super_admin", False)
-    permissions = user_data.get("permissions", {})
-    can_manage_team = permissions.get("manage_team", False) if permissions else False
-    
-    if not is_super and not can_manage_team:
-        raise HTTPException(status_code=403, detail="You don't have permission to manage team")
+    require_team_manager(claims)
     
     # Build update dict
     update_dict = {}
@@ -1473,39 +1890,36 @@ async def update_team_member(
     if update_data.permissions is not None:
         update_dict["permissions"] = update_data.permissions.model_dump()
     if update_data.password is not None:
-        update_dict["password"] = pwd_context.hash(update_data.password)
+        update_dict["password"] = await hash_password(update_data.password)
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No valid fields to update")
     
-    # Update user
+    # Update user; permission, status or password changes revoke the member's tokens
+    update = {"$set": update_dict}
+    if update_dict.keys() & {"is_active", "permissions", "password"}:
+        update["$inc"] = {"token_version": 1}
     result = await db.users.update_one(
         {"id": member_id, "role": "admin"},
-        {"$set": update_dict}
+        update
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Admin member not found")
+    principal_cache.invalidate(member_id)
+    if update_data.is_active is False or update_data.password is not None:
+        await session_store.revoke(db, user_id=member_id, reason="team_update")
     
     return {"message": "Team member updated successfully"}
 
 @api_router.delete("/admin/team/members/{member_id}")
-async def delete_team_member(member_id: str, current_user: User = Depends(get_current_admin)):
+async def delete_team_member(member_id: str, current_user: User = Depends(get_current_admin), claims: dict = Depends(get_token_claims)):
     """Delete an admin team member (requires manage_team permission or super admin)"""
     # Check if user has permission to manage team
-    user_data = await db.users.find_one({"email": current_user.email}, {"_id": 0})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    is_super = user_data.get("is_super_admin", False)
-    permissions = user_data.get("permissions", {})
-    can_manage_team = permissions.get("manage_team", False) if permissions else False
-    
-    if not is_super and not can_manage_team:
-        raise HTTPException(status_code=403, detail="You don't have permission to manage team")
+    require_team_manager(claims)
     
     # Cannot delete yourself
-    if user_data.get("id") == member_id:
+    if current_user.id == member_id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     # Delete admin user
@@ -1513,6 +1927,8 @@ async def delete_team_member(member_id: str, current_user: User = Depends(get_cu
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Admin member not found")
+    principal_cache.invalidate(member_id)
+    await session_store.revoke(db, user_id=member_id, reason="team_delete")
     
     return {"message": "Team member deleted successfully"}
 
@@ -1531,12 +1947,16 @@ app.include_router(oauth_router, prefix="/api")
 app.include_router(admin_router, prefix="/api")
 app.include_router(complete_router)
 
+# Added before CORS so throttled responses still carry the CORS headers
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Retry-After"],
 )
 
 # Configure logging
@@ -1546,6 +1966,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    index_manager.start(db)
+
+@app.on_event("startup")
+async def build_search_index():
+    search_service.start(db)
+
+@app.on_event("startup")
+async def backfill_sales_rollup():
+    asyncio.create_task(sales_rollup.ensure_backfilled(db))
+
+@app.on_event("startup")
+async def start_job_queue():
+    job_queue.start(db)
+
+@app.on_event("startup")
+async def resume_email_campaigns():
+    campaign_service.start(db)
+
+@app.on_event("startup")
+async def resume_webhook_events():
+    webhook_inbox.start(db)
+
+@app.on_event("startup")
+async def start_stock_reservation_sweeper():
+    stock_reservations.start(db)
+
+@app.on_event("startup")
+async def start_media_pipeline():
+    media_pipeline.start(db)
+
+@app.on_event("startup")
+async def start_rate_limiter():
+    rate_limiter.start(db)
+
+@app.on_event("startup")
+async def start_session_revocation_filter():
+    session_store.start(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await session_store.stop()
+    await job_queue.stop()
+    await email_service.close()
+    await http_client.aclose()
+    password_hasher.shutdown()
+    media_pipeline.shutdown()
     client.close()
\ No newline at end of file
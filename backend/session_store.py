@@ -0,0 +1,309 @@
+"""
+Sessions, refresh tokens and revocation
+
+Login creates a session in the `sessions` collection and returns a
+short-lived access token (carrying the session id as `sid`) plus a refresh
+token `<session id>.<secret>`. Only the sha256 of the secret is stored.
+Every refresh rotates the secret; presenting an already rotated secret
+outside a short grace window is treated as token theft and revokes the
+session. Sessions expire through a TTL index on `expires_at`.
+
+Revoked session ids are kept in an in-memory bloom filter that a background
+task refreshes incrementally (sessions revoked since the last poll), so
+checking an access token costs no database round trip. Only a filter hit,
+which is either a revoked session or a rare false positive, is confirmed
+against the database. Revocations made by another process become visible
+here within one poll interval.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import secrets
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_PROJECTION = {"_id": 0, "refresh_hash": 0, "previous_hashes": 0}
+
+# Superseded refresh secrets remembered for reuse detection
+PREVIOUS_HASHES = 5
+
+
+class SessionError(Exception):
+    pass
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str) -> bool:
+        """Add a key; True when it was not (apparently) present yet"""
+        added = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._array[byte] & (1 << bit):
+                self._array[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+    def estimated_error_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _split_refresh_token(refresh_token: str) -> Tuple[str, str]:
+    session_id, _, secret = (refresh_token or "").partition(".")
+    if not session_id or not secret:
+        raise SessionError("Invalid refresh token")
+    return session_id, secret
+
+
+class SessionStore:
+    collection_name = "sessions"
+
+    def __init__(self, access_minutes: int = 15, refresh_days: int = 30, reuse_grace: int = 30,
+                 poll_interval: int = 5, rebuild_interval: int = 3600, capacity: int = 100000,
+                 error_rate: float = 0.001):
+        self.access_ttl = timedelta(minutes=access_minutes)
+        self.refresh_ttl = timedelta(days=refresh_days)
+        # Two tabs refreshing at once: the loser is refused, not treated as a stolen token
+        self.reuse_grace = timedelta(seconds=reuse_grace)
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        self.error_rate = error_rate
+        self.revoked = BloomFilter(capacity, error_rate)
+        self.loaded = False
+        self._watermark: Optional[datetime] = None
+        self._last_rebuild: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"checks": 0, "filter_hits": 0, "false_positives": 0, "db_checks": 0,
+                       "polls": 0, "rebuilds": 0, "rotations": 0, "reuse_detected": 0}
+
+    # ===== Sessions =====
+
+    async def create(self, db, user_id: str, user_agent: Optional[str] = None,
+                     ip: Optional[str] = None) -> Tuple[dict, str]:
+        """New session for a login; returns (session, refresh token)"""
+        now = datetime.now(timezone.utc)
+        secret = secrets.token_urlsafe(32)
+        session = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "refresh_hash": _hash_secret(secret),
+            "previous_hashes": [],
+            "rotations": 0,
+            "user_agent": (user_agent or "")[:256],
+            "ip": ip,
+            "created_at": now,
+            "last_used_at": now,
+            "rotated_at": now,
+            "expires_at": now + self.refresh_ttl,
+        }
+        await db[self.collection_name].insert_one(dict(session))
+        return session, f"{session['id']}.{secret}"
+
+    async def rotate(self, db, refresh_token: str, ip: Optional[str] = None) -> Tuple[dict, str]:
+        """Exchange a refresh token for a new one on the same session"""
+        session_id, secret = _split_refresh_token(refresh_token)
+        presented = _hash_secret(secret)
+        collection = db[self.collection_name]
+        now = datetime.now(timezone.utc)
+
+        session = await collection.find_one({"id": session_id}, {"_id": 0})
+        if not session or session.get("revoked_at") or _aware(session["expires_at"]) <= now:
+            raise SessionError("Session has expired or was revoked")
+
+        if presented != session["refresh_hash"]:
+            if presented in (session.get("previous_hashes") or []):
+                rotated_at = _aware(session.get("rotated_at") or session["created_at"])
+                if presented == session["previous_hashes"][-1] and now - rotated_at <= self.reuse_grace:
+                    raise SessionError("Refresh token was already used")
+                # An old secret came back after rotation: the token leaked
+                self._stats["reuse_detected"] += 1
+                logger.warning(f"Refresh token reuse on session {session_id}, revoking it")
+                await self.revoke(db, session_id=session_id, reason="refresh_token_reuse")
+            raise SessionError("Invalid refresh token")
+
+        new_secret = secrets.token_urlsafe(32)
+        new_hash = _hash_secret(new_secret)
+        result = await collection.update_one(
+            # Only the request that still holds the current secret wins the rotation
+            {"id": session_id, "refresh_hash": presented, "revoked_at": None},
+            {
+                "$set": {
+                    "refresh_hash": new_hash,
+                    "last_used_at": now,
+                    "rotated_at": now,
+                    "expires_at": now + self.refresh_ttl,
+                    **({"ip": ip} if ip else {}),
+                },
+                "$push": {"previous_hashes": {"$each": [presented], "$slice": -PREVIOUS_HASHES}},
+                "$inc": {"rotations": 1},
+            }
+        )
+        if result.modified_count == 0:
+            raise SessionError("Refresh token was already used")
+        self._stats["rotations"] += 1
+        session.update(refresh_hash=new_hash, last_used_at=now, expires_at=now + self.refresh_ttl)
+        return session, f"{session_id}.{new_secret}"
+
+    async def revoke(self, db, session_id: Optional[str] = None, user_id: Optional[str] = None,
+                     except_session: Optional[str] = None, reason: str = "revoked") -> int:
+        """Revoke one session, or every session of a user; returns how many were revoked"""
+        query = {"revoked_at": None}
+        if session_id:
+            query["id"] = session_id
+        elif except_session:
+            query["id"] = {"$ne": except_session}
+        if user_id:
+            query["user_id"] = user_id
+        if len(query) == 1:
+            raise ValueError("revoke needs a session or a user")
+
+        collection = db[self.collection_name]
+        ids = [doc["id"] async for doc in collection.find(query, {"_id": 0, "id": 1})]
+        if not ids:
+            return 0
+        now = datetime.now(timezone.utc)
+        await collection.update_many(
+            {"id": {"$in": ids}, "revoked_at": None},
+            {
+                "$set": {"revoked_at": now, "revoked_reason": reason},
+                # Once its access tokens have expired a revoked session is no longer needed
+                "$min": {"expires_at": now + self.access_ttl + timedelta(minutes=5)},
+            }
+        )
+        for revoked_id in ids:
+            self.revoked.add(revoked_id)
+        return len(ids)
+
+    async def list_sessions(self, db, user_id: Optional[str] = None, include_revoked: bool = False,
+                   limit: int = 100) -> List[dict]:
+        query = {} if include_revoked else {"revoked_at": None}
+        if user_id:
+            query["user_id"] = user_id
+        cursor = db[self.collection_name].find(query, SESSION_PROJECTION).sort("last_used_at", -1)
+        return await cursor.to_list(limit)
+
+    # ===== Revocation checks =====
+
+    async def is_revoked(self, db, session_id: str) -> bool:
+        """Hot path: answered from the filter unless it reports a hit"""
+        self._stats["checks"] += 1
+        if self.loaded:
+            if session_id not in self.revoked:
+                return False
+            self._stats["filter_hits"] += 1
+        self._stats["db_checks"] += 1
+        session = await db[self.collection_name].find_one({"id": session_id}, {"_id": 0, "revoked_at": 1})
+        revoked = session is None or session.get("revoked_at") is not None
+        if self.loaded and not revoked:
+            self._stats["false_positives"] += 1
+        return revoked
+
+    async def refresh(self, db, full: bool = False):
+        """Add sessions revoked since the previous poll, or rebuild the filter"""
+        started = datetime.now(timezone.utc)
+        if full or self._watermark is None:
+            query = {"revoked_at": {"$ne": None}}
+        else:
+            # Overlap polls a little so revocations written with a slightly late clock are not missed
+            query = {"revoked_at": {"$gte": self._watermark - timedelta(seconds=max(30, self.poll_interval * 2))}}
+
+        ids = [doc["id"] async for doc in db[self.collection_name].find(query, {"_id": 0, "id": 1})]
+        if full or self._watermark is None:
+            bloom = BloomFilter(max(self.revoked.capacity, len(ids) * 2), self.error_rate)
+            for session_id in ids:
+                bloom.add(session_id)
+            self.revoked = bloom
+            self._last_rebuild = started
+            self._stats["rebuilds"] += 1
+        else:
+            for session_id in ids:
+                self.revoked.add(session_id)
+        self._watermark = started
+        self._stats["polls"] += 1
+        self.loaded = True
+
+    def start(self, db):
+        """Load the revocation filter and keep it current in the background"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._refresher(db))
+
+    async def _refresher(self, db):
+        while True:
+            try:
+                rebuild = (
+                    self._last_rebuild is None
+                    or (datetime.now(timezone.utc) - self._last_rebuild).total_seconds() >= self.rebuild_interval
+                    # Expired revocations are dropped by rebuilding; also rebuild before the error rate climbs
+                    or self.revoked.count >= self.revoked.capacity
+                )
+                await self.refresh(db, full=rebuild)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Session revocation refresh failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "loaded": self.loaded,
+            "revoked_in_filter": self.revoked.count,
+            "filter_capacity": self.revoked.capacity,
+            "filter_bits": self.revoked.bits,
+            "filter_hashes": self.revoked.hashes,
+            "estimated_error_rate": round(self.revoked.estimated_error_rate(), 6),
+            "last_poll": self._watermark.isoformat() if self._watermark else None,
+            "access_token_minutes": int(self.access_ttl.total_seconds() // 60),
+            "refresh_token_days": self.refresh_ttl.days,
+        }
+
+
+def _aware(value: datetime) -> datetime:
+    # Motor returns naive UTC datetimes
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+session_store = SessionStore(
+    access_minutes=int(os.environ.get('ACCESS_TOKEN_MINUTES', '15')),
+    refresh_days=int(os.environ.get('REFRESH_TOKEN_DAYS', '30')),
+    reuse_grace=int(os.environ.get('REFRESH_TOKEN_REUSE_GRACE', '30')),
+    poll_interval=int(os.environ.get('SESSION_REVOCATION_POLL', '5')),
+    rebuild_interval=int(os.environ.get('SESSION_REVOCATION_REBUILD', '3600')),
+    capacity=int(os.environ.get('SESSION_REVOCATION_CAPACITY', '100000')),
+)
@@ -0,0 +1,174 @@
+"""
+Pooled SMTP sessions
+
+Keeps a bounded set of connected, authenticated aiosmtplib.SMTP sessions so
+each message costs a single MAIL/RCPT/DATA exchange instead of TCP connect,
+EHLO, STARTTLS and AUTH. Idle sessions are health checked with NOOP before
+reuse, recycled after a fixed number of messages or a maximum idle time, and
+replaced transparently when the server drops the connection. Concurrency and
+a token bucket keep the send rate inside the provider's limits.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional
+
+import aiosmtplib
+
+from throttling import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the session is unusable but the message can be retried
+# on a fresh connection
+RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+class _Session:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages = 0
+
+
+class SMTPPool:
+    """Bounded pool of persistent SMTP sessions"""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        size: int = 3,
+        max_messages_per_session: int = 100,
+        max_idle: float = 240.0,
+        health_check_after: float = 30.0,
+        rate_per_second: Optional[float] = None,
+        timeout: float = 30.0,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password or None
+        self.start_tls = start_tls
+        self.size = size
+        self.max_messages_per_session = max_messages_per_session
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_per_second, capacity=max(size, 1)) if rate_per_second else None
+
+        self._idle: Deque[_Session] = deque()
+        self._slots = asyncio.Semaphore(size)
+        self._open = 0
+        self.counters = {
+            "sent": 0,
+            "failed": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+        }
+
+    async def _connect(self) -> _Session:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        # connect() runs EHLO, STARTTLS and AUTH when credentials are set
+        await smtp.connect()
+        self._open += 1
+        self.counters["connects"] += 1
+        return _Session(smtp)
+
+    async def _discard(self, session: _Session):
+        self._open -= 1
+        try:
+            if session.smtp.is_connected:
+                await session.smtp.quit()
+        except Exception:
+            session.smtp.close()
+
+    async def _checkout(self) -> _Session:
+        """Most recently used healthy session, or a new connection"""
+        while self._idle:
+            session = self._idle.pop()
+            idle_for = time.monotonic() - session.last_used
+            if idle_for > self.max_idle or not session.smtp.is_connected:
+                self.counters["recycled"] += 1
+                await self._discard(session)
+                continue
+            if idle_for > self.health_check_after:
+                try:
+                    await session.smtp.noop()
+                except Exception:
+                    self.counters["health_check_failures"] += 1
+                    await self._discard(session)
+                    continue
+            return session
+        return await self._connect()
+
+    async def _checkin(self, session: _Session):
+        session.last_used = time.monotonic()
+        if session.messages >= self.max_messages_per_session:
+            self.counters["recycled"] += 1
+            await self._discard(session)
+        else:
+            self._idle.append(session)
+
+    async def send_message(self, message):
+        """Send an email.message.Message, reconnecting once if the session was dropped"""
+        if self.bucket:
+            await self.bucket.acquire()
+
+        async with self._slots:
+            for attempt in (1, 2):
+                session = await self._checkout()
+                try:
+                    result = await session.smtp.send_message(message)
+                except RECONNECT_ERRORS as e:
+                    await self._discard(session)
+                    if attempt == 2:
+                        self.counters["failed"] += 1
+                        raise
+                    self.counters["reconnects"] += 1
+                    logger.warning(f"SMTP session dropped ({type(e).__name__}), reconnecting")
+                    continue
+                except Exception:
+                    # Protocol state is unknown after a failed transaction
+                    await self._discard(session)
+                    self.counters["failed"] += 1
+                    raise
+                session.messages += 1
+                self.counters["sent"] += 1
+                await self._checkin(session)
+                return result
+
+    async def close(self):
+        """Close every idle session"""
+        while self._idle:
+            await self._discard(self._idle.pop())
+
+    def stats(self) -> dict:
+        return {
+            "host": f"{self.hostname}:{self.port}",
+            "size": self.size,
+            "open": self._open,
+            "idle": len(self._idle),
+            "in_use": self._open - len(self._idle),
+            "rate_per_second": self.bucket.rate if self.bucket else None,
+            **self.counters,
+        }
@@ -0,0 +1,244 @@
+"""
+Stock reservations
+
+Checkout reserves stock for every order line with conditional `$inc`
+updates (`stock >= qty`) sent as one unordered bulk_write per collection, so
+concurrent orders cannot oversell without any global lock. Each successful
+update also records a hold (`stock_holds.<order_id>`) on the product; when
+some lines are short, the holds tell exactly which updates applied so they
+can be rolled back.
+
+A reservation is committed when the order is paid and released when the
+order is cancelled or stays unpaid past its expiry, which the background
+sweeper handles by cancelling the order and returning the stock.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+from catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+HELD = "held"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+class InsufficientStock(Exception):
+    def __init__(self, lines: List[dict]):
+        names = ", ".join(line.get("name") or line["product_id"] for line in lines)
+        super().__init__(f"Insufficient stock for: {names}")
+        self.lines = lines
+
+
+def _hold(order_id: str) -> str:
+    return f"stock_holds.{order_id}"
+
+
+class StockReservations:
+    """Reserve, commit and release order stock"""
+
+    collection_name = "stock_reservations"
+
+    def __init__(self, ttl_minutes: int = 60, manual_ttl_hours: int = 72, sweep_interval: int = 60):
+        self.ttl = timedelta(minutes=ttl_minutes)
+        # Bank transfers and other manual payments take longer to arrive
+        self.manual_ttl = timedelta(hours=manual_ttl_hours)
+        self.sweep_interval = sweep_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def expiry_for(self, payment_method: Optional[str]) -> datetime:
+        ttl = self.manual_ttl if (payment_method or "").startswith("manual") else self.ttl
+        return datetime.now(timezone.utc) + ttl
+
+    def start(self, db):
+        """Run the expiry sweeper in the background"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._sweeper(db))
+
+    @staticmethod
+    def _group(lines: List[dict]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        products: Dict[str, int] = defaultdict(int)
+        variations: Dict[str, int] = defaultdict(int)
+        for line in lines:
+            products[line["product_id"]] += line["quantity"]
+            if line.get("variation_id"):
+                variations[line["variation_id"]] += line["quantity"]
+        return products, variations
+
+    async def _take(self, collection, order_id: str, quantities: Dict[str, int], sales: bool) -> List[str]:
+        """Conditionally decrement in one bulk_write; returns the ids that were short"""
+        if not quantities:
+            return []
+        ops = [
+            UpdateOne(
+                {"id": item_id, "stock": {"$gte": qty}},
+                {
+                    "$inc": {"stock": -qty, **({"sales_count": qty} if sales else {})},
+                    "$set": {_hold(order_id): qty},
+                }
+            )
+            for item_id, qty in quantities.items()
+        ]
+        result = await collection.bulk_write(ops, ordered=False)
+        if result.modified_count == len(ops):
+            return []
+
+        # Some lines were short: the holds show which updates applied
+        held = await collection.find(
+            {"id": {"$in": list(quantities)}, _hold(order_id): {"$exists": True}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        held_ids = {doc["id"] for doc in held}
+        return [item_id for item_id in quantities if item_id not in held_ids]
+
+    async def _give_back(self, collection, order_id: str, quantities: Dict[str, int], sales: bool, held_only: bool):
+        if not quantities:
+            return
+        ops = []
+        for item_id, qty in quantities.items():
+            query = {"id": item_id}
+            if held_only:
+                # Only undo updates that applied, and only once
+                query[_hold(order_id)] = {"$exists": True}
+            ops.append(UpdateOne(query, {
+                "$inc": {"stock": qty, **({"sales_count": -qty} if sales else {})},
+                "$unset": {_hold(order_id): ""},
+            }))
+        await collection.bulk_write(ops, ordered=False)
+
+    async def reserve(self, db, order_id: str, lines: List[dict], payment_method: Optional[str] = None,
+                      skip_products=()):
+        """
+        Reserve stock for the order lines ({product_id, variation_id?, quantity, name?}).
+
+        Raises InsufficientStock (nothing stays reserved) when any line is short.
+        Products in skip_products (e.g. digital goods) are not stock tracked.
+        """
+        lines = [line for line in lines if line["product_id"] not in skip_products]
+        if not lines:
+            return
+        products, variations = self._group(lines)
+
+        short_products, short_variations = await asyncio.gather(
+            self._take(db.products, order_id, products, sales=True),
+            self._take(db.product_variations, order_id, variations, sales=False),
+        )
+        if short_products or short_variations:
+            await asyncio.gather(
+                self._give_back(db.products, order_id, products, sales=True, held_only=True),
+                self._give_back(db.product_variations, order_id, variations, sales=False, held_only=True),
+            )
+            short = [
+                line for line in lines
+                if line["product_id"] in short_products or line.get("variation_id") in short_variations
+            ]
+            raise InsufficientStock(short)
+
+        await db[self.collection_name].insert_one({
+            "order_id": order_id,
+            "lines": [
+                {"product_id": line["product_id"], "variation_id": line.get("variation_id"), "quantity": line["quantity"]}
+                for line in lines
+            ],
+            "status": HELD,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "expires_at": self.expiry_for(payment_method).isoformat(),
+        })
+        catalog_cache.invalidate_products(*({"id": product_id} for product_id in products))
+
+    async def _claim(self, db, order_id: str, from_statuses: List[str], status: str) -> Optional[dict]:
+        return await db[self.collection_name].find_one_and_update(
+            {"order_id": order_id, "status": {"$in": from_statuses}},
+            {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def commit(self, db, order_id: str) -> bool:
+        """Payment received: the stock is sold, drop the holds"""
+        reservation = await self._claim(db, order_id, [HELD], COMMITTED)
+        if reservation is None:
+            released = await db[self.collection_name].find_one({"order_id": order_id, "status": RELEASED}, {"_id": 1})
+            if released:
+                logger.warning(f"Order {order_id} paid after its stock reservation was released")
+            return False
+
+        products, variations = self._group(reservation["lines"])
+        unset = {"$unset": {_hold(order_id): ""}}
+        await asyncio.gather(
+            db.products.update_many({"id": {"$in": list(products)}}, unset),
+            *([db.product_variations.update_many({"id": {"$in": list(variations)}}, unset)] if variations else []),
+        )
+        return True
+
+    async def release(self, db, order_id: str) -> bool:
+        """Return the order's stock (cancelled or expired order); safe to call twice"""
+        reservation = await self._claim(db, order_id, [HELD, COMMITTED], RELEASED)
+        if reservation is None:
+            return False
+
+        products, variations = self._group(reservation["lines"])
+        held_only = reservation["status"] == HELD
+        await asyncio.gather(
+            self._give_back(db.products, order_id, products, sales=True, held_only=held_only),
+            self._give_back(db.product_variations, order_id, variations, sales=False, held_only=held_only),
+        )
+        catalog_cache.invalidate_products(*({"id": product_id} for product_id in products))
+        logger.info(f"Released stock reservation for order {order_id}")
+        return True
+
+    async def release_expired(self, db, limit: int = 100) -> int:
+        """Cancel unpaid orders whose reservation expired and return their stock"""
+        now = datetime.now(timezone.utc)
+        expired = await db[self.collection_name].find(
+            {"status": HELD, "expires_at": {"$lte": now.isoformat()}}, {"_id": 0, "order_id": 1}
+        ).limit(limit).to_list(limit)
+
+        released = 0
+        for reservation in expired:
+            order_id = reservation["order_id"]
+            # Same guard as the pending -> cancelled transition, plus "still unpaid"
+            cancelled = await db.orders.find_one_and_update(
+                {"id": order_id, "order_status": "pending", "payment_status": {"$ne": "confirmed"}},
+                {"$set": {"order_status": "cancelled", "cancel_reason": "payment_expired", "updated_at": now.isoformat()}},
+                projection={"_id": 0, "id": 1}
+            )
+            order_exists = cancelled or await db.orders.find_one({"id": order_id}, {"_id": 1})
+            if cancelled or not order_exists:
+                if await self.release(db, order_id):
+                    released += 1
+            else:
+                # Paid or already moving: keep the stock, stop re-checking it
+                await self.commit(db, order_id)
+        return released
+
+    async def _sweeper(self, db):
+        while True:
+            try:
+                released = await self.release_expired(db)
+                if released:
+                    logger.info(f"Released {released} expired stock reservations")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stock reservation sweep failed: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def stats(self, db) -> dict:
+        counts = {HELD: 0, COMMITTED: 0, RELEASED: 0}
+        async for row in db[self.collection_name].aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+
+stock_reservations = StockReservations(
+    ttl_minutes=int(os.environ.get('STOCK_RESERVATION_MINUTES', '60')),
+    manual_ttl_hours=int(os.environ.get('STOCK_RESERVATION_MANUAL_HOURS', '72')),
+)
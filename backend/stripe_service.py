@@ -1,10 +1,14 @@
 import os
-import requests
+import hmac
+import hashlib
+import time
 import logging
 from typing import Dict
 from dotenv import load_dotenv
 from pathlib import Path
 
+from http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 class StripeService:
@@ -20,7 +24,10 @@ class StripeService:
         
         self.api_key = os.environ.get('STRIPE_SECRET_KEY', 'your_stripe_secret_key')
         self.publishable_key = os.environ.get('STRIPE_PUBLISHABLE_KEY', 'your_stripe_publishable_key')
-        self.base_url = "https://api.stripe.com/v1"
+        self.base_url = os.environ.get('STRIPE_BASE_URL', "https://api.stripe.com/v1")
+        self.webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+        # Oldest accepted webhook timestamp, in seconds (Stripe's library default)
+        self.webhook_tolerance = int(os.environ.get('STRIPE_WEBHOOK_TOLERANCE', '300'))
         self.is_demo = self.api_key == 'your_stripe_secret_key'
         
         logger.info(f"Stripe Service initialized - Demo mode: {self.is_demo}")
@@ -64,11 +71,10 @@ class StripeService:
                 "description": f"Payment for order {order_id}"
             }
             
-            product_response = requests.post(
+            product_response = await http_client.post(
                 f"{self.base_url}/products",
                 auth=(self.api_key, ""),
-                data=product_data,
-                timeout=30
+                data=product_data
             )
             
             if product_response.status_code != 200:
@@ -83,11 +89,10 @@ class StripeService:
                 "currency": currency
             }
             
-            price_response = requests.post(
+            price_response = await http_client.post(
                 f"{self.base_url}/prices",
                 auth=(self.api_key, ""),
-                data=price_data,
-                timeout=30
+                data=price_data
             )
             
             if price_response.status_code != 200:
@@ -110,11 +115,10 @@ class StripeService:
             # Note: customer_email is not supported in payment links API
             # Customer email will be collected during checkout
             
-            link_response = requests.post(
+            link_response = await http_client.post(
                 f"{self.base_url}/payment_links",
                 auth=(self.api_key, ""),
-                data=payment_link_data,
-                timeout=30
+                data=payment_link_data
             )
             
             if link_response.status_code == 200:
@@ -148,10 +152,9 @@ class StripeService:
             }
         
         try:
-            response = requests.get(
+            response = await http_client.get(
                 f"{self.base_url}/checkout/sessions/{session_id}",
-                auth=(self.api_key, ""),
-                timeout=30
+                auth=(self.api_key, "")
             )
             
             if response.status_code == 200:
@@ -166,4 +169,38 @@ class StripeService:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def verify_webhook_signature(self, payload: bytes, header: str) -> bool:
+        """
+        Vérifier l'en-tête Stripe-Signature d'un webhook
+        
+        Même vérification que stripe.Webhook.construct_event: HMAC SHA256 de
+        "<t>.<payload>" avec le secret du endpoint, comparé aux signatures v1,
+        et horodatage dans la tolérance (contre le rejeu).
+        
+        Returns:
+            True si la signature est valide
+        """
+        if not self.webhook_secret or not header:
+            return False
+        timestamp, signatures = None, []
+        for item in header.split(","):
+            key, _, value = item.strip().partition("=")
+            if key == "t":
+                timestamp = value
+            elif key == "v1":
+                signatures.append(value)
+        if not timestamp or not signatures:
+            return False
+        try:
+            if abs(time.time() - int(timestamp)) > self.webhook_tolerance:
+                return False
+        except ValueError:
+            return False
+        expected = hmac.new(
+            self.webhook_secret.encode('utf-8'),
+            timestamp.encode('utf-8') + b"." + payload,
+            hashlib.sha256
+        ).hexdigest()
+        return any(hmac.compare_digest(expected, signature) for signature in signatures)
+
 stripe_service = StripeService()
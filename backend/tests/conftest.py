@@ -0,0 +1,13 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """Fresh in-memory database per test"""
+    return AsyncMongoMockClient()["kayee_test"]
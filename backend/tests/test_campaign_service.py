@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import campaign_service as campaigns
+from campaign_service import COMPLETED, FAILED, PENDING, SENT, CampaignService
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyRecipients:
+    """Recipients collection whose writes fail for some addresses"""
+
+    def __init__(self, collection, failing):
+        self.collection = collection
+        self.failing = failing
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def update_one(self, query, update, **kwargs):
+        if query.get("email") in self.failing:
+            raise AutoReconnect("connection reset")
+        return await self.collection.update_one(query, update, **kwargs)
+
+
+class FlakyDatabase:
+    def __init__(self, db, failing):
+        self.db = db
+        self.failing = failing
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        return FlakyRecipients(collection, self.failing) if name == CampaignService.recipients else collection
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    delivered = []
+
+    async def deliver(email, subject, html_content):
+        delivered.append(email)
+
+    monkeypatch.setattr(campaigns.email_service, "deliver", deliver)
+    return delivered
+
+
+async def _campaign(db, count):
+    await db.bulk_emails.insert_one({"id": "c1", "subject": "Soldes", "message": "-20%", "status": "sending",
+                                     "sent_to": 0, "failed": 0})
+    await db.bulk_email_recipients.insert_many(
+        [{"campaign_id": "c1", "email": f"user{index}@example.com", "status": PENDING} for index in range(count)]
+    )
+    return await db.bulk_emails.find_one({"id": "c1"}, {"_id": 0})
+
+
+async def test_a_failed_write_does_not_stop_the_senders(db, sent):
+    service = CampaignService(workers=2, rate_per_second=1000)
+    campaign = await _campaign(db, 10)
+    await asyncio.wait_for(service.deliver(FlakyDatabase(db, {"user3@example.com"}), campaign), 5)
+    assert len(sent) == 10
+    assert await db.bulk_email_recipients.count_documents({"status": SENT}) == 9
+    assert (await db.bulk_emails.find_one({"id": "c1"}))["sent_to"] == 9
+
+
+async def test_campaign_fails_and_releases_its_lease_when_senders_die(db, sent, monkeypatch):
+    class BrokenBucket:
+        def __init__(self, rate):
+            pass
+
+        async def acquire(self):
+            raise RuntimeError("bucket broken")
+
+    monkeypatch.setattr(campaigns, "TokenBucket", BrokenBucket)
+    service = CampaignService(workers=2, rate_per_second=1000)
+    await _campaign(db, 50)
+    await asyncio.wait_for(service.run(db, "c1"), 5)
+    campaign = await db.bulk_emails.find_one({"id": "c1"})
+    assert campaign["status"] == FAILED and campaign["lease_until"] is None
+    assert "senders stopped" in campaign["error"]
+
+
+async def test_campaign_completes(db, sent):
+    service = CampaignService(workers=3, rate_per_second=1000)
+    await _campaign(db, 20)
+    await asyncio.wait_for(service.run(db, "c1"), 5)
+    campaign = await db.bulk_emails.find_one({"id": "c1"})
+    assert (campaign["status"], campaign["sent_to"], campaign["lease_until"]) == (COMPLETED, 20, None)
@@ -0,0 +1,38 @@
+import importlib
+import os
+
+import pytest
+
+from email_service import email_service
+
+
+@pytest.fixture
+def order(monkeypatch):
+    """Order document shaped exactly as create_order stores it"""
+    monkeypatch.setenv("MONGO_URL", os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    monkeypatch.setenv("DB_NAME", os.environ.get("DB_NAME", "kayee_test"))
+    server = importlib.import_module("server")
+    return server.Order(
+        order_number="ORD-1A2B3C4D",
+        user_email="jean@example.com",
+        user_name="Jean Dupont",
+        items=[{"product_id": "p1", "name": "Montre Automatique", "quantity": 2, "price": 129.9}],
+        total=259.8,
+        order_status="shipped",
+        payment_method="stripe",
+        shipping_address={"address": "1 rue de la Paix", "city": "Paris", "postal_code": "75002", "country": "France"},
+        phone="+33 6 00 00 00 00",
+    ).model_dump()
+
+
+def test_order_status_update_renders_the_stored_status(order):
+    html = email_service.render_order_status_update(order, "processing")
+    assert "Votre commande a été expédiée" in html
+    assert "Votre colis est en route" in html
+    assert "shipped</span>" in html
+    assert "ORD-1A2B3C4D" in html
+
+
+def test_order_emails_show_the_order_status(order):
+    assert "<strong>Status:</strong> shipped" in email_service.render_order_confirmation(order)
+    assert "SHIPPED</span>" in email_service.render_admin_new_order_notification(order)
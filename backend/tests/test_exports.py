@@ -0,0 +1,74 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+
+from exports import _cell, _column_letter, stream_csv, stream_jsonl, stream_xlsx
+
+pytestmark = pytest.mark.anyio
+
+COLUMNS = [
+    ("Number", "order_number"),
+    ("City", "shipping_address.city"),
+    ("Total", "total"),
+    ("Items", lambda order: len(order.get("items") or [])),
+]
+
+
+@pytest.fixture
+async def orders(db):
+    await db.orders.insert_many([
+        {"order_number": f"KY-{index}", "shipping_address": {"city": "Paris"}, "total": index * 10.5,
+         "items": [{}] * index}
+        for index in range(1, 6)
+    ])
+    await db.orders.insert_one({"order_number": "=HYPERLINK(\"http://evil\")", "total": 0})
+    return db.orders
+
+
+async def _collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.mark.parametrize("value", ["=1+1", "+33 6 00", "-2", "@SUM(A1)", "\tcmd"])
+def test_formula_like_text_is_quoted(value):
+    assert _cell(value) == "'" + value
+
+
+def test_other_values_pass_through():
+    assert _cell(-2) == -2
+    assert _cell("Montre") == "Montre"
+    assert _cell(None) == ""
+    assert _cell(datetime(2025, 1, 2, tzinfo=timezone.utc)) == "2025-01-02T00:00:00+00:00"
+    assert _cell(["a", 1]) == '["a", 1]'
+
+
+def test_column_letters():
+    assert [_column_letter(index) for index in (0, 25, 26, 701, 702)] == ["A", "Z", "AA", "ZZ", "AAA"]
+
+
+async def test_csv_export(orders):
+    data = await _collect(stream_csv(orders.find({}, {"_id": 0}).sort("total", 1), COLUMNS, batch_size=2))
+    assert data.startswith("﻿".encode())
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+    assert rows[0] == ["Number", "City", "Total", "Items"]
+    assert rows[1] == ["'=HYPERLINK(\"http://evil\")", "", "0", "0"]
+    assert rows[2] == ["KY-1", "Paris", "10.5", "1"]
+    assert len(rows) == 7
+
+
+async def test_jsonl_export_writes_every_field(orders):
+    lines = (await _collect(stream_jsonl(orders.find({}, {"_id": 0}), batch_size=4))).decode().splitlines()
+    assert len(lines) == 6 and '"items"' in lines[0]
+
+
+async def test_xlsx_export_is_a_readable_workbook(orders):
+    data = await _collect(stream_xlsx(orders.find({}, {"_id": 0}).sort("total", 1), COLUMNS, batch_size=2))
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        assert workbook.testzip() is None
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+    assert sheet.count("<row ") == 7
+    assert '<c r="A2" t="inlineStr"><is><t xml:space="preserve">\'=HYPERLINK("http://evil")</t></is></c>' in sheet
+    assert '<c r="C3"><v>10.5</v></c>' in sheet
@@ -0,0 +1,84 @@
+from typing import Optional
+
+import pytest
+
+from migrations.runner import COLLECTION, COMPLETED, FAILED, DocumentMigration, Migration, MigrationRunner
+
+pytestmark = pytest.mark.anyio
+
+
+class AddFlag(DocumentMigration):
+    version = "0001"
+    name = "add_flag"
+    collection = "products"
+    query = {"flag": {"$exists": False}}
+
+    def __init__(self, fail_after: Optional[int] = None):
+        self.fail_after = fail_after
+        self.seen = 0
+
+    def transform(self, doc: dict) -> Optional[dict]:
+        self.seen += 1
+        if self.fail_after is not None and self.seen > self.fail_after:
+            raise RuntimeError("interrupted")
+        if doc["n"] % 2:
+            return None
+        return {"$set": {"flag": True}}
+
+
+class Manual(Migration):
+    version = "0002"
+    name = "manual"
+    manual = True
+
+    async def run(self, ctx) -> dict:
+        return {}
+
+
+@pytest.fixture
+async def products(db):
+    await db.products.insert_many([{"n": n} for n in range(25)])
+    return db
+
+
+async def test_document_migration_rewrites_in_batches(products):
+    migration = AddFlag()
+    [result] = await MigrationRunner([migration, Manual()]).run(products, batch_size=4)
+    assert result["status"] == COMPLETED
+    assert result["stats"]["scanned"] == 25 and result["stats"]["modified"] == 13
+    assert result["stats"]["batches"] == 7
+    assert await products.products.count_documents({"flag": True}) == 13
+    record = await products[COLLECTION].find_one({"version": "0001"})
+    assert record["status"] == COMPLETED and record["checkpoint"] is None
+
+
+async def test_completed_migrations_are_skipped_unless_forced(products):
+    runner = MigrationRunner([AddFlag()])
+    await runner.run(products)
+    assert (await runner.run(products))[0]["status"] == "skipped"
+    assert (await runner.run(products, force=True))[0]["status"] == COMPLETED
+
+
+async def test_dry_run_writes_nothing(products):
+    [result] = await MigrationRunner([AddFlag()]).run(products, dry_run=True)
+    assert result["status"] == "dry_run" and result["stats"]["changed"] == 13
+    assert await products.products.count_documents({"flag": True}) == 0
+    assert await products[COLLECTION].count_documents({}) == 0
+
+
+async def test_interrupted_migration_resumes_from_its_checkpoint(products):
+    with pytest.raises(RuntimeError):
+        await MigrationRunner([AddFlag(fail_after=10)]).run(products, batch_size=4, concurrency=1)
+    record = await products[COLLECTION].find_one({"version": "0001"})
+    assert record["status"] == FAILED and record["checkpoint"] is not None
+
+    resumed = AddFlag()
+    [result] = await MigrationRunner([resumed]).run(products, batch_size=4)
+    assert result["resumed"]
+    assert resumed.seen < 25
+    assert await products.products.count_documents({"flag": True}) == 13
+
+
+def test_duplicate_versions_are_rejected():
+    with pytest.raises(ValueError):
+        MigrationRunner([AddFlag(), AddFlag()])
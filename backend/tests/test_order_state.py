@@ -0,0 +1,69 @@
+import pytest
+
+import order_state
+from order_state import InvalidTransition, OrderNotFound, transition, transition_filter
+
+pytestmark = pytest.mark.anyio
+
+
+def test_transition_filter_matches_only_sources_of_the_target():
+    query = transition_filter(status="delivered")
+    assert sorted(query["order_status"]["$in"]) == ["delivered", "processing", "shipped"]
+    assert query["$or"] == [{"order_status": {"$ne": "delivered"}}]
+
+
+def test_shipped_orders_cannot_go_back_to_processing():
+    assert "shipped" not in transition_filter(status="processing")["order_status"]["$in"]
+
+
+def test_transition_filter_combines_order_and_payment_targets():
+    query = transition_filter(status="processing", payment_status="confirmed")
+    assert sorted(query["payment_status"]["$in"]) == ["confirmed", "failed", "pending"]
+    assert len(query["$or"]) == 2
+
+
+def test_transition_filter_rejects_unknown_or_missing_targets():
+    with pytest.raises(InvalidTransition):
+        transition_filter(status="teleported")
+    with pytest.raises(InvalidTransition):
+        transition_filter()
+
+
+def test_delivered_is_terminal():
+    assert order_state.ORDER_TRANSITIONS["delivered"] == set()
+    for target in order_state.ORDER_TRANSITIONS:
+        if target != "delivered":
+            assert "delivered" not in transition_filter(status=target)["order_status"]["$in"]
+
+
+async def _order(db, order_status="pending", payment_status="pending"):
+    await db.orders.insert_one({"id": "o1", "order_status": order_status, "payment_status": payment_status})
+
+
+async def test_transition_returns_before_and_after(db):
+    await _order(db)
+    result = await transition(db, "o1", status="processing", notify=False)
+    assert result.changed
+    assert result.before["order_status"] == "pending"
+    assert result.after["order_status"] == "processing"
+    assert (await db.orders.find_one({"id": "o1"}))["order_status"] == "processing"
+
+
+async def test_transition_to_current_state_only_writes_extra(db):
+    await _order(db, order_status="processing")
+    result = await transition(db, "o1", status="processing", extra={"tracking_number": "1Z"}, notify=False)
+    assert not result.changed
+    assert (await db.orders.find_one({"id": "o1"}))["tracking_number"] == "1Z"
+
+
+async def test_invalid_transition_reports_current_state(db):
+    await _order(db, order_status="shipped")
+    with pytest.raises(InvalidTransition) as error:
+        await transition(db, "o1", status="processing", notify=False)
+    assert error.value.current == {"order_status": "shipped", "payment_status": "pending"}
+    assert (await db.orders.find_one({"id": "o1"}))["order_status"] == "shipped"
+
+
+async def test_transition_of_missing_order(db):
+    with pytest.raises(OrderNotFound):
+        await transition(db, "missing", status="processing", notify=False)
@@ -0,0 +1,92 @@
+import importlib
+import os
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, keyset_condition, keyset_page
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("price", -1, {"id": "p7", "price": 19.5})
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "price", -1) == {"k": "price", "d": -1, "v": 19.5, "id": "p7"}
+
+
+def test_cursor_for_another_ordering_is_rejected():
+    cursor = encode_cursor("price", -1, {"id": "p7", "price": 19.5})
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "price", 1)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bnVsbA", encode_cursor("price", 1, {"price": 1})[:-4]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "price", 1)
+    assert error.value.status_code == 400
+
+
+def test_keyset_condition_on_id_only():
+    assert keyset_condition("id", 1, {"v": "p3", "id": "p3"}) == {"id": {"$gt": "p3"}}
+
+
+def test_keyset_condition_descending_keeps_null_rows():
+    condition = keyset_condition("price", -1, {"v": 10, "id": "p3"})
+    assert {"price": None} in condition["$or"]
+
+
+@pytest.fixture
+async def products(db):
+    prices = [5, None, 12, 5, None, 30, 12, 5, None, 7]
+    await db.products.insert_many([{"id": f"p{index:02d}", "price": price} for index, price in enumerate(prices)])
+    return db.products
+
+
+async def _all_pages(collection, direction, limit):
+    ids, cursor = [], None
+    while True:
+        docs, cursor = await keyset_page(collection, {}, "price", direction, limit, cursor=cursor)
+        ids.extend(doc["id"] for doc in docs)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 2, 3, 4])
+async def test_paging_visits_every_row_once_in_sort_order(products, direction, limit):
+    expected = [
+        doc["id"] async for doc in products.find({}, {"_id": 0}).sort([("price", direction), ("id", direction)])
+    ]
+    assert await _all_pages(products, direction, limit) == expected
+
+
+async def test_legacy_skip_is_ignored_once_a_cursor_is_given(products):
+    first, cursor = await keyset_page(products, {}, "price", 1, 3, skip=0)
+    second, _ = await keyset_page(products, {}, "price", 1, 3, cursor=cursor, skip=50)
+    assert [doc["id"] for doc in second] and not {doc["id"] for doc in first} & {doc["id"] for doc in second}
+
+
+@pytest.mark.parametrize("limit", [0, -5])
+async def test_page_size_must_be_positive(products, limit):
+    with pytest.raises(ValueError):
+        await keyset_page(products, {}, "price", 1, limit)
+
+
+@pytest.mark.parametrize("path", [
+    "/api/products?limit=0",
+    "/api/products?limit=-1",
+    "/api/products?limit=1001",
+    "/api/products?skip=-1",
+    "/api/v2/reviews/product/p1?limit=0",
+])
+async def test_paged_routes_validate_limit(monkeypatch, path):
+    monkeypatch.setenv("MONGO_URL", os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    monkeypatch.setenv("DB_NAME", os.environ.get("DB_NAME", "kayee_test"))
+    server = importlib.import_module("server")
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get(path)).status_code == 422
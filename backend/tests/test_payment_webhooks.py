@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from binance_service import BinancePayService
+from plisio_service import PlisioService
+from stripe_service import StripeService
+
+pytestmark = pytest.mark.anyio
+
+PAYLOAD = b'{"id":"evt_1","type":"checkout.session.completed"}'
+
+
+@pytest.fixture
+def stripe():
+    service = StripeService()
+    service.webhook_secret = "whsec_test"
+    return service
+
+
+def _stripe_header(secret: str, payload: bytes, timestamp: int) -> str:
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def test_stripe_signature_is_verified(stripe):
+    assert stripe.verify_webhook_signature(PAYLOAD, _stripe_header("whsec_test", PAYLOAD, int(time.time())))
+
+
+@pytest.mark.parametrize("header", [
+    "",
+    "t=1,v0=abc",
+    _stripe_header("whsec_other", PAYLOAD, int(time.time())),
+    _stripe_header("whsec_test", PAYLOAD, int(time.time()) - 3600),
+])
+def test_forged_or_replayed_stripe_events_are_refused(stripe, header):
+    assert not stripe.verify_webhook_signature(PAYLOAD, header)
+
+
+def test_stripe_events_are_refused_without_a_secret(stripe):
+    header = _stripe_header("", PAYLOAD, int(time.time()))
+    stripe.webhook_secret = ""
+    assert not stripe.verify_webhook_signature(PAYLOAD, header)
+
+
+def test_plisio_verify_hash():
+    plisio = PlisioService()
+    plisio.api_key, plisio.is_demo = "plisio-secret", False
+    data = {"txn_id": "t1", "status": "completed", "order_number": "KY-1", "amount": "0.01"}
+    message = json.dumps(data, separators=(",", ":"))
+    data["verify_hash"] = hmac.new(b"plisio-secret", message.encode(), hashlib.sha1).hexdigest()
+    assert plisio.verify_callback(dict(data))
+    assert not plisio.verify_callback({**data, "status": "mismatch"})
+    assert not plisio.verify_callback({key: value for key, value in data.items() if key != "verify_hash"})
+
+
+async def test_binance_signature_is_checked_against_the_certificate():
+    binance = BinancePayService()
+    binance.is_demo = False
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    binance._certificates["sn-1"] = key.public_key()
+
+    timestamp, nonce = str(int(time.time() * 1000)), "nonce1"
+    signed = f"{timestamp}\n{nonce}\n".encode() + PAYLOAD + b"\n"
+    signature = base64.b64encode(key.sign(signed, padding.PKCS1v15(), hashes.SHA256())).decode()
+    headers = {
+        "BinancePay-Timestamp": timestamp,
+        "BinancePay-Nonce": nonce,
+        "BinancePay-Signature": signature,
+        "BinancePay-Certificate-SN": "sn-1",
+    }
+    assert await binance.verify_webhook_signature(headers, PAYLOAD)
+    assert not await binance.verify_webhook_signature(headers, PAYLOAD.replace(b"evt_1", b"evt_2"))
+    assert not await binance.verify_webhook_signature({**headers, "BinancePay-Signature": "Zm9yZ2Vk"}, PAYLOAD)
+    assert not await binance.verify_webhook_signature({}, PAYLOAD)
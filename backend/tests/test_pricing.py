@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pricing import CatalogLookup, PricingError, coupon_discount, price_cart
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def catalog(db):
+    await db.products.insert_many([
+        {"id": "watch", "name": "Watch", "price": 100.0, "images": ["w.jpg"], "stock": 5},
+        {"id": "strap", "name": "Strap", "price": 19.99, "images": [], "stock": 5},
+    ])
+    await db.product_variations.insert_one(
+        {"id": "gold", "product_id": "watch", "name": "Gold", "price_modifier": 50.0, "image": "gold.jpg"}
+    )
+    await db.coupons.insert_one({"code": "TEN", "active": True, "discount_type": "percentage", "discount_value": 10})
+    return db
+
+
+async def test_cart_is_priced_from_the_catalog(catalog):
+    quote = await price_cart(catalog, [
+        {"product_id": "watch", "variation_id": "gold", "quantity": 1, "price": 0.01},
+        {"product_id": "strap", "quantity": "3"},
+    ], shipping_method="fedex")
+    watch, strap = quote["items"]
+    assert (watch["name"], watch["price"], watch["image"]) == ("Watch - Gold", 150.0, "gold.jpg")
+    assert strap["line_total"] == 59.97
+    assert quote["subtotal"] == 209.97
+    assert quote["total"] == 219.97
+
+
+async def test_coupon_and_crypto_discounts(catalog):
+    quote = await price_cart(catalog, [{"product_id": "watch", "quantity": 2}], coupon_code="TEN",
+                             payment_method="plisio")
+    assert (quote["discount_amount"], quote["crypto_discount"], quote["total"]) == (20.0, 30.0, 150.0)
+
+
+async def test_invalid_coupon_is_reported_not_raised(catalog):
+    quote = await price_cart(catalog, [{"product_id": "watch", "quantity": 1}], coupon_code="NOPE")
+    assert quote["coupon_code"] is None
+    assert quote["coupon_error"] == "Invalid coupon code"
+    assert quote["total"] == 100.0
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"product_id": "missing", "quantity": 1}, "not found"),
+    ({"product_id": "watch", "quantity": 0}, "Invalid quantity"),
+    ({"product_id": "watch", "quantity": "two"}, "Invalid quantity"),
+    ({"product_id": "strap", "variation_id": "gold", "quantity": 1}, "Variation gold not found"),
+])
+async def test_bad_lines_are_rejected(catalog, item, message):
+    with pytest.raises(PricingError, match=message):
+        await price_cart(catalog, [item])
+
+
+async def test_unknown_shipping_method(catalog):
+    with pytest.raises(PricingError):
+        await price_cart(catalog, [{"product_id": "watch", "quantity": 1}], shipping_method="teleport")
+
+
+async def test_lookup_memoizes_documents(catalog):
+    lookup = CatalogLookup(catalog)
+    await price_cart(catalog, [{"product_id": "watch", "quantity": 1}], lookup=lookup)
+    await catalog.products.update_one({"id": "watch"}, {"$set": {"price": 1.0}})
+    quote = await price_cart(catalog, [{"product_id": "watch", "quantity": 1}], lookup=lookup)
+    assert quote["subtotal"] == 100.0
+
+
+def test_coupon_rules():
+    expired = {"discount_type": "fixed", "discount_value": 5,
+               "expires_at": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()}
+    with pytest.raises(PricingError, match="expired"):
+        coupon_discount(expired, 50)
+    with pytest.raises(PricingError, match="usage limit"):
+        coupon_discount({"discount_type": "fixed", "discount_value": 5, "max_uses": 2, "used_count": 2}, 50)
+    with pytest.raises(PricingError, match="Minimum purchase"):
+        coupon_discount({"discount_type": "fixed", "discount_value": 5, "min_purchase": 100}, 50)
+    # A fixed discount never exceeds the subtotal
+    assert coupon_discount({"discount_type": "fixed", "discount_value": 80}, 50) == 50
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+
+from rate_limiter import (
+    DEFAULT_POLICIES, SLIDING_WINDOW, TOKEN_BUCKET, MemoryStore, MongoStore, RateLimiter, RateLimitMiddleware,
+    RatePolicy, configure_policies,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def test_configure_policies_overrides_and_disables():
+    policies = {policy.name: policy for policy in configure_policies(DEFAULT_POLICIES, "login_ip=30/120, search_ip=off")}
+    assert (policies["login_ip"].limit, policies["login_ip"].window) == (30, 120.0)
+    assert "search_ip" not in policies
+    assert policies["checkout_ip"] == next(p for p in DEFAULT_POLICIES if p.name == "checkout_ip")
+
+
+@pytest.mark.parametrize("algorithm", [SLIDING_WINDOW, TOKEN_BUCKET])
+async def test_memory_store_allows_up_to_the_limit(algorithm):
+    store = MemoryStore()
+    policy = RatePolicy("test", "POST", ("/x",), limit=3, window=60, algorithm=algorithm)
+    results = [await store.hit(policy, "1.2.3.4") for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert 0 < results[-1][1] <= 60
+    # Other keys have their own budget
+    assert (await store.hit(policy, "5.6.7.8"))[0]
+
+
+async def test_mongo_store_does_not_count_rejected_requests(db):
+    store = MongoStore(db)
+    policy = RatePolicy("test", "POST", ("/x",), limit=2, window=60)
+    assert [(await store.hit(policy, "ip"))[0] for _ in range(4)] == [True, True, False, False]
+    assert (await db.rate_limits.find_one({}))["count"] == 2
+
+
+def _app(limiter):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return RateLimitMiddleware(app, limiter)
+
+
+async def test_middleware_answers_429_with_retry_after():
+    limiter = RateLimiter([
+        RatePolicy("login_ip", "POST", ("/api/auth/login",), limit=10, window=60),
+        RatePolicy("login_account", "POST", ("/api/auth/login",), limit=2, window=60,
+                   scope="account", account_field="email"),
+    ])
+    transport = httpx.ASGITransport(app=_app(limiter))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        statuses = [
+            (await client.post("/api/auth/login", json={"email": " Victim@Example.com"})).status_code
+            for _ in range(3)
+        ]
+        assert statuses == [200, 200, 429]
+        response = await client.post("/api/auth/login", json={"email": "victim@example.com"})
+        assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+        # Another account from the same IP is still allowed, and unlimited routes are untouched
+        assert (await client.post("/api/auth/login", json={"email": "other@example.com"})).status_code == 200
+        assert (await client.get("/api/products")).status_code == 200
+    stats = {policy["name"]: policy for policy in limiter.stats()["policies"]}
+    assert stats["login_account"]["rejected"] == 2
+
+
+def test_client_ip_behind_proxies():
+    scope = {"client": ("10.0.0.1", 1234), "headers": [(b"x-forwarded-for", b"6.6.6.6, 1.2.3.4, 10.0.0.2")]}
+    assert RateLimiter([], proxy_hops=0).client_ip(scope) == "10.0.0.1"
+    assert RateLimiter([], proxy_hops=1).client_ip(scope) == "10.0.0.2"
+    assert RateLimiter([], proxy_hops=2).client_ip(scope) == "1.2.3.4"
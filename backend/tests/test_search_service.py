@@ -0,0 +1,62 @@
+import pytest
+
+from search_service import SearchService
+
+pytestmark = pytest.mark.anyio
+
+
+class EditingCursor:
+    """Cursor that runs a callback after yielding the first document, like an admin edit landing mid-scan"""
+
+    def __init__(self, documents, on_first):
+        self.documents = list(documents)
+        self.on_first = on_first
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for position, document in enumerate(self.documents):
+            yield document
+            if position == 0:
+                self.on_first()
+
+
+class FakeProducts:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def find(self, *args, **kwargs):
+        return self.cursor
+
+
+class FakeDatabase:
+    def __init__(self, cursor):
+        self.products = FakeProducts(cursor)
+
+
+async def test_rebuild_keeps_writes_made_while_it_runs():
+    service = SearchService()
+    documents = [
+        {"id": "p1", "name": "Blue kettle"},
+        {"id": "p2", "name": "Green teapot"},
+    ]
+
+    def edit():
+        service.index_product({"id": "p3", "name": "Copper saucepan"})
+        service.remove_product("p2")
+
+    await service.rebuild(FakeDatabase(EditingCursor(documents, edit)))
+
+    assert service.search("saucepan") == ["p3"]
+    assert service.search("teapot") == []
+    assert service.search("kettle") == ["p1"]
+
+
+async def test_incremental_writes_after_a_rebuild_go_to_the_live_index(db):
+    service = SearchService()
+    await db.products.insert_one({"id": "p1", "name": "Blue kettle"})
+    await service.rebuild(db)
+    service.index_product({"id": "p2", "name": "Green teapot"})
+    assert service.search("teapot") == ["p2"]
+    assert service._pending is None
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from session_store import BloomFilter, SessionError, SessionStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store():
+    return SessionStore(reuse_grace=30, capacity=1000)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=500, error_rate=0.01)
+    keys = [f"session-{index}" for index in range(500)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{index}" in bloom for index in range(5000))
+    assert false_positives < 5000 * 0.03
+
+
+async def test_rotation_issues_a_new_secret_on_the_same_session(db, store):
+    session, refresh_token = await store.create(db, "u1")
+    rotated, new_token = await store.rotate(db, refresh_token)
+    assert rotated["id"] == session["id"]
+    assert new_token.split(".")[0] == session["id"] and new_token != refresh_token
+    saved = await db.sessions.find_one({"id": session["id"]})
+    assert saved["rotations"] == 1
+    assert len(saved["previous_hashes"]) == 1
+    # The new token keeps working
+    await store.rotate(db, new_token)
+
+
+async def test_previous_secret_within_grace_is_refused_without_revoking(db, store):
+    _, refresh_token = await store.create(db, "u1")
+    await store.rotate(db, refresh_token)
+    with pytest.raises(SessionError, match="already used"):
+        await store.rotate(db, refresh_token)
+    assert (await db.sessions.find_one({})).get("revoked_at") is None
+    assert store.stats()["reuse_detected"] == 0
+
+
+async def test_reused_secret_after_grace_revokes_the_session(db, store):
+    session, refresh_token = await store.create(db, "u1")
+    _, current_token = await store.rotate(db, refresh_token)
+    # Pretend the rotation happened long ago
+    await db.sessions.update_one(
+        {"id": session["id"]}, {"$set": {"rotated_at": datetime.now(timezone.utc) - timedelta(minutes=5)}}
+    )
+    with pytest.raises(SessionError, match="Invalid refresh token"):
+        await store.rotate(db, refresh_token)
+    assert store.stats()["reuse_detected"] == 1
+    assert (await db.sessions.find_one({"id": session["id"]}))["revoked_reason"] == "refresh_token_reuse"
+    # The thief's rotated token dies with the session
+    with pytest.raises(SessionError, match="expired or was revoked"):
+        await store.rotate(db, current_token)
+
+
+@pytest.mark.parametrize("token", ["", "no-dot", "missing.secret", ".secret"])
+async def test_unknown_or_malformed_tokens_are_rejected(db, store, token):
+    with pytest.raises(SessionError):
+        await store.rotate(db, token)
+
+
+async def test_revoke_all_but_the_current_session(db, store):
+    kept, _ = await store.create(db, "u1")
+    await store.create(db, "u1")
+    await store.create(db, "u1")
+    other, _ = await store.create(db, "u2")
+    assert await store.revoke(db, user_id="u1", except_session=kept["id"]) == 2
+    assert [s["id"] for s in await store.list_sessions(db, user_id="u1")] == [kept["id"]]
+    assert len(await store.list_sessions(db, user_id="u2")) == 1
+    with pytest.raises(ValueError):
+        await store.revoke(db)
+
+
+async def test_revocation_check_uses_the_filter(db, store):
+    session, _ = await store.create(db, "u1")
+    await store.refresh(db, full=True)
+    assert not await store.is_revoked(db, session["id"])
+    assert store.stats()["db_checks"] == 0
+
+    await store.revoke(db, session_id=session["id"])
+    assert await store.is_revoked(db, session["id"])
+    assert store.stats()["filter_hits"] == 1
+
+
+async def test_revocations_by_another_process_arrive_with_the_next_poll(db, store):
+    session, _ = await store.create(db, "u1")
+    await store.refresh(db, full=True)
+    # Written directly, as another worker would
+    await db.sessions.update_one({"id": session["id"]}, {"$set": {"revoked_at": datetime.now(timezone.utc)}})
+    assert session["id"] not in store.revoked
+    await store.refresh(db)
+    assert session["id"] in store.revoked
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from stock_reservations import COMMITTED, HELD, RELEASED, InsufficientStock, StockReservations
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def reservations():
+    return StockReservations(ttl_minutes=60)
+
+
+@pytest.fixture
+async def catalog(db):
+    await db.products.insert_many([
+        {"id": "watch", "name": "Watch", "stock": 5, "sales_count": 0},
+        {"id": "shoe", "name": "Shoe", "stock": 1, "sales_count": 0},
+    ])
+    return db
+
+
+async def _product(db, product_id):
+    return await db.products.find_one({"id": product_id}, {"_id": 0})
+
+
+async def test_reserve_decrements_stock_and_counts_sales(catalog, reservations):
+    await reservations.reserve(catalog, "o1", [
+        {"product_id": "watch", "quantity": 2},
+        {"product_id": "watch", "quantity": 1},
+        {"product_id": "shoe", "quantity": 1},
+    ])
+    watch = await _product(catalog, "watch")
+    assert (watch["stock"], watch["sales_count"], watch["stock_holds"]) == (2, 3, {"o1": 3})
+    assert (await _product(catalog, "shoe"))["stock"] == 0
+    assert (await catalog.stock_reservations.find_one({"order_id": "o1"}))["status"] == HELD
+
+
+async def test_short_line_rolls_back_the_whole_order(catalog, reservations):
+    with pytest.raises(InsufficientStock) as error:
+        await reservations.reserve(catalog, "o1", [
+            {"product_id": "watch", "quantity": 2},
+            {"product_id": "shoe", "quantity": 2, "name": "Shoe"},
+        ])
+    assert [line["product_id"] for line in error.value.lines] == ["shoe"]
+    watch = await _product(catalog, "watch")
+    assert (watch["stock"], watch["sales_count"], watch.get("stock_holds")) == (5, 0, {})
+    assert (await _product(catalog, "shoe"))["stock"] == 1
+    assert await catalog.stock_reservations.count_documents({}) == 0
+
+
+async def test_skipped_products_are_not_stock_tracked(catalog, reservations):
+    await reservations.reserve(catalog, "o1", [{"product_id": "shoe", "quantity": 9}], skip_products={"shoe"})
+    assert (await _product(catalog, "shoe"))["stock"] == 1
+
+
+async def test_release_returns_stock_once(catalog, reservations):
+    await reservations.reserve(catalog, "o1", [{"product_id": "watch", "quantity": 2}])
+    assert await reservations.release(catalog, "o1")
+    assert not await reservations.release(catalog, "o1")
+    watch = await _product(catalog, "watch")
+    assert (watch["stock"], watch["sales_count"]) == (5, 0)
+    assert (await catalog.stock_reservations.find_one({"order_id": "o1"}))["status"] == RELEASED
+
+
+async def test_commit_keeps_the_stock_sold(catalog, reservations):
+    await reservations.reserve(catalog, "o1", [{"product_id": "watch", "quantity": 2}])
+    assert await reservations.commit(catalog, "o1")
+    watch = await _product(catalog, "watch")
+    assert (watch["stock"], watch["sales_count"], watch["stock_holds"]) == (3, 2, {})
+    assert (await catalog.stock_reservations.find_one({"order_id": "o1"}))["status"] == COMMITTED
+
+
+async def test_expired_unpaid_order_is_cancelled_and_released(catalog, reservations):
+    await catalog.orders.insert_many([
+        {"id": "unpaid", "order_status": "pending", "payment_status": "pending"},
+        {"id": "paid", "order_status": "pending", "payment_status": "confirmed"},
+    ])
+    await reservations.reserve(catalog, "unpaid", [{"product_id": "watch", "quantity": 2}])
+    await reservations.reserve(catalog, "paid", [{"product_id": "shoe", "quantity": 1}])
+    past = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    await catalog.stock_reservations.update_many({}, {"$set": {"expires_at": past}})
+
+    assert await reservations.release_expired(catalog) == 1
+    assert (await catalog.orders.find_one({"id": "unpaid"}))["order_status"] == "cancelled"
+    assert (await _product(catalog, "watch"))["stock"] == 5
+    # The paid order keeps its stock and is no longer swept
+    assert (await _product(catalog, "shoe"))["stock"] == 0
+    assert (await catalog.stock_reservations.find_one({"order_id": "paid"}))["status"] == COMMITTED
@@ -30,7 +30,9 @@ async def update_admin_to_super():
                     "manage_team": True
                 },
                 "is_active": True
-            }
+            },
+            # Access tokens carry permission claims: reissue them
+            "$inc": {"token_version": 1}
         }
     )
     
@@ -6,7 +6,6 @@ import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
-import random
 
 load_dotenv()
 
@@ -100,75 +99,20 @@ def get_image_category(product_name, tags):
     return "default"
 
 async def update_product_images():
-    """Update all products with real images"""
+    """Update all placeholder product images with real images"""
+    # Lazy import: the migration reads this module's data
+    from migrations import runner
     
     client = AsyncIOMotorClient(os.environ['MONGO_URL'])
     db = client[os.environ['DB_NAME']]
     
     print("=" * 80)
-    print("🖼️  UPDATING PRODUCT IMAGES")
+    print("🖼️  UPDATING PRODUCT IMAGES (migration 0002)")
     print("=" * 80)
-    
-    # Get all products
-    products = await db.products.find({}, {"_id": 0}).to_list(None)
-    print(f"\n📦 Found {len(products)} products to update")
-    
-    updated_count = 0
-    
-    for product in products:
-        # Skip if already has real images (not placeholder)
-        if product.get("images") and "placeholder" not in product["images"][0]:
-            continue
-        
-        # Determine image category
-        category = get_image_category(product.get("name", ""), product.get("tags", []))
-        
-        # Get random images from that category
-        available_images = LUXURY_IMAGES.get(category, LUXURY_IMAGES["default"])
-        
-        # Select 2-3 random images with different parameters for variety
-        num_images = random.randint(2, 3)
-        selected_images = []
-        
-        for i in range(num_images):
-            base_url = random.choice(available_images)
-            # Add Unsplash parameters for different views/crops
-            params = [
-                "?w=800&h=800&fit=crop",
-                "?w=800&h=800&fit=crop&crop=faces",
-                "?w=800&h=800&fit=crop&q=80"
-            ]
-            image_url = base_url + params[i % len(params)]
-            selected_images.append(image_url)
-        
-        # Update product
-        await db.products.update_one(
-            {"id": product["id"]},
-            {"$set": {"images": selected_images}}
-        )
-        
-        updated_count += 1
-        
-        if updated_count % 100 == 0:
-            print(f"   ✅ Updated {updated_count} products...")
-    
-    print(f"\n✅ Total products updated: {updated_count}")
-    
-    # Summary by category
-    print(f"\n📊 IMAGE DISTRIBUTION:")
-    categories = {}
-    for product in products:
-        cat = get_image_category(product.get("name", ""), product.get("tags", []))
-        categories[cat] = categories.get(cat, 0) + 1
-    
-    for cat, count in sorted(categories.items()):
-        print(f"   {cat}: {count} products")
+    result = (await runner.run(db, ["0002"], force=True))[0]
+    print(f"\n✅ Scanned {result['stats']['scanned']} products, updated {result['stats']['modified']}")
     
     client.close()
-    
-    print("\n" + "=" * 80)
-    print("✅ IMAGE UPDATE COMPLETED!")
-    print("=" * 80)
 
 if __name__ == "__main__":
     asyncio.run(update_product_images())
@@ -5,7 +5,6 @@ import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
-import random
 
 load_dotenv()
 
@@ -137,45 +136,19 @@ ALL_IMAGES = REAL_QIQIYG_IMAGES + JACKET_IMAGES + DRESS_IMAGES
 
 async def update_all_products_with_real_images():
     """Update all products with real qiqiyg images"""
+    # Lazy import: the migration reads this module's data
+    from migrations import runner
     
     client = AsyncIOMotorClient(os.environ['MONGO_URL'])
     db = client[os.environ['DB_NAME']]
     
     print("=" * 80)
-    print("🖼️  UPDATING ALL PRODUCTS WITH REAL QIQIYG.COM IMAGES")
+    print("🖼️  UPDATING ALL PRODUCTS WITH REAL QIQIYG.COM IMAGES (migration 0003)")
     print("=" * 80)
-    
-    # Get all products
-    products = await db.products.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
-    print(f"\n📦 Found {len(products)} products")
-    print(f"📸 Available {len(ALL_IMAGES)} real images from qiqiyg.com")
-    
-    updated_count = 0
-    
-    for product in products:
-        # Select 2-3 random real images for each product
-        num_images = random.randint(2, 3)
-        selected_images = random.sample(ALL_IMAGES, min(num_images, len(ALL_IMAGES)))
-        
-        # Update product
-        await db.products.update_one(
-            {"id": product["id"]},
-            {"$set": {"images": selected_images}}
-        )
-        
-        updated_count += 1
-        
-        if updated_count % 200 == 0:
-            print(f"   ✅ Updated {updated_count} products...")
-    
-    print(f"\n✅ Total products updated: {updated_count}")
-    print(f"📸 All products now have real images from qiqiyg.com!")
+    result = (await runner.run(db, ["0003"], force=True))[0]
+    print(f"\n✅ Scanned {result['stats']['scanned']} products, updated {result['stats']['modified']}")
     
     client.close()
-    
-    print("\n" + "=" * 80)
-    print("✅ REAL IMAGES UPDATE COMPLETED!")
-    print("=" * 80)
 
 if __name__ == "__main__":
     asyncio.run(update_all_products_with_real_images())
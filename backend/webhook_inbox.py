@@ -0,0 +1,250 @@
+"""
+Webhook inbox
+
+Payment provider callbacks are persisted in the `webhook_events` collection,
+keyed by provider event id under a unique index, and acknowledged right
+away. A background job then applies the event: the event is claimed
+atomically, and order transitions are conditional on the current payment
+status, so provider retries and duplicate deliveries are absorbed and an
+invoice is sent once per confirmed payment.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import order_state
+from email_service import email_service
+from job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_JOB = "webhook.process"
+
+RECEIVED = "received"
+PROCESSING = "processing"
+PROCESSED = "processed"
+FAILED = "failed"
+
+EventHandler = Callable[[object, dict], Awaitable[Optional[str]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _digest(raw_body: bytes) -> str:
+    return hashlib.sha256(raw_body).hexdigest()
+
+
+# ---------- provider event ids ----------
+
+def stripe_event_id(payload: dict, raw_body: bytes) -> str:
+    return payload.get("id") or _digest(raw_body)
+
+
+def plisio_event_id(payload: dict, raw_body: bytes) -> str:
+    # One callback per invoice status change
+    txn_id = payload.get("txn_id") or payload.get("order_number")
+    return f"{txn_id}:{payload.get('status')}" if txn_id else _digest(raw_body)
+
+
+def coinpal_event_id(payload: dict, raw_body: bytes) -> str:
+    payment_id = payload.get("payment_id") or payload.get("reference")
+    return f"{payment_id}:{payload.get('status')}" if payment_id else _digest(raw_body)
+
+
+def binance_event_id(payload: dict, raw_body: bytes) -> str:
+    biz_id = payload.get("bizId") or payload.get("bizIdStr")
+    return f"{biz_id}:{payload.get('bizStatus')}" if biz_id else _digest(raw_body)
+
+
+# ---------- order transitions ----------
+
+async def confirm_order_payment(db, order_id: str, provider: str) -> Optional[str]:
+    """Mark an order paid once; sends the invoice only on the actual transition"""
+    try:
+        try:
+            result = await order_state.transition(db, order_id, status="processing", payment_status="confirmed", notify=False)
+        except order_state.InvalidTransition:
+            # Order already past processing (e.g. shipped): record the payment only
+            result = await order_state.transition(db, order_id, payment_status="confirmed", notify=False)
+    except order_state.OrderNotFound:
+        return "unknown order"
+    except order_state.InvalidTransition as e:
+        return f"rejected: {str(e)}"
+
+    if result.before.get("payment_status") == "confirmed":
+        return "already confirmed"
+    await email_service.send_invoice(result.after)
+    logger.info(f"✓ {provider} payment confirmed for order {order_id}")
+    return "confirmed"
+
+
+async def handle_stripe(db, payload: dict) -> Optional[str]:
+    if payload.get("type") not in ("checkout.session.completed", "payment_intent.succeeded"):
+        return "ignored"
+    metadata = payload.get("data", {}).get("object", {}).get("metadata", {}) or {}
+    order_id = metadata.get("order_id")
+    if not order_id:
+        return "no order id"
+    return await confirm_order_payment(db, order_id, "Stripe")
+
+
+async def handle_plisio(db, payload: dict) -> Optional[str]:
+    order_number = payload.get("order_number")
+    if payload.get("status") != "completed" or not order_number:
+        return "ignored"
+    return await confirm_order_payment(db, order_number, "Plisio")
+
+
+async def handle_coinpal(db, payload: dict) -> Optional[str]:
+    order_id = payload.get("order_id") or payload.get("order_no")
+    if payload.get("status") not in ("completed", "paid", "confirmed") or not order_id:
+        return "ignored"
+    return await confirm_order_payment(db, order_id, "CoinPal")
+
+
+async def handle_binance(db, payload: dict) -> Optional[str]:
+    if payload.get("bizStatus") != "PAY_SUCCESS":
+        return "ignored"
+    data = payload.get("data") or {}
+    if isinstance(data, str):
+        data = json.loads(data)
+    order_id = data.get("merchantTradeNo")
+    if not order_id:
+        return "no order id"
+    return await confirm_order_payment(db, order_id, "Binance Pay")
+
+
+class WebhookInbox:
+    """Persists provider callbacks and processes each one exactly once"""
+
+    collection_name = "webhook_events"
+
+    def __init__(self, processing_timeout: int = 300):
+        self.processing_timeout = processing_timeout
+        self.db = None
+        self.handlers: Dict[str, EventHandler] = {}
+        self.event_ids: Dict[str, Callable[[dict, bytes], str]] = {}
+
+    def register(self, provider: str, event_id: Callable[[dict, bytes], str], handler: EventHandler):
+        self.event_ids[provider] = event_id
+        self.handlers[provider] = handler
+
+    def start(self, db):
+        """Requeue events received but never processed (e.g. crash before enqueue)"""
+        self.db = db
+        asyncio.create_task(self.requeue_pending(db))
+
+    async def ingest(self, db, provider: str, payload: dict, raw_body: bytes) -> Tuple[str, bool]:
+        """Persist the raw event and schedule processing; returns (event id, duplicate)"""
+        self.db = db
+        event_id = self.event_ids[provider](payload, raw_body)
+        key = f"{provider}:{event_id}"
+        try:
+            await db[self.collection_name].insert_one({
+                "key": key,
+                "provider": provider,
+                "event_id": event_id,
+                "event_type": payload.get("type") or payload.get("status") or payload.get("bizStatus"),
+                "payload": payload,
+                "status": RECEIVED,
+                "attempts": 0,
+                "received_at": _now().isoformat(),
+            })
+        except DuplicateKeyError:
+            logger.info(f"Duplicate {provider} webhook {event_id} ignored")
+            return event_id, True
+
+        await self._schedule(key)
+        return event_id, False
+
+    async def _schedule(self, key: str):
+        if job_queue.running:
+            await job_queue.enqueue(WEBHOOK_JOB, {"key": key})
+        else:
+            asyncio.create_task(self._process_logged(key))
+
+    async def _process_logged(self, key: str):
+        try:
+            await self.process({"key": key})
+        except Exception as e:
+            logger.error(f"Webhook {key} processing failed: {str(e)}")
+
+    async def process(self, job_payload: dict):
+        """Job handler: claim the event, apply it, record the outcome"""
+        key = job_payload["key"]
+        collection = self.db[self.collection_name]
+        now = _now()
+        stale = (now - timedelta(seconds=self.processing_timeout)).isoformat()
+        event = await collection.find_one_and_update(
+            {"key": key, "$or": [
+                {"status": {"$in": [RECEIVED, FAILED]}},
+                {"status": PROCESSING, "processing_started_at": {"$lt": stale}},
+            ]},
+            {"$set": {"status": PROCESSING, "processing_started_at": now.isoformat()}, "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if event is None:
+            # Already processed, or being processed elsewhere
+            return
+
+        try:
+            result = await self.handlers[event["provider"]](self.db, event["payload"])
+        except Exception as e:
+            await collection.update_one(
+                {"key": key},
+                {"$set": {"status": FAILED, "error": f"{type(e).__name__}: {str(e)}"}}
+            )
+            raise
+
+        await collection.update_one(
+            {"key": key},
+            {"$set": {"status": PROCESSED, "result": result, "processed_at": _now().isoformat()}, "$unset": {"error": ""}}
+        )
+
+    async def requeue_pending(self, db):
+        try:
+            cutoff = (_now() - timedelta(seconds=60)).isoformat()
+            events = await db[self.collection_name].find(
+                {"status": RECEIVED, "received_at": {"$lt": cutoff}}, {"_id": 0, "key": 1}
+            ).to_list(1000)
+            for event in events:
+                await self._schedule(event["key"])
+            if events:
+                logger.info(f"Requeued {len(events)} unprocessed webhook events")
+        except Exception as e:
+            logger.error(f"Failed to requeue webhook events: {str(e)}")
+
+    async def replay(self, db, key: str) -> bool:
+        """Reprocess a failed event"""
+        result = await db[self.collection_name].update_one(
+            {"key": key, "status": FAILED}, {"$set": {"status": RECEIVED}}
+        )
+        if result.modified_count:
+            self.db = db
+            await self._schedule(key)
+        return result.modified_count > 0
+
+    async def list_events(self, db, provider: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+        query = {}
+        if provider:
+            query["provider"] = provider
+        if status:
+            query["status"] = status
+        return await db[self.collection_name].find(query, {"_id": 0}).sort("received_at", -1).limit(limit).to_list(limit)
+
+
+webhook_inbox = WebhookInbox()
+webhook_inbox.register("stripe", stripe_event_id, handle_stripe)
+webhook_inbox.register("plisio", plisio_event_id, handle_plisio)
+webhook_inbox.register("coinpal", coinpal_event_id, handle_coinpal)
+webhook_inbox.register("binance", binance_event_id, handle_binance)
+job_queue.register(WEBHOOK_JOB, webhook_inbox.process)
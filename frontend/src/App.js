@@ -32,6 +32,33 @@ import GoogleAnalytics from './components/GoogleAnalytics';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Access tokens are short-lived: on a 401, renew once with the refresh token and retry
+let refreshing = null;
+
+const refreshSession = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshing = axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .catch((error) => {
+        // Another tab may have rotated the token first
+        const current = localStorage.getItem('refresh_token');
+        if (current && current !== refreshToken) {
+          return localStorage.getItem('token');
+        }
+        throw error;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 // Cart Context
 export const CartContext = React.createContext();
 
@@ -47,10 +74,35 @@ function App() {
       setCart(JSON.parse(savedCart));
     }
 
+    // Registered before loadUser so an expired token on reload is refreshed, not dropped
+    const interceptor = axios.interceptors.response.use(undefined, async (error) => {
+      const request = error.config;
+      const isAuthCall = request?.url?.includes('/auth/refresh') || request?.url?.includes('/auth/login');
+      if (error.response?.status !== 401 || !request || request._retried || isAuthCall
+          || !localStorage.getItem('refresh_token')) {
+        return Promise.reject(error);
+      }
+      request._retried = true;
+      try {
+        const newToken = await refreshSession();
+        setToken(newToken);
+        request.headers = { ...request.headers, Authorization: `Bearer ${newToken}` };
+        return axios(request);
+      } catch (refreshError) {
+        localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
+        setToken(null);
+        setUser(null);
+        return Promise.reject(error);
+      }
+    });
+
     // Load user if token exists
     if (token) {
       loadUser();
     }
+
+    return () => axios.interceptors.response.eject(interceptor);
   }, []);
 
   const loadUser = async () => {
@@ -61,19 +113,33 @@ function App() {
       setUser(response.data);
     } catch (error) {
       console.error('Failed to load user:', error);
-      localStorage.removeItem('token');
-      setToken(null);
+      // The interceptor already cleared both tokens when the refresh itself failed
+      if (!localStorage.getItem('refresh_token')) {
+        localStorage.removeItem('token');
+        setToken(null);
+      }
     }
   };
 
-  const login = (newToken, userData) => {
+  const login = (newToken, userData, refreshToken) => {
     localStorage.setItem('token', newToken);
+    if (refreshToken) {
+      localStorage.setItem('refresh_token', refreshToken);
+    }
     setToken(newToken);
     setUser(userData);
   };
 
   const logout = () => {
+    const currentToken = localStorage.getItem('token');
+    if (currentToken) {
+      // End the server-side session so its refresh token cannot be reused
+      axios.post(`${API}/auth/logout`, {}, {
+        headers: { Authorization: `Bearer ${currentToken}` }
+      }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     setToken(null);
     setUser(null);
     toast.success('Logged out successfully');
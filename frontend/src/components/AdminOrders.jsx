@@ -144,7 +144,7 @@ const AdminOrders = () => {
                 <div>
                   <p className="text-sm text-gray-600 mb-1">Order Status</p>
                   <Select
-                    value={order.status}
+                    value={order.order_status}
                     onValueChange={(value) => updateOrderStatus(order.id, value)}
                   >
                     <SelectTrigger className="w-full">
@@ -163,7 +163,7 @@ const AdminOrders = () => {
                   <p className="text-sm text-gray-600 mb-1">Payment Status</p>
                   <Select
                     value={order.payment_status}
-                    onValueChange={(value) => updateOrderStatus(order.id, order.status, value)}
+                    onValueChange={(value) => updateOrderStatus(order.id, order.order_status, value)}
                   >
                     <SelectTrigger className="w-full">
                       <SelectValue />
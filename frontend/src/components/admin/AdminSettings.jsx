@@ -706,10 +706,13 @@ const AdminSettings = () => {
                         <p className="font-semibold">{email.subject}</p>
                         <p className="text-sm text-gray-600 mt-1">{email.message.substring(0, 100)}...</p>
                       </div>
-                      <p className="text-xs text-gray-500">Sent to {email.sent_to} customers</p>
+                      <p className="text-xs text-gray-500">
+                        Sent to {email.sent_to}{email.total_recipients ? ` / ${email.total_recipients}` : ''} customers
+                        {email.status && email.status !== 'completed' && ` (${email.status})`}
+                      </p>
                     </div>
                     <p className="text-xs text-gray-400 mt-2">
-                      {new Date(email.sent_at).toLocaleString()}
+                      {new Date(email.sent_at || email.created_at).toLocaleString()}
                     </p>
                   </div>
                 ))}
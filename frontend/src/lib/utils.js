@@ -4,3 +4,32 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const RENDITION_WIDTHS = [320, 640, 960, 1600];
+
+function originOf(url) {
+  try {
+    return new URL(url).origin;
+  } catch {
+    return null;
+  }
+}
+
+const BACKEND_ORIGIN = originOf(BACKEND_URL);
+
+// Our uploads (relative, or on the backend origin) can be requested resized; other URLs are used as they are
+export function mediaUrl(url, width) {
+  const match = typeof url === "string" && url.match(/^(https?:\/\/[^/]+)?\/uploads\/([^/?#]+)$/);
+  if (!match || (match[1] && originOf(match[1]) !== BACKEND_ORIGIN)) {
+    return url;
+  }
+  return `${BACKEND_URL}/api/v2/media/${match[2]}?w=${width}`;
+}
+
+export function mediaSrcSet(url) {
+  if (mediaUrl(url, 0) === url) {
+    return undefined;
+  }
+  return RENDITION_WIDTHS.map((width) => `${mediaUrl(url, width)} ${width}w`).join(", ");
+}
@@ -25,7 +25,7 @@ const AdminLogin = () => {
       console.log('📡 Sending login request to:', `${API}/auth/login`);
       const response = await axios.post(`${API}/auth/login`, loginData);
       console.log('✅ Login response received:', response.data);
-      login(response.data.access_token, response.data.user);
+      login(response.data.access_token, response.data.user, response.data.refresh_token);
       toast.success('Logged in successfully');
       console.log('👤 User role:', response.data.user.role);
       if (response.data.user.role === 'admin') {
@@ -50,7 +50,7 @@ const AdminLogin = () => {
     setLoading(true);
     try {
       const response = await axios.post(`${API}/auth/register`, registerData);
-      login(response.data.access_token, response.data.user);
+      login(response.data.access_token, response.data.user, response.data.refresh_token);
       toast.success('Account created successfully');
       navigate('/my-orders');
     } catch (error) {
@@ -1,13 +1,28 @@
-import { useContext } from 'react';
+import { useContext, useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { CartContext } from '../App';
 import { Button } from '../components/ui/button';
 import { Minus, Plus, Trash2, ShoppingBag } from 'lucide-react';
 import Footer from '../components/Footer';
+import axios from 'axios';
 
 const CartPage = () => {
-  const { cart, updateCartQuantity, removeFromCart, cartTotal } = useContext(CartContext);
+  const { cart, updateCartQuantity, removeFromCart, cartTotal, API } = useContext(CartContext);
   const navigate = useNavigate();
+  const [quote, setQuote] = useState(null);
+
+  useEffect(() => {
+    if (cart.length === 0) return;
+    let cancelled = false;
+    axios.post(`${API}/cart/price`, {
+      items: cart.map(item => ({ product_id: item.id, quantity: item.quantity }))
+    })
+      .then(response => { if (!cancelled) setQuote(response.data); })
+      .catch(error => console.error('Failed to price cart:', error));
+    return () => { cancelled = true; };
+  }, [cart, API]);
+
+  const subtotal = quote ? quote.subtotal : cartTotal;
 
   if (cart.length === 0) {
     return (
@@ -112,7 +127,7 @@ const CartPage = () => {
                 <div className="space-y-3 mb-6">
                   <div className="flex justify-between">
                     <span className="text-gray-600">Subtotal</span>
-                    <span className="font-semibold">${cartTotal.toFixed(2)}</span>
+                    <span className="font-semibold">${subtotal.toFixed(2)}</span>
                   </div>
                   <div className="flex justify-between">
                     <span className="text-gray-600">Shipping</span>
@@ -120,7 +135,7 @@ const CartPage = () => {
                   </div>
                   <div className="border-t pt-3 flex justify-between text-lg font-bold">
                     <span>Total</span>
-                    <span className="text-[#d4af37]" data-testid="cart-total">${cartTotal.toFixed(2)}</span>
+                    <span className="text-[#d4af37]" data-testid="cart-total">${subtotal.toFixed(2)}</span>
                   </div>
                 </div>
                 <Button
@@ -1,4 +1,4 @@
-import { useState, useContext, useEffect } from 'react';
+import { useState, useContext, useEffect, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { CartContext } from '../App';
 import { Button } from '../components/ui/button';
@@ -19,8 +19,9 @@ const CheckoutPage = () => {
   const [orderPlaced, setOrderPlaced] = useState(false);
   const [shippingMethod, setShippingMethod] = useState('free');
   const [couponCode, setCouponCode] = useState('');
-  const [couponDiscount, setCouponDiscount] = useState(0);
-  const [couponApplied, setCouponApplied] = useState(false);
+  const [appliedCoupon, setAppliedCoupon] = useState(null);
+  const [quote, setQuote] = useState(null);
+  const couponApplied = Boolean(appliedCoupon);
   const [paymentGateways, setPaymentGateways] = useState([]);
   const [formData, setFormData] = useState({
     name: '',
@@ -54,20 +55,38 @@ const CheckoutPage = () => {
     setFormData({ ...formData, [e.target.name]: e.target.value });
   };
 
-  const shippingCost = shippingMethod === 'fedex' ? 10 : 0;
-  
-  // Calculate crypto discount for Plisio (15%)
-  const cryptoDiscount = formData.paymentMethod === 'plisio' ? cartTotal * 0.15 : 0;
-  
-  // Calculate final total with all discounts
-  const subtotal = cartTotal - couponDiscount - cryptoDiscount;
-  const finalTotal = subtotal + shippingCost;
+  // Totals are priced server-side in one call; local values only fill in while it loads
+  const requestQuote = useCallback((coupon) => axios.post(`${API}/cart/price`, {
+    items: cart.map(item => ({ product_id: item.id, quantity: item.quantity })),
+    coupon_code: coupon,
+    payment_method: formData.paymentMethod,
+    shipping_method: shippingMethod
+  }), [API, cart, formData.paymentMethod, shippingMethod]);
+
+  useEffect(() => {
+    if (cart.length === 0) return;
+    let cancelled = false;
+    requestQuote(appliedCoupon)
+      .then(response => { if (!cancelled) setQuote(response.data); })
+      .catch(error => console.error('Failed to price cart:', error));
+    return () => { cancelled = true; };
+  }, [cart.length, requestQuote, appliedCoupon]);
+
+  const subtotal = quote ? quote.subtotal : cartTotal;
+  const couponDiscount = quote ? quote.discount_amount : 0;
+  const cryptoDiscount = quote ? quote.crypto_discount : 0;
+  const shippingCost = quote ? quote.shipping_cost : (shippingMethod === 'fedex' ? 10 : 0);
+  const finalTotal = quote ? quote.total : cartTotal + shippingCost;
 
   const handleApplyCoupon = async () => {
     try {
-      const response = await axios.post(`${API}/coupons/validate?code=${couponCode}&cart_total=${cartTotal}`);
-      setCouponDiscount(response.data.discount_amount);
-      setCouponApplied(true);
+      const response = await requestQuote(couponCode);
+      if (response.data.coupon_error) {
+        toast.error(response.data.coupon_error);
+        return;
+      }
+      setQuote(response.data);
+      setAppliedCoupon(couponCode);
       toast.success(`Coupon applied! -$${response.data.discount_amount.toFixed(2)}`);
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Invalid coupon code');
@@ -92,6 +111,7 @@ const CheckoutPage = () => {
         total: finalTotal,
         shipping_method: shippingMethod,
         shipping_cost: shippingCost,
+        coupon_code: appliedCoupon,
         payment_method: formData.paymentMethod,
         shipping_address: {
           address: formData.address,
@@ -380,7 +400,7 @@ const CheckoutPage = () => {
                     <div className="border-t pt-4 space-y-2">
                       <div className="flex justify-between">
                         <span className="text-gray-600">Subtotal</span>
-                        <span className="font-semibold">${cartTotal.toFixed(2)}</span>
+                        <span className="font-semibold">${subtotal.toFixed(2)}</span>
                       </div>
                       
                       {couponDiscount > 0 && (
@@ -400,7 +420,7 @@ const CheckoutPage = () => {
                       <div className="flex justify-between">
                         <span className="text-gray-600">Shipping</span>
                         <span className="font-semibold">
-                          {shippingMethod === 'fedex' ? '$10.00' : 'FREE'}
+                          {shippingCost > 0 ? `$${shippingCost.toFixed(2)}` : 'FREE'}
                         </span>
                       </div>
                       <div className="border-t pt-2 flex justify-between text-lg font-bold">
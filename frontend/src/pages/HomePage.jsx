@@ -2,6 +2,7 @@ import { useEffect, useState, useContext, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { ArrowRight, ShoppingBag, Star, ChevronLeft, ChevronRight, Heart } from 'lucide-react';
 import { CartContext } from '../App';
+import { mediaUrl, mediaSrcSet } from '../lib/utils';
 import { Button } from '../components/ui/button';
 import { Card, CardContent } from '../components/ui/card';
 import Footer from '../components/Footer';
@@ -204,7 +205,9 @@ const HomePage = () => {
                   <div className="relative overflow-hidden rounded-lg mb-4 bg-gray-100" style={{ aspectRatio: '1/1' }}>
                     {product.images && product.images[0] && (
                       <img
-                        src={product.images[0]}
+                        src={mediaUrl(product.images[0], 640)}
+                        srcSet={mediaSrcSet(product.images[0])}
+                        sizes="(max-width: 768px) 50vw, 25vw"
                         alt={product.name}
                         className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
                       />
@@ -283,7 +286,9 @@ const HomePage = () => {
               >
                 <div className="relative overflow-hidden aspect-square">
                   <img
-                    src={product.images[0]}
+                    src={mediaUrl(product.images[0], 640)}
+                    srcSet={mediaSrcSet(product.images[0])}
+                    sizes="(max-width: 768px) 50vw, 25vw"
                     alt={product.name}
                     className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
                   />
@@ -50,6 +50,7 @@ const LoginPage = () => {
       setUser(response.data.user);
       setToken(response.data.access_token);
       localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
       localStorage.setItem('user', JSON.stringify(response.data.user));
       
       toast.success('Welcome back!');
@@ -92,6 +93,7 @@ const LoginPage = () => {
       setUser(response.data.user);
       setToken(response.data.access_token);
       localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
       localStorage.setItem('user', JSON.stringify(response.data.user));
       
       toast.success('Account created successfully!');
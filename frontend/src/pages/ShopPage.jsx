@@ -1,6 +1,7 @@
 import { useEffect, useState, useContext } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { CartContext } from '../App';
+import { mediaUrl, mediaSrcSet } from '../lib/utils';
 import { Button } from '../components/ui/button';
 import { Card, CardContent } from '../components/ui/card';
 import Footer from '../components/Footer';
@@ -218,7 +219,9 @@ const ShopPage = () => {
                 >
                   <div className="relative overflow-hidden aspect-square">
                     <img
-                      src={product.images[0]}
+                      src={mediaUrl(product.images[0], 640)}
+                      srcSet={mediaSrcSet(product.images[0])}
+                      sizes="(max-width: 768px) 50vw, 25vw"
                       alt={product.name}
                       className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
                     />